@@ -21,7 +21,6 @@ install_requires = [
     'colorama',
     'cpe',
     'jsonschema>=3.0.0',
-    'python-dateutil',
     'requests',
     'requests_cache',
     'simplejson',
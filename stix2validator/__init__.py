@@ -6,7 +6,12 @@ import sys
 from .errors import NoJSONFileFoundError, ValidationError
 from .output import print_results
 from .util import ValidationOptions, parse_args
-from .validator import (run_validation, validate, validate_file,
+from .validator import (ValidationSession, iter_run_validation,
+                        run_validation, validate, validate_file,
                         validate_instance, validate_parsed_json,
                         validate_string)
 from .version import __version__
+
+if sys.version_info >= (3, 5):
+    from .aio import (AsyncValidationSession, avalidate_file,
+                      avalidate_parsed_json)
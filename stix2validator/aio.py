@@ -0,0 +1,181 @@
+"""Coroutines to validate STIX objects and files from asyncio code.
+
+Validation is CPU-bound, so it is run in an executor, leaving the event loop
+free to serve other tasks meanwhile. This module requires Python 3.5 or
+later.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+
+from .util import (ValidationOptions, clear_requests_cache,
+                   init_requests_cache)
+from .validator import ValidationSession, _worker_options
+
+# The ValidationSession of each thread of an executor (or of each process of
+# a process pool executor) and the option values it was set up with
+_local = threading.local()
+
+
+def _call_session(option_values, method, arg):
+    """Call `method` of the ValidationSession of this thread with `arg`,
+    setting one up with the given option values (see ``_worker_options()``)
+    if needed.
+    """
+    session = getattr(_local, 'session', None)
+    if session is None or _local.option_values != option_values:
+        session = ValidationSession(ValidationOptions(**option_values), jobs=1)
+        _local.session = session
+        _local.option_values = option_values
+    # Don't let the spec_version of a bundle in one input apply to the next
+    session.options.version = option_values['version']
+    return getattr(session, method)(arg)
+
+
+class AsyncValidationSession(object):
+    """Validate any number of STIX objects or files with the same options
+    from asyncio code; the counterpart of ``ValidationSession``.
+
+    Each validation is run in `executor`, in a ``ValidationSession`` of the
+    thread (or process) it runs in, which is set up on its first use there.
+    With a ``concurrent.futures.ProcessPoolExecutor``, the objects to
+    validate and their results are pickled to and from the worker processes,
+    but validating large objects does not hold up the event loop's process.
+
+    At most `max_concurrency` validations are given to the executor at a
+    time; the others wait for their turn in the event loop. Cancelling a
+    validation which is still waiting means it is never run. One which has
+    started in the executor runs to completion there, but its result is
+    discarded.
+
+    Args:
+        options: An instance of ``ValidationOptions``. Defaults to the
+            default options. Changes to it after the session is created are
+            not seen by the executor.
+        executor: A ``concurrent.futures.Executor``. Defaults to the default
+            executor of the event loop.
+        max_concurrency: The number of validations given to the executor at
+            a time. Defaults to the number of CPUs.
+
+    Use it as an asynchronous context manager, or call ``close()`` when done,
+    so the cache of external source values is cleared if the options ask
+    for it.
+
+    """
+    def __init__(self, options=None, executor=None, max_concurrency=None):
+        if not options:
+            options = ValidationOptions()
+        self.options = options
+        self.executor = executor
+
+        if max_concurrency is None:
+            max_concurrency = multiprocessing.cpu_count()
+        if max_concurrency < 1:
+            raise ValueError('Error: The maximum concurrency must be at least 1.')
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._option_values = _worker_options(options)
+
+        if not options.no_cache:
+            init_requests_cache(options.refresh_cache)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """Clear the cache of external source values, if the options ask for
+        it.
+        """
+        if not self.options.no_cache and self.options.clear_cache:
+            clear_requests_cache()
+
+    async def _run(self, method, arg):
+        """Call `method` of a ValidationSession in the executor with `arg`.
+        """
+        # Made here rather than in __init__() so that it belongs to the
+        # running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self.executor, _call_session,
+                                              self._option_values, method, arg)
+
+    async def validate(self, obj_json):
+        """Validate objects from parsed JSON; see
+        ``ValidationSession.validate()``.
+        """
+        return await self._run('validate', obj_json)
+
+    async def validate_string(self, string):
+        """Validate objects from a string of JSON data; see
+        ``ValidationSession.validate_string()``.
+        """
+        return await self._run('validate_string', string)
+
+    async def validate_file(self, fn):
+        """Validate the input document `fn`; see
+        ``ValidationSession.validate_file()``. The file is read in the
+        executor too.
+        """
+        return await self._run('validate_file', fn)
+
+    async def validate_files(self, files):
+        """Validate several files concurrently.
+
+        Args:
+            files: A list of paths of JSON files.
+
+        Returns:
+            A list of FileValidationResults instances, in the order of the
+            files. Unlike ``ValidationSession.iter_validate_files()``, the
+            ``max_errors`` limit applies to each file separately.
+
+        """
+        return await asyncio.gather(*[self.validate_file(fn) for fn in files])
+
+
+async def avalidate_parsed_json(obj_json, options=None, executor=None):
+    """Validate objects from parsed JSON without blocking the event loop;
+    see ``validate_parsed_json()``.
+
+    To validate many inputs with the same options, use an
+    ``AsyncValidationSession`` instead.
+
+    Args:
+        obj_json: A single parsed STIX object, or a list of them.
+        options: An instance of ``ValidationOptions``.
+        executor: The ``concurrent.futures.Executor`` in which to validate
+            them. Defaults to the default executor of the event loop.
+
+    Returns:
+        An ObjectValidationResults instance, or a list of such.
+
+    """
+    async with AsyncValidationSession(options, executor) as session:
+        return await session.validate(obj_json)
+
+
+async def avalidate_file(fn, options=None, executor=None):
+    """Validate the input document `fn` without blocking the event loop;
+    see ``validate_file()``.
+
+    Args:
+        fn: The filename of the JSON file to be validated.
+        options: An instance of ``ValidationOptions``.
+        executor: The ``concurrent.futures.Executor`` in which to read and
+            validate it. Defaults to the default executor of the event loop.
+
+    Returns:
+        An instance of FileValidationResults.
+
+    """
+    if not options:
+        options = ValidationOptions(files=fn)
+
+    async with AsyncValidationSession(options, executor) as session:
+        return await session.validate_file(fn)
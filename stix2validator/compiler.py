@@ -0,0 +1,678 @@
+"""Compile JSON schemas into trees of specialised Python functions.
+
+A compiled validator checks instances against the same schema as the
+``jsonschema`` validator it was compiled from, and reports the same errors,
+with the same messages, paths and schema paths. The difference is that the
+work of interpreting the schema -- looking up keyword functions, resolving
+``$ref``\\ s, compiling regular expressions, checking the types of keyword
+values -- is done once when the schema is compiled instead of for every
+instance.
+
+Keywords without a specialised implementation fall back to the keyword
+functions of the original validator, so any schema the original validator
+accepts can be compiled.
+"""
+
+import numbers
+import re
+
+from jsonschema.exceptions import RefResolutionError, ValidationError
+from six import integer_types, iteritems, string_types
+from six.moves.urllib.parse import urldefrag
+
+NO_ERRORS = ()
+
+
+def _is_array(instance):
+    return isinstance(instance, list)
+
+
+def _is_boolean(instance):
+    return isinstance(instance, bool)
+
+
+def _is_integer(instance):
+    if isinstance(instance, bool):
+        return False
+    return (isinstance(instance, integer_types) or
+            isinstance(instance, float) and instance.is_integer())
+
+
+def _is_null(instance):
+    return instance is None
+
+
+def _is_number(instance):
+    if isinstance(instance, bool):
+        return False
+    return isinstance(instance, numbers.Number)
+
+
+def _is_object(instance):
+    return isinstance(instance, dict)
+
+
+def _is_string(instance):
+    return isinstance(instance, string_types)
+
+
+# The types of JSON schema draft 7, as checked by jsonschema
+TYPE_CHECKS = {
+    'array': _is_array,
+    'boolean': _is_boolean,
+    'integer': _is_integer,
+    'null': _is_null,
+    'number': _is_number,
+    'object': _is_object,
+    'string': _is_string,
+}
+
+
+def _unbool(element, true=object(), false=object()):
+    if element is True:
+        return true
+    elif element is False:
+        return false
+    return element
+
+
+def _extras_msg(extras):
+    if len(extras) == 1:
+        verb = "was"
+    else:
+        verb = "were"
+    return ", ".join(repr(extra) for extra in extras), verb
+
+
+class CompiledSchema(object):
+    """A schema (or subschema) compiled for one resolution scope.
+
+    Attributes:
+        errors: A function taking an instance and returning a sequence of the
+            ``ValidationError``\\ s found in it, in the order ``jsonschema``
+            would yield them.
+        valid: A function taking an instance and returning whether it is
+            valid, which stops at the first error.
+
+    """
+    __slots__ = ('schema', 'errors', 'valid')
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.errors = None
+        self.valid = None
+
+
+class CompiledValidator(object):
+    """A validator with the same interface as a ``jsonschema`` validator,
+    for the methods the STIX validator uses.
+
+    Args:
+        validator: The ``jsonschema`` validator to compile. Its resolver is
+            used to resolve references while compiling.
+        ref_loader: An optional function called with the resolver, the base
+            URI and the reference before each reference is resolved, e.g. to
+            add local schemas to the resolver's store.
+
+    """
+    def __init__(self, validator, ref_loader=None):
+        self.validator = validator
+        self.schema = validator.schema
+        self.resolver = validator.resolver
+        self.format_checker = validator.format_checker
+        self._ref_loader = ref_loader
+        self._compiled = {}
+        self._root = self._compile(self.schema, self.resolver.resolution_scope)
+
+    def iter_errors(self, instance):
+        return iter(self._root.errors(instance))
+
+    def is_valid(self, instance):
+        return self._root.valid(instance)
+
+    def _compile(self, schema, scope):
+        """Return the CompiledSchema for `schema` in the given resolution
+        scope, compiling it if it has not been compiled already.
+        """
+        if schema is not True and schema is not False:
+            schema_id = schema.get(u'$id', u'')
+            if schema_id:
+                scope = self.resolver._urljoin_cache(scope, schema_id)
+
+        key = (id(schema), scope)
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            return compiled
+
+        # Register before compiling the keywords so recursive references
+        # find this (not yet complete) node instead of recursing forever.
+        compiled = self._compiled[key] = CompiledSchema(schema)
+        if schema is True:
+            compiled.errors = lambda instance: NO_ERRORS
+            compiled.valid = lambda instance: True
+            return compiled
+        if schema is False:
+            def false_errors(instance):
+                return [ValidationError(
+                    "False schema does not allow %r" % (instance,),
+                    validator=None,
+                    validator_value=None,
+                    instance=instance,
+                    schema=schema,
+                )]
+            compiled.errors = false_errors
+            compiled.valid = lambda instance: False
+            return compiled
+
+        ref = schema.get(u'$ref')
+        if ref is not None:
+            keywords = [(u'$ref', ref)]
+        else:
+            keywords = list(iteritems(schema))
+
+        checks = []
+        predicates = []
+        for keyword, value in keywords:
+            if keyword not in self.validator.VALIDATORS:
+                continue
+            compile_keyword = self._KEYWORDS.get(keyword)
+            if compile_keyword is None:
+                errors, valid = self._fallback(keyword, value, schema, scope)
+            else:
+                errors, valid = compile_keyword(self, value, schema, scope)
+                if errors is None:
+                    continue
+            if valid is None:
+                valid = _valid_from_errors(errors)
+            checks.append((keyword, value, errors))
+            predicates.append(valid)
+
+        compiled.errors = _node_errors(schema, checks)
+        compiled.valid = _node_valid(predicates)
+        return compiled
+
+    def _fallback(self, keyword, value, schema, scope):
+        """Check `keyword` with the original validator's keyword function."""
+        function = self.validator.VALIDATORS[keyword]
+        validator = self.validator
+        resolver = self.resolver
+
+        def errors(instance):
+            resolver.push_scope(scope)
+            try:
+                return list(function(validator, value, instance, schema) or ())
+            finally:
+                resolver.pop_scope()
+        return errors, None
+
+    def _ref(self, ref, schema, scope):
+        base_uri, _ = urldefrag(scope)
+        try:
+            if self._ref_loader is not None:
+                self._ref_loader(self.resolver, base_uri, ref)
+            url = self.resolver._urljoin_cache(scope, ref)
+            resolved = self.resolver.resolve_from_url(url)
+        except RefResolutionError as ex:
+            # jsonschema only fails when the reference is used, so do the same
+            error = ex
+
+            def unresolved(instance):
+                raise error
+            return unresolved, unresolved
+
+        target = self._compile(resolved, url)
+        return (lambda instance: target.errors(instance),
+                lambda instance: target.valid(instance))
+
+    def _type(self, types, schema, scope):
+        if isinstance(types, string_types):
+            types = [types]
+        if any(not isinstance(t, string_types) or t not in TYPE_CHECKS for t in types):
+            # Let jsonschema raise UnknownType when it is used
+            return self._fallback(u'type', types, schema, scope)
+        checks = tuple(TYPE_CHECKS[t] for t in types)
+        reprs = []
+        for t in types:
+            try:
+                reprs.append(repr(t["name"]))
+            except Exception:
+                reprs.append(repr(t))
+        message = "%r is not of type " + ", ".join(reprs).replace('%', '%%')
+
+        if len(checks) == 1:
+            check = checks[0]
+        else:
+            def check(instance):
+                for c in checks:
+                    if c(instance):
+                        return True
+                return False
+
+        def errors(instance):
+            if check(instance):
+                return NO_ERRORS
+            return [ValidationError(message % (instance,))]
+        return errors, check
+
+    def _properties(self, properties, schema, scope):
+        subschemas = [(name, self._compile(subschema, scope))
+                      for name, subschema in iteritems(properties)]
+
+        def errors(instance):
+            if not isinstance(instance, dict):
+                return NO_ERRORS
+            result = None
+            for name, subschema in subschemas:
+                if name in instance:
+                    errs = subschema.errors(instance[name])
+                    if errs:
+                        for error in errs:
+                            error.path.appendleft(name)
+                            error.schema_path.appendleft(name)
+                        if result is None:
+                            result = []
+                        result.extend(errs)
+            return result or NO_ERRORS
+
+        def valid(instance):
+            if not isinstance(instance, dict):
+                return True
+            for name, subschema in subschemas:
+                if name in instance and not subschema.valid(instance[name]):
+                    return False
+            return True
+        return errors, valid
+
+    def _pattern_properties(self, pattern_properties, schema, scope):
+        subschemas = [(pattern, re.compile(pattern).search, self._compile(subschema, scope))
+                      for pattern, subschema in iteritems(pattern_properties)]
+
+        def errors(instance):
+            if not isinstance(instance, dict):
+                return NO_ERRORS
+            result = None
+            for pattern, search, subschema in subschemas:
+                for key, value in iteritems(instance):
+                    if search(key):
+                        errs = subschema.errors(value)
+                        if errs:
+                            for error in errs:
+                                error.path.appendleft(key)
+                                error.schema_path.appendleft(pattern)
+                            if result is None:
+                                result = []
+                            result.extend(errs)
+            return result or NO_ERRORS
+
+        def valid(instance):
+            if not isinstance(instance, dict):
+                return True
+            for pattern, search, subschema in subschemas:
+                for key, value in iteritems(instance):
+                    if search(key) and not subschema.valid(value):
+                        return False
+            return True
+        return errors, valid
+
+    def _additional_properties(self, additional, schema, scope):
+        known = schema.get(u'properties', {})
+        patterns = u'|'.join(schema.get(u'patternProperties', {}))
+        search = re.compile(patterns).search if patterns else None
+
+        def find_extras(instance):
+            return set(p for p in instance
+                       if p not in known and not (search and search(p)))
+
+        if isinstance(additional, dict):
+            subschema = self._compile(additional, scope)
+
+            def errors(instance):
+                if not isinstance(instance, dict):
+                    return NO_ERRORS
+                result = []
+                for extra in find_extras(instance):
+                    errs = subschema.errors(instance[extra])
+                    for error in errs:
+                        error.path.appendleft(extra)
+                    result.extend(errs)
+                return result or NO_ERRORS
+
+            def valid(instance):
+                if not isinstance(instance, dict):
+                    return True
+                return all(subschema.valid(instance[extra])
+                           for extra in find_extras(instance))
+            return errors, valid
+
+        if additional:
+            return None, None
+
+        sorted_patterns = ", ".join(map(repr, sorted(schema.get(u'patternProperties', {}))))
+
+        def errors(instance):
+            if not isinstance(instance, dict):
+                return NO_ERRORS
+            extras = find_extras(instance)
+            if not extras:
+                return NO_ERRORS
+            if u'patternProperties' in schema:
+                verb = "does" if len(extras) == 1 else "do"
+                message = "%s %s not match any of the regexes: %s" % (
+                    ", ".join(map(repr, sorted(extras))), verb, sorted_patterns)
+            else:
+                message = ("Additional properties are not allowed (%s %s unexpected)" %
+                           _extras_msg(extras))
+            return [ValidationError(message)]
+
+        def valid(instance):
+            if not isinstance(instance, dict):
+                return True
+            for p in instance:
+                if p not in known and not (search and search(p)):
+                    return False
+            return True
+        return errors, valid
+
+    def _items(self, items, schema, scope):
+        if isinstance(items, list):
+            # Tuple validation is rare enough to not need a fast path
+            return self._fallback(u'items', items, schema, scope)
+        subschema = self._compile(items, scope)
+
+        def errors(instance):
+            if not isinstance(instance, list):
+                return NO_ERRORS
+            result = None
+            for index, item in enumerate(instance):
+                errs = subschema.errors(item)
+                if errs:
+                    for error in errs:
+                        error.path.appendleft(index)
+                    if result is None:
+                        result = []
+                    result.extend(errs)
+            return result or NO_ERRORS
+
+        def valid(instance):
+            if not isinstance(instance, list):
+                return True
+            for item in instance:
+                if not subschema.valid(item):
+                    return False
+            return True
+        return errors, valid
+
+    def _required(self, required, schema, scope):
+        if not isinstance(required, list):
+            return self._fallback(u'required', required, schema, scope)
+
+        def errors(instance):
+            if not isinstance(instance, dict):
+                return NO_ERRORS
+            return [ValidationError("%r is a required property" % name)
+                    for name in required if name not in instance] or NO_ERRORS
+
+        def valid(instance):
+            if not isinstance(instance, dict):
+                return True
+            for name in required:
+                if name not in instance:
+                    return False
+            return True
+        return errors, valid
+
+    def _enum(self, enums, schema, scope):
+        try:
+            strings = frozenset(enums) if all(isinstance(e, string_types) for e in enums) else None
+        except TypeError:
+            strings = None
+
+        def valid(instance):
+            if strings is not None and isinstance(instance, string_types):
+                return instance in strings
+            if instance == 0 or instance == 1:
+                unbooled = _unbool(instance)
+                return not all(unbooled != _unbool(each) for each in enums)
+            return instance in enums
+
+        def errors(instance):
+            if valid(instance):
+                return NO_ERRORS
+            return [ValidationError("%r is not one of %r" % (instance, enums))]
+        return errors, valid
+
+    def _pattern(self, pattern, schema, scope):
+        search = re.compile(pattern).search
+
+        def valid(instance):
+            return not isinstance(instance, string_types) or search(instance) is not None
+
+        def errors(instance):
+            if valid(instance):
+                return NO_ERRORS
+            return [ValidationError("%r does not match %r" % (instance, pattern))]
+        return errors, valid
+
+    def _length_check(kind, is_type, message):
+        def compile_check(self, limit, schema, scope):
+            if kind == 'min':
+                def valid(instance):
+                    return not is_type(instance) or len(instance) >= limit
+            else:
+                def valid(instance):
+                    return not is_type(instance) or len(instance) <= limit
+
+            def errors(instance):
+                if valid(instance):
+                    return NO_ERRORS
+                return [ValidationError(message % (instance,))]
+            return errors, valid
+        return compile_check
+
+    _min_items = _length_check('min', _is_array, "%r is too short")
+    _max_items = _length_check('max', _is_array, "%r is too long")
+    _min_length = _length_check('min', _is_string, "%r is too short")
+    _max_length = _length_check('max', _is_string, "%r is too long")
+    _min_properties = _length_check('min', _is_object, "%r does not have enough properties")
+    _max_properties = _length_check('max', _is_object, "%r has too many properties")
+    del _length_check
+
+    def _minimum(self, minimum, schema, scope):
+        def valid(instance):
+            return not _is_number(instance) or not instance < minimum
+
+        def errors(instance):
+            if valid(instance):
+                return NO_ERRORS
+            return [ValidationError("%r is less than the minimum of %r" % (instance, minimum))]
+        return errors, valid
+
+    def _maximum(self, maximum, schema, scope):
+        def valid(instance):
+            return not _is_number(instance) or not instance > maximum
+
+        def errors(instance):
+            if valid(instance):
+                return NO_ERRORS
+            return [ValidationError("%r is greater than the maximum of %r" % (instance, maximum))]
+        return errors, valid
+
+    def _format(self, format, schema, scope):
+        if self.format_checker is None:
+            return None, None
+        return self._fallback(u'format', format, schema, scope)
+
+    def _all_of(self, all_of, schema, scope):
+        subschemas = [self._compile(subschema, scope) for subschema in all_of]
+
+        def errors(instance):
+            result = None
+            for index, subschema in enumerate(subschemas):
+                errs = subschema.errors(instance)
+                if errs:
+                    for error in errs:
+                        error.schema_path.appendleft(index)
+                    if result is None:
+                        result = []
+                    result.extend(errs)
+            return result or NO_ERRORS
+
+        def valid(instance):
+            for subschema in subschemas:
+                if not subschema.valid(instance):
+                    return False
+            return True
+        return errors, valid
+
+    def _indexed_errors(self, subschemas, instance):
+        """Return the index of the first subschema `instance` is valid under
+        (or None) and the errors of the subschemas before it.
+        """
+        all_errors = []
+        for index, subschema in enumerate(subschemas):
+            if subschema.valid(instance):
+                return index, all_errors
+            errs = subschema.errors(instance)
+            for error in errs:
+                error.schema_path.appendleft(index)
+            all_errors.extend(errs)
+        return None, all_errors
+
+    def _any_of(self, any_of, schema, scope):
+        subschemas = [self._compile(subschema, scope) for subschema in any_of]
+
+        def errors(instance):
+            first_valid, all_errors = self._indexed_errors(subschemas, instance)
+            if first_valid is not None:
+                return NO_ERRORS
+            return [ValidationError(
+                "%r is not valid under any of the given schemas" % (instance,),
+                context=all_errors,
+            )]
+
+        def valid(instance):
+            for subschema in subschemas:
+                if subschema.valid(instance):
+                    return True
+            return False
+        return errors, valid
+
+    def _one_of(self, one_of, schema, scope):
+        subschemas = [self._compile(subschema, scope) for subschema in one_of]
+
+        def errors(instance):
+            first_valid, all_errors = self._indexed_errors(subschemas, instance)
+            if first_valid is None:
+                return [ValidationError(
+                    "%r is not valid under any of the given schemas" % (instance,),
+                    context=all_errors,
+                )]
+            more_valid = [one_of[i] for i in range(first_valid + 1, len(one_of))
+                          if subschemas[i].valid(instance)]
+            if not more_valid:
+                return NO_ERRORS
+            more_valid.append(one_of[first_valid])
+            reprs = ", ".join(repr(s) for s in more_valid)
+            return [ValidationError("%r is valid under each of %s" % (instance, reprs))]
+
+        def valid(instance):
+            count = 0
+            for subschema in subschemas:
+                if subschema.valid(instance):
+                    count += 1
+                    if count > 1:
+                        return False
+            return count == 1
+        return errors, valid
+
+    def _not(self, not_schema, schema, scope):
+        subschema = self._compile(not_schema, scope)
+
+        def valid(instance):
+            return not subschema.valid(instance)
+
+        def errors(instance):
+            if valid(instance):
+                return NO_ERRORS
+            return [ValidationError("%r is not allowed for %r" % (not_schema, instance))]
+        return errors, valid
+
+    _KEYWORDS = {
+        u'$ref': _ref,
+        u'additionalProperties': _additional_properties,
+        u'allOf': _all_of,
+        u'anyOf': _any_of,
+        u'enum': _enum,
+        u'format': _format,
+        u'items': _items,
+        u'maxItems': _max_items,
+        u'maxLength': _max_length,
+        u'maxProperties': _max_properties,
+        u'maximum': _maximum,
+        u'minItems': _min_items,
+        u'minLength': _min_length,
+        u'minProperties': _min_properties,
+        u'minimum': _minimum,
+        u'not': _not,
+        u'oneOf': _one_of,
+        u'pattern': _pattern,
+        u'patternProperties': _pattern_properties,
+        u'properties': _properties,
+        u'required': _required,
+        u'type': _type,
+    }
+
+
+def _valid_from_errors(errors):
+    return lambda instance: not errors(instance)
+
+
+def _node_errors(schema, checks):
+    """Return a function collecting the errors of all the keyword checks of a
+    schema, filling in the details ``jsonschema`` fills in.
+    """
+    def errors(instance):
+        result = None
+        for keyword, value, check in checks:
+            errs = check(instance)
+            if errs:
+                for error in errs:
+                    error._set(
+                        validator=keyword,
+                        validator_value=value,
+                        instance=instance,
+                        schema=schema,
+                    )
+                    if keyword != u'$ref':
+                        error.schema_path.appendleft(keyword)
+                if result is None:
+                    result = []
+                result.extend(errs)
+        return result or NO_ERRORS
+    return errors
+
+
+def _node_valid(predicates):
+    if len(predicates) == 1:
+        return predicates[0]
+
+    def valid(instance):
+        for predicate in predicates:
+            if not predicate(instance):
+                return False
+        return True
+    return valid
+
+
+def compile_validator(validator, ref_loader=None):
+    """Compile a ``jsonschema`` validator.
+
+    Args:
+        validator: The validator to compile.
+        ref_loader: See ``CompiledValidator``.
+
+    Returns:
+        An instance of CompiledValidator.
+
+    """
+    return CompiledValidator(validator, ref_loader)
@@ -2,7 +2,13 @@ from collections import deque
 import re
 
 from jsonschema import exceptions as schema_exceptions
-from six import python_2_unicode_compatible, text_type
+from six import iteritems, python_2_unicode_compatible, string_types, text_type
+
+# The default maximum length of each instance or schema snippet included in
+# verbose error messages
+DEFAULT_CONTEXT_LIMIT = 1000
+
+_UNSET = schema_exceptions._unset
 
 
 class PatternError(schema_exceptions.ValidationError):
@@ -38,225 +44,452 @@ class SchemaInvalidError(ValidationError):
 class SchemaError(ValidationError):
     """Represent a JSON Schema validation error.
 
+    Of an error from JSON Schema validation or from our own checks, only
+    what is needed to render its message is kept (see ``_ErrorDetails``),
+    and the message is only rendered the first time it is needed.
+
     Args:
-        error: An error returned from JSON Schema validation.
+        error: An error returned from JSON Schema validation, or a message.
+        prefix: Text to put before the rendered message, e.g. to denote
+            which object the error comes from.
+        verbose: Whether to render the message verbosely.
+        context_limit: The maximum length of the instance and schema snippets
+            in the verbose message, or 0 for no limit.
 
     Attributes:
         message: The JSON validation error message.
+        error: The details of the JSON Schema validation error, or None if
+            the error was given as a message.
 
     """
-    def __init__(self, error):
+    def __init__(self, error, prefix='', verbose=False,
+                 context_limit=DEFAULT_CONTEXT_LIMIT):
         super(SchemaError, self).__init__()
 
-        if error:
-            self.message = text_type(error)
+        if isinstance(error, schema_exceptions.ValidationError):
+            self.error = _ErrorDetails(error, verbose)
+            self._prefix = prefix
+            self._verbose = verbose
+            self._context_limit = context_limit
+            self._message = None
+        else:
+            self.error = None
+            if error:
+                self._message = prefix + text_type(error)
+            else:
+                self._message = None
+
+    @property
+    def message(self):
+        if self.error is not None and self._message is None:
+            self._message = self._prefix + _render_error(
+                self.error, self.error.rule, self._verbose, self._context_limit)
+        return self._message
+
+    @property
+    def code(self):
+        """The code of the check which found this error, e.g. ``'101'``, or
+        None if it came from JSON Schema validation.
+        """
+        if self.error is not None:
+            raw = self.error.message
         else:
-            self.message = None
+            raw = self._message
+        match = _CHECK_CODE_RE.search(raw or '')
+        if match:
+            return match.group(1)
+        return None
 
     def as_dict(self):
         """Returns a dictionary representation.
         """
         return {'message': self.message}
 
+    def __reduce__(self):
+        # Send only the rendered message to other processes
+        return (SchemaError, (self.message,))
+
     def __str__(self):
         return text_type(self.message)
 
 
+_U_PREFIX_RE = re.compile(r"(^| )(|\[|\(|\{|\[\{)u'")
+_CHECK_CODE_RE = re.compile(r"(?:^|: )\{(\d+)\} ")
+_MATCH_SINGLE_RE = re.compile(r"match '.+'$")
+_MATCH_DOUBLE_RE = re.compile(r'match ".+"$')
+_DOES_NOT_MATCH_RE = re.compile(r"does not match '.+'$")
+_DOES_NOT_RE = re.compile(r"does not.+'$")
+_EMPTY_ARRAY_RE = re.compile(r"\[\] is not valid .+$")
+_ADDITIONAL_RE = re.compile(r"Additional .+$")
+_ANY_LINE_RE = re.compile(r".+")
+_NOT_ALLOWED_RE = re.compile(r"\{.+\} is not allowed for '(.+)'$")
+
+
 def remove_u(input):
     """Remove ugly u'' prefixes from input string
     """
-    return re.sub(r"(^| )(|\[|\(|\{|\[\{)u'", r"\g<1>\g<2>'", input)
+    return _U_PREFIX_RE.sub(r"\g<1>\g<2>'", input)
+
+
+def _iter_repr(value, limit):
+    """Yield the repr of `value` piece by piece, cutting strings longer than
+    `limit` so that no single piece is much longer than that.
+    """
+    if isinstance(value, dict):
+        yield '{'
+        for i, (key, item) in enumerate(iteritems(value)):
+            if i:
+                yield ', '
+            yield repr(key)
+            yield ': '
+            for piece in _iter_repr(item, limit):
+                yield piece
+        yield '}'
+    elif isinstance(value, list):
+        yield '['
+        for i, item in enumerate(value):
+            if i:
+                yield ', '
+            for piece in _iter_repr(item, limit):
+                yield piece
+        yield ']'
+    elif isinstance(value, string_types) and limit and len(value) > limit:
+        yield repr(value[:limit])
+    else:
+        yield repr(value)
+
+
+def bounded_repr(value, limit=DEFAULT_CONTEXT_LIMIT):
+    """Return the repr of an instance or schema, cut after `limit` characters
+    and ending with '...' if it is longer. Only about `limit` characters are
+    ever built, however large `value` is. A limit of 0 means no limit.
+    """
+    if not limit:
+        return remove_u(text_type(value))
+
+    pieces = []
+    length = 0
+    for piece in _iter_repr(value, limit):
+        pieces.append(piece)
+        length += len(piece)
+        if length > limit:
+            return remove_u(''.join(pieces)[:limit]) + '...'
+    return remove_u(''.join(pieces))
+
+
+def json_pointer(path):
+    """Return the JSON pointer (as a URI fragment) to a location given as a
+    sequence of keys and indices.
+    """
+    return '#' + ''.join('/' + text_type(elem).replace('~', '~0').replace('/', '~1')
+                         for elem in path)
+
+
+def _verbose_context(error, limit):
+    """Return the locations in the schema and in the instance of a JSON Schema
+    validation error, with bounded snippets of both.
+    """
+    if error.validator is _UNSET or error.instance is _UNSET:
+        return ''
+    return ("\n\nFailed validating %r in schema at %s:\n    %s"
+            "\n\nOn instance at %s:\n    %s") % (
+        error.validator, json_pointer(list(error.relative_schema_path)[:-1]),
+        bounded_repr(error.schema, limit),
+        json_pointer(error.relative_path), bounded_repr(error.instance, limit))
+
+
+def _reword(regex, replacement):
+    """Return a rule replacing the part of the message matched by `regex`.
+    """
+    def rule(error, msg, limit):
+        return regex.sub(replacement, msg)
+    return rule
+
+
+def _reword_id(error, msg, limit):
+    return _MATCH_SINGLE_RE.sub('start with \'' + error.validator_value[1:-2] +
+                                '--\'', msg)
+
+
+def _reword_refs(error, msg, limit):
+    if 'observed_data_refs' in error.schema_path:
+        msg = "'observed_data_refs' must refer to Observed Data Objects"
+    elif 'where_sighted_refs' in error.schema_path:
+        msg = "'where_sighted_refs' must refer to Identity Objects"
+    return msg
+
+
+def _reword_reserved_properties(error, msg, limit):
+    if 'anyOf' in error.validator_value:
+        reserved_properties = [y for x in error.validator_value['anyOf'] for y in x['required']]
+        msg = _ANY_LINE_RE.sub("Contains a reserved property ('%s')"
+                               % "', '".join(reserved_properties), msg)
+    return msg
+
+
+def _reword_extension_keys(error, msg, limit):
+    if 'extensions' in error.schema_path:
+        msg = _ADDITIONAL_RE.sub('Custom extension keys may only contain '
+                                 'alphanumeric characters, dashes, and '
+                                 'underscores; 3-256 characters', msg)
+    return msg
+
+
+# Reword 'is valid under each of' errors
+def _reword_one_of(error, msg, limit):
+    try:
+        if 'external_references' in error.schema_path:
+            msg = "If the external reference is a CVE, 'source_name' must be" \
+                  " 'cve' and 'external_id' must be in the CVE format " \
+                  "(CVE-YYYY-NNNN+). If the external reference is a CAPEC, " \
+                  "'source_name' must be 'capec' and 'external_id' must be " \
+                  "in the CAPEC format (CAPEC-N+). If the external reference "\
+                  "is neither, it must contain the 'source_name' property and"\
+                  " at least one of the 'external_id', 'url', or "\
+                  "'description' properties."
+        elif 'type' in error.instance and error.instance['type'] == 'email-message':
+            if 'is_multipart' not in error.instance:
+                msg = "'is_multipart' is a required property"
+            elif error.instance['is_multipart'] is True:
+                msg = "Since 'is_multipart' is true, 'body_multipart' must "\
+                      "contain valid 'mime-part-type' objects and the 'body' "\
+                      "property must not be present. "
+            elif error.instance['is_multipart'] is False:
+                msg = "Since 'is_multipart' is false, 'body' must be a string"\
+                      " and the 'body_multipart' property must not be present."
+        elif 'type' in error.instance and error.instance['type'] == 'artifact':
+            if 'payload_bin' in error.instance and 'url' in error.instance:
+                msg = "'artifact' object must contain either 'payload_bin' "\
+                      "or 'url' but not both"
+            elif 'payload_bin' in error.instance:
+                msg = "'payload_bin' must be base64 encoded and 'hashes', if "\
+                      "present, must contain a valid dictionary of hashes"
+            elif 'url' in error.instance:
+                msg = "'url' must be a valid url and 'hashes', which must be "\
+                      "present, must contain a valid hash dictionary"
+            else:
+                msg = "'artifact' object must contain either 'payload_bin' "\
+                      "or 'url'"
+        elif 'type' in error.instance and error.instance['type'] == 'marking-definition':
+            msg = "'definition' must contain a valid statement, TLP, or "\
+                  "custom marking definition"
+        elif 'type' in error.instance and error.instance['type'] == 'file':
+            if (('is_encrypted' not in error.instance or
+                    error.instance['is_encrypted'] is False) and
+                    ('encryption_algorithm' in error.instance or
+                     'decryption_key' in error.instance)):
+                msg = "'file' objects may only contain 'encryption_algorithm'"\
+                      " or 'decryption_key' when 'is_encrypted' is true"
+        elif 'type' in error.instance and error.instance['type'] == 'network-traffic':
+            if ('is_active' in error.instance and
+                    error.instance['is_active'] is True and
+                    'end' in error.instance):
+                msg = "If the 'is_active' property is true, then the "\
+                      "'end' property must not be included."
+        else:
+            raise TypeError
+    except TypeError:
+        msg = msg + ':\n' + bounded_repr(error.schema, limit)
+    return msg
+
+
+# Reword forbidden property or value errors
+def _reword_not(error, msg, limit):
+    if 'enum' in error.validator_value:
+        msg = _NOT_ALLOWED_RE.sub(r"'\g<1>' is not an allowed value", msg)
+    elif ('target_ref' in error.schema_path or
+          'source_ref' in error.schema_path):
+        msg = "Relationships cannot link bundles, marking definitions"\
+                ", sightings, or other relationships. This field must "\
+                "contain the id of an SDO."
+    elif 'sighting_of_ref' in error.schema_path:
+        msg = "'sighting_of_ref' must refer to a STIX Domain Object or "\
+              "Custom Object"
+    return msg
+
+
+# Reword 'is not valid under any of the given schemas' errors
+def _reword_any_of(error, msg, limit):
+    try:
+        if error.instance == {}:
+            msg = "must contain at least one property from this type."
+        elif error.instance is None:
+            msg = "null properties are not allowed in STIX."
+        elif 'type' in error.instance and error.instance['type'] == 'network-traffic':
+            if ('src_ref' not in error.instance and
+                    'dst_ref' not in error.instance):
+                msg = "'network-traffic' objects must contain at least "\
+                      "one of 'src_ref' or 'dst_ref'"
+        elif 'type' in error.instance and error.instance['type'] in ['process', 'x509-certificate']:
+            if error.instance.keys() == ['type']:
+                msg = "must contain at least one property (other than `type`) from this object."
+        elif "'not': {'enum':" in text_type(error.validator_value):
+            try:
+                defined_objs = error.validator_value[1]['allOf'][1]['properties']['type']['not']['enum']
+                if error.instance['type'] in defined_objs:
+                    # Avoid long 'is not valid under any of the given schemas' message
+                    # when object doesn't match the schema for its spec-defined type.
+                    # Real error will show up as separate error.
+                    msg = '{} is not a valid {} object'.format(bounded_repr(error.instance, limit),
+                                                               error.instance['type'])
+            except KeyError:
+                raise TypeError
+        else:
+            raise TypeError
+    except TypeError:
+        msg = msg + ':\n' + bounded_repr(error.schema, limit)
+    return msg
+
+
+_reword_empty_array = _reword(_EMPTY_ARRAY_RE, 'empty arrays are not allowed')
+
+# Rules rewording the default error messages of the jsonschema library, by
+# (validator, schema title). A title of None stands for any schema which does
+# not have a title with rules of its own.
+_REWORD_RULES = {
+    # Error messages containing regexes
+    ('pattern', 'type'): _reword(_MATCH_SINGLE_RE, 'match the \'type\' field '
+                                 'format (lowercase ASCII a-z, 0-9, and hypens '
+                                 'only - and no two hyphens in a row)'),
+    ('pattern', 'identifier'): _reword(_MATCH_SINGLE_RE, 'match the id format '
+                                       '([object-type]--[UUID])'),
+    ('pattern', 'id'): _reword_id,
+    ('pattern', 'timestamp'): _reword(_MATCH_SINGLE_RE, 'match the timestamp '
+                                      'format YYYY-MM-DDTHH:mm:ss[.s+]Z'),
+    ('pattern', 'timestamp_millis'): _reword(_MATCH_SINGLE_RE, 'match the '
+                                             'timestamp format '
+                                             'YYYY-MM-DDTHH:mm:ss.sssZ (must be '
+                                             'precise to the millisecond)'),
+    ('pattern', 'relationship_type'): _reword(_DOES_NOT_MATCH_RE, 'contains '
+                                              'invalid characters'),
+    ('pattern', 'url-regex'): _reword(_MATCH_DOUBLE_RE, 'match the format of '
+                                      'a URL'),
+    ('pattern', 'binary'): _reword(_DOES_NOT_RE, 'must be a base64-encoded '
+                                   'string'),
+    ('pattern', None): _reword_refs,
+
+    # Custom property errors
+    ('additionalProperties', 'core'): _reword(_ADDITIONAL_RE, 'Custom '
+                                              'properties must match the proper '
+                                              'format (lowercase ASCII a-z, '
+                                              '0-9, and underscores; 3-250 '
+                                              'characters)'),
+    ('not', 'core'): _reword_reserved_properties,
+    ('additionalProperties', 'cyber-observable-core'): _reword(
+        _ADDITIONAL_RE, 'Custom observable properties must match the proper '
+        'format (lowercase ASCII a-z, 0-9, and underscores; 3-250 characters)'),
+
+    ('additionalProperties', None): _reword_extension_keys,
+    ('oneOf', None): _reword_one_of,
+    ('not', None): _reword_not,
+    ('anyOf', None): _reword_any_of,
+}
+
+# Titles of the schemas whose errors are only reworded by their own rules
+_TITLED_SCHEMAS = frozenset(['core', 'cyber-observable-core'])
+
+
+def _find_reword_rule(error):
+    """Return the rule from ``_REWORD_RULES`` for `error`, or None.
+    """
+    if error.schema is _UNSET:
+        # Don't reword error messages from our validators, only the default
+        # error messages from the jsonschema library
+        return None
+
+    title = None
+    if isinstance(error.schema, dict):
+        title = error.schema.get('title')
+
+    if error.validator != 'pattern':
+        # Reword empty array errors
+        if type(error.instance) is list and len(error.instance) == 0:
+            return _reword_empty_array
+        if title not in _TITLED_SCHEMAS:
+            title = None
+
+    return _REWORD_RULES.get((error.validator, title))
+
+
+# Rules which look at the instance the error is about
+_INSTANCE_RULES = frozenset([_reword_one_of, _reword_any_of])
+
+
+class _ErrorDetails(object):
+    """The parts of a JSON Schema validation error needed to render its
+    message, and the rule from ``_REWORD_RULES`` which applies to it.
+
+    The error itself is not kept, nor the ``context`` of sub-errors it may
+    hold. The instance is only kept if the message needs it.
+
+    Args:
+        error: A ``jsonschema`` ValidationError.
+        verbose: Whether the message will be rendered verbosely.
+    """
+    __slots__ = ('message', 'path', 'relative_path', 'schema_path',
+                 'relative_schema_path', 'validator', 'validator_value',
+                 'schema', 'instance', 'rule')
+
+    def __init__(self, error, verbose=False):
+        self.rule = _find_reword_rule(error)
+        self.message = error.message
+        self.path = self.relative_path = tuple(error.relative_path)
+        self.schema_path = self.relative_schema_path = tuple(error.relative_schema_path)
+        self.validator = error.validator
+        self.validator_value = error.validator_value
+        self.schema = error.schema
+        if verbose or self.rule in _INSTANCE_RULES:
+            self.instance = error.instance
+        else:
+            self.instance = _UNSET
 
 
-def pretty_error(error, verbose=False):
+def pretty_error(error, verbose=False, context_limit=DEFAULT_CONTEXT_LIMIT):
     """Return an error message that is easier to read and more useful.
     May require updating if the schemas change significantly.
+
+    The verbose message adds the locations of the error in the schema and in
+    the instance, as JSON pointers. In it, the snippets of the instance and
+    schema are bounded by `context_limit` characters (0 for no limit). Other
+    messages are never cut.
+    """
+    return _render_error(error, _find_reword_rule(error), verbose, context_limit)
+
+
+def _render_error(error, rule, verbose, context_limit):
+    """Render the message of `error` for ``pretty_error()``, rewording it with
+    `rule`, if given.
     """
     error_loc = ''
 
     if error.path:
-        while len(error.path) > 0:
-            path_elem = error.path.popleft()
+        for path_elem in error.path:
             if type(path_elem) is not int:
                 if error_loc:
                     error_loc += '.'
                 error_loc += path_elem
-            # elif len(error.path) > 0:
             else:
                 error_loc += '[' + text_type(path_elem) + ']'
         error_loc += ': '
 
+    if not verbose:
+        context_limit = 0
+
     # Get error message and remove ugly u'' prefixes
-    if verbose:
-        msg = remove_u(text_type(error))
-    else:
-        msg = remove_u(error.message)
+    msg = remove_u(error.message)
 
     # Don't reword error messages from our validators,
     # only the default error messages from the jsonschema library
-    if repr(error.schema) == '<unset>':
+    if error.schema is _UNSET:
         try:
             return error_loc + msg
         except UnicodeDecodeError:
             return error_loc + msg.decode('utf-8')
 
-    # Reword error messages containing regexes
-    if error.validator == 'pattern' and 'title' in error.schema:
-        if error.schema['title'] == 'type':
-            msg = re.sub(r"match '.+'$", 'match the \'type\' field format '
-                         '(lowercase ASCII a-z, 0-9, and hypens only - and no '
-                         'two hyphens in a row)', msg)
-        elif error.schema['title'] == 'identifier':
-            msg = re.sub(r"match '.+'$", 'match the id format '
-                         '([object-type]--[UUID])', msg)
-        elif error.schema['title'] == 'id':
-            msg = re.sub(r"match '.+'$", 'start with \'' +
-                         error.validator_value[1:-2] + '--\'', msg)
-        elif error.schema['title'] == 'timestamp':
-            msg = re.sub(r"match '.+'$", 'match the timestamp format '
-                         'YYYY-MM-DDTHH:mm:ss[.s+]Z', msg)
-        elif error.schema['title'] == 'timestamp_millis':
-            msg = re.sub(r"match '.+'$", 'match the timestamp format '
-                         'YYYY-MM-DDTHH:mm:ss.sssZ (must be precise to the '
-                         'millisecond)', msg)
-        elif error.schema['title'] == 'relationship_type':
-            msg = re.sub(r"does not match '.+'$", 'contains invalid '
-                         'characters', msg)
-        elif error.schema['title'] == 'url-regex':
-            msg = re.sub(r'match ".+"$', 'match the format '
-                         'of a URL', msg)
-        elif error.schema['title'] == 'binary':
-            msg = re.sub(r"does not.+'$", 'must be a base64-encoded string', msg)
-    elif error.validator == 'pattern' and 'observed_data_refs' in error.schema_path:
-        msg = "'observed_data_refs' must refer to Observed Data Objects"
-    elif error.validator == 'pattern' and 'where_sighted_refs' in error.schema_path:
-        msg = "'where_sighted_refs' must refer to Identity Objects"
+    if rule is not None:
+        msg = rule(error, msg, context_limit)
 
-    # Reword empty array errors
-    elif type(error.instance) is list and len(error.instance) == 0:
-        msg = re.sub(r"\[\] is not valid .+$", 'empty arrays are not allowed',
-                     msg)
-
-    # Reword custom property errors
-    elif 'title' in error.schema and error.schema['title'] == 'core':
-        if error.validator == 'additionalProperties':
-            msg = re.sub(r"Additional .+$", 'Custom properties must match the '
-                         'proper format (lowercase ASCII a-z, 0-9, and '
-                         'underscores; 3-250 characters)', msg)
-        elif error.validator == 'not' and 'anyOf' in error.validator_value:
-            reserved_properties = [y for x in error.validator_value['anyOf'] for y in x['required']]
-            msg = re.sub(r".+", "Contains a reserved property ('%s')"
-                         % "', '".join(reserved_properties), msg)
-    elif 'title' in error.schema and error.schema['title'] == 'cyber-observable-core':
-        if error.validator == 'additionalProperties':
-            msg = re.sub(r"Additional .+$", 'Custom observable properties must'
-                         ' match the proper format (lowercase ASCII a-z, 0-9, '
-                         'and underscores; 3-250 characters)', msg)
-
-    elif error.validator == 'additionalProperties':
-        if 'extensions' in error.schema_path:
-            msg = re.sub(r"Additional .+$", 'Custom extension keys may only '
-                         'contain alphanumeric characters, dashes, and '
-                         'underscores; 3-256 characters', msg)
-
-    # Reword 'is valid under each of' errors
-    elif error.validator == 'oneOf':
-        try:
-            if 'external_references' in error.schema_path:
-                msg = "If the external reference is a CVE, 'source_name' must be" \
-                      " 'cve' and 'external_id' must be in the CVE format " \
-                      "(CVE-YYYY-NNNN+). If the external reference is a CAPEC, " \
-                      "'source_name' must be 'capec' and 'external_id' must be " \
-                      "in the CAPEC format (CAPEC-N+). If the external reference "\
-                      "is neither, it must contain the 'source_name' property and"\
-                      " at least one of the 'external_id', 'url', or "\
-                      "'description' properties."
-            elif 'type' in error.instance and error.instance['type'] == 'email-message':
-                if 'is_multipart' not in error.instance:
-                    msg = "'is_multipart' is a required property"
-                elif error.instance['is_multipart'] is True:
-                    msg = "Since 'is_multipart' is true, 'body_multipart' must "\
-                          "contain valid 'mime-part-type' objects and the 'body' "\
-                          "property must not be present. "
-                elif error.instance['is_multipart'] is False:
-                    msg = "Since 'is_multipart' is false, 'body' must be a string"\
-                          " and the 'body_multipart' property must not be present."
-            elif 'type' in error.instance and error.instance['type'] == 'artifact':
-                if 'payload_bin' in error.instance and 'url' in error.instance:
-                    msg = "'artifact' object must contain either 'payload_bin' "\
-                          "or 'url' but not both"
-                elif 'payload_bin' in error.instance:
-                    msg = "'payload_bin' must be base64 encoded and 'hashes', if "\
-                          "present, must contain a valid dictionary of hashes"
-                elif 'url' in error.instance:
-                    msg = "'url' must be a valid url and 'hashes', which must be "\
-                          "present, must contain a valid hash dictionary"
-                else:
-                    msg = "'artifact' object must contain either 'payload_bin' "\
-                          "or 'url'"
-            elif 'type' in error.instance and error.instance['type'] == 'marking-definition':
-                msg = "'definition' must contain a valid statement, TLP, or "\
-                      "custom marking definition"
-            elif 'type' in error.instance and error.instance['type'] == 'file':
-                if (('is_encrypted' not in error.instance or
-                        error.instance['is_encrypted'] is False) and
-                        ('encryption_algorithm' in error.instance or
-                         'decryption_key' in error.instance)):
-                    msg = "'file' objects may only contain 'encryption_algorithm'"\
-                          " or 'decryption_key' when 'is_encrypted' is true"
-            elif 'type' in error.instance and error.instance['type'] == 'network-traffic':
-                if ('is_active' in error.instance and
-                        error.instance['is_active'] is True and
-                        'end' in error.instance):
-                    msg = "If the 'is_active' property is true, then the "\
-                          "'end' property must not be included."
-            else:
-                raise TypeError
-        except TypeError:
-            msg = msg + ':\n' + remove_u(text_type(error.schema))
-
-    # Reword forbidden property or value errors
-    elif error.validator == 'not':
-        if 'enum' in error.validator_value:
-            msg = re.sub(r"\{.+\} is not allowed for '(.+)'$", r"'\g<1>' is "
-                         "not an allowed value", msg)
-        elif ('target_ref' in error.schema_path or
-              'source_ref' in error.schema_path):
-            msg = "Relationships cannot link bundles, marking definitions"\
-                    ", sightings, or other relationships. This field must "\
-                    "contain the id of an SDO."
-        elif 'sighting_of_ref' in error.schema_path:
-            msg = "'sighting_of_ref' must refer to a STIX Domain Object or "\
-                  "Custom Object"
-
-    # Reword 'is not valid under any of the given schemas' errors
-    elif error.validator == 'anyOf':
-        try:
-            if error.instance == {}:
-                msg = "must contain at least one property from this type."
-            elif error.instance is None:
-                msg = "null properties are not allowed in STIX."
-            elif 'type' in error.instance and error.instance['type'] == 'network-traffic':
-                if ('src_ref' not in error.instance and
-                        'dst_ref' not in error.instance):
-                    msg = "'network-traffic' objects must contain at least "\
-                          "one of 'src_ref' or 'dst_ref'"
-            elif 'type' in error.instance and error.instance['type'] in ['process', 'x509-certificate']:
-                if error.instance.keys() == ['type']:
-                    msg = "must contain at least one property (other than `type`) from this object."
-            elif "'not': {'enum':" in text_type(error.validator_value):
-                try:
-                    defined_objs = error.validator_value[1]['allOf'][1]['properties']['type']['not']['enum']
-                    if error.instance['type'] in defined_objs:
-                        # Avoid long 'is not valid under any of the given schemas' message
-                        # when object doesn't match the schema for its spec-defined type.
-                        # Real error will show up as separate error.
-                        msg = '{} is not a valid {} object'.format(error.instance, error.instance['type'])
-                except KeyError:
-                    raise TypeError
-            else:
-                raise TypeError
-        except TypeError:
-            msg = msg + ':\n' + remove_u(text_type(error.schema))
+    if verbose:
+        msg += _verbose_context(error, context_limit)
 
     return error_loc + msg
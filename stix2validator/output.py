@@ -121,6 +121,13 @@ def print_warning_results(results, level=0):
         print_level(logger.warning, marker + "Warning: %s", level, warning)
 
 
+def print_truncated_results(level=0):
+    """Print a note that validation stopped at the maximum number of errors.
+    """
+    print_level(logger.error, _RED + "[X] Maximum number of errors reached; "
+                "validation was stopped early", level)
+
+
 def print_horizontal_rule():
     """Print a horizontal rule.
 
@@ -167,6 +174,8 @@ def print_object_results(obj_result):
         print_warning_results(obj_result, 1)
     if obj_result.errors:
         print_schema_results(obj_result, 1)
+    if obj_result.truncated:
+        print_truncated_results(1)
 
 
 def print_file_results(file_result):
@@ -186,17 +195,19 @@ def print_file_results(file_result):
 
     if file_result.fatal:
         print_fatal_results(file_result.fatal, 1)
+    if file_result.truncated:
+        print_truncated_results(1)
 
 
 def print_results(results):
     """Print `results` (the results of validation) to stdout.
 
     Args:
-        results: A list of FileValidationResults or ObjectValidationResults
-                 instances.
+        results: A FileValidationResults or ObjectValidationResults instance,
+                 or an iterable of such, e.g. from ``iter_run_validation()``.
 
     """
-    if not isinstance(results, list):
+    if hasattr(results, 'log'):
         results = [results]
 
     for r in results:
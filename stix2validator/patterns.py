@@ -0,0 +1,144 @@
+"""Parsing and caching the STIX patterns of indicators.
+
+Several checks look at the pattern of each indicator, and feeds often repeat
+the same patterns across many indicators, so each distinct pattern is
+analyzed once per process and its analysis shared by all of them.
+
+Most patterns are a single observation of a few comparisons of properties
+with strings, like ``[ipv4-addr:value = '198.51.100.1']``. Those are
+recognized without the full pattern grammar parser, which is much slower;
+anything else is left to it.
+"""
+
+from collections import namedtuple
+import re
+
+from stix2patterns.v20.object_validator import verify_object as verify_object20
+from stix2patterns.v20.pattern import Pattern as Pattern20
+from stix2patterns.v21.object_validator import verify_object as verify_object21
+from stix2patterns.v21.pattern import Pattern as Pattern21
+from stix2patterns.validator import run_validator
+
+from .util import LRUCache
+
+#: Maximum number of pattern analyses kept in ``PATTERN_CACHE``.
+PATTERN_CACHE_SIZE = 4096
+
+
+class PatternAnalysis(namedtuple('PatternAnalysis', ['errors', 'comparisons'])):
+    """The result of analyzing a STIX pattern.
+
+    Attributes:
+        errors: A tuple of the messages of the syntax errors of the pattern.
+        comparisons: The ``comparisons`` of the pattern's inspection, which
+            map each object type to the list of its (property path, operator,
+            value) comparisons, or None if the pattern has syntax errors. It
+            is shared by every user of the analysis and must not be changed.
+    """
+    __slots__ = ()
+
+
+#: The analyses of the patterns seen, keyed by (STIX version, pattern).
+PATTERN_CACHE = LRUCache(PATTERN_CACHE_SIZE)
+
+
+def analyze_pattern(pattern, version):
+    """Return the PatternAnalysis of a STIX pattern, from ``PATTERN_CACHE``
+    if it was analyzed before.
+
+    Args:
+        pattern (str): The pattern.
+        version (str): The version of the STIX specification ('2.0' or '2.1')
+            whose pattern grammar to use.
+    """
+    key = (version, pattern)
+    analysis = PATTERN_CACHE.get(key)
+    if analysis is None:
+        analysis = _analyze_pattern(pattern, version)
+        PATTERN_CACHE.put(key, analysis)
+    return analysis
+
+
+# The lexical elements of the simple patterns recognized by
+# _simple_comparisons(). Whitespace other than these characters, comments,
+# escapes in strings, list indexes in paths and other operators and values
+# are left to the full parser.
+_WS = r'[ \t\r\n]*'
+_IDENTIFIER = r'[a-zA-Z_][a-zA-Z0-9_]*'
+_OPEN_RE = re.compile(_WS + r'\[')
+_COMPARISON_RE = re.compile(
+    _WS +
+    r"(?P<type>[a-zA-Z_][a-zA-Z0-9_-]*):(?P<first>" + _IDENTIFIER + r")"
+    r"(?P<steps>(?:\.(?:" + _IDENTIFIER + r"|'[^'\\]*'))*)" + _WS +
+    r"(?P<op>!?=)" + _WS + r"(?P<value>'[^'\\]*')" + _WS)
+_STEP_RE = re.compile(r"\.(?:(" + _IDENTIFIER + r")|'([^'\\]*)')")
+_JOIN_RE = re.compile(r'(?:AND|OR)[ \t\r\n]')
+_CLOSE_RE = re.compile(r'\]' + _WS + r'\Z')
+
+# The keywords of the pattern grammar, which can't be used as identifiers
+_KEYWORDS = frozenset(['AND', 'OR', 'NOT', 'FOLLOWEDBY', 'LIKE', 'MATCHES',
+                       'ISSUPERSET', 'ISSUBSET', 'EXISTS', 'LAST', 'IN',
+                       'START', 'STOP', 'SECONDS', 'true', 'false', 'WITHIN',
+                       'REPEATS', 'TIMES'])
+
+
+def _simple_comparisons(pattern):
+    """Return the comparisons of a pattern made of a single observation of
+    comparisons of properties with strings, joined by AND or OR, in the form
+    of the ``comparisons`` of its inspection, or None if the pattern is not
+    of that form.
+    """
+    match = _OPEN_RE.match(pattern)
+    if match is None:
+        return None
+
+    comparisons = {}
+    pos = match.end()
+    while True:
+        match = _COMPARISON_RE.match(pattern, pos)
+        if match is None:
+            return None
+        stix_type, first = match.group('type', 'first')
+        if stix_type in _KEYWORDS or first in _KEYWORDS:
+            return None
+        path = [first]
+        for identifier, string in _STEP_RE.findall(match.group('steps')):
+            if identifier in _KEYWORDS:
+                return None
+            path.append(identifier or string)
+        comparisons.setdefault(stix_type, []).append(
+            (path, match.group('op'), match.group('value')))
+
+        pos = match.end()
+        join = _JOIN_RE.match(pattern, pos)
+        if join is None:
+            break
+        pos = join.end()
+
+    if _CLOSE_RE.match(pattern, pos) is None:
+        return None
+    return comparisons
+
+
+def _analyze_pattern(pattern, version):
+    comparisons = _simple_comparisons(pattern)
+    if comparisons is not None:
+        # The only errors such a pattern may have are invalid hash values
+        if version == '2.1':
+            verify_object = verify_object21
+        else:
+            verify_object = verify_object20
+        errors = tuple(verify_object(PatternAnalysis((), comparisons)))
+        if errors:
+            return PatternAnalysis(errors, None)
+        return PatternAnalysis(errors, comparisons)
+
+    errors = tuple(str(e) for e in run_validator(pattern, stix_version=version))
+    if errors:
+        return PatternAnalysis(errors, None)
+
+    if version == '2.1':
+        parsed = Pattern21(pattern)
+    else:
+        parsed = Pattern20(pattern)
+    return PatternAnalysis(errors, parsed.inspect().comparisons)
@@ -0,0 +1,774 @@
+"""Locating, loading, and caching the JSON schemas used for validation.
+"""
+
+import copy
+import hashlib
+import itertools
+import marshal
+import os
+import sys
+import threading
+import time
+
+from appdirs import AppDirs
+from jsonschema import Draft7Validator, RefResolver
+from jsonschema.exceptions import RefResolutionError
+from jsonschema.validators import extend
+import simplejson as json
+from six import string_types
+
+from .compiler import compile_validator
+from .errors import SchemaInvalidError
+from .util import DEFAULT_VER, ThreadLocalLRUCache
+from .version import __version__
+
+try:
+    FileNotFoundError
+except NameError:
+    # Python 2
+    FileNotFoundError = IOError
+
+#: Minimum number of seconds between two checks of a schema directory for
+#: changes.
+INDEX_CHECK_INTERVAL = 1.0
+
+#: Maximum number of validators kept in ``VALIDATOR_CACHE``.
+VALIDATOR_CACHE_SIZE = 512
+
+
+# Source of the SchemaIndex generations
+_GENERATIONS = itertools.count(1)
+
+
+def _mtime(path):
+    """Return the modification time of `path`, or None if it doesn't exist.
+    """
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _file_stat(path):
+    """Return the size and modification time of `path`, or None if it doesn't
+    exist. (A file replaced by a rename changes the mtime of its directory.)
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime)
+
+
+class SchemaIndex(object):
+    """Mapping of object type names to schema file paths for a single schema
+    directory.
+
+    The directory tree is walked once when the index is built; after that,
+    looking up the schema for a type is a dictionary access. The modification
+    times of all the walked directories and schema files are recorded, and
+    the index rebuilds itself when any of them change (e.g. when a schema
+    file is added, removed, renamed or edited), incrementing its
+    `generation`. Validators are cached per generation, so this also swaps
+    in validators built from the new schemas.
+
+    Args:
+        schema_dir (str): The root directory of the schemas.
+        check_interval (float): Minimum number of seconds between two checks
+            of the directory tree for changes.
+        state: The result of ``state()`` on an index of the same directory,
+            e.g. from a schema snapshot. If given, it is used instead of
+            walking the directory, and the directories and files it lists are
+            checked for changes the first time the index is used.
+
+    Attributes:
+        generation (int): Changes each time the index is (re)built. No two
+            indexes share a generation, so it identifies the schemas the
+            index was built from.
+        reloads (int): Number of times the index was rebuilt because the
+            schema directory changed.
+        last_reload (float): When the index was last rebuilt because the
+            schema directory changed, as a Unix timestamp, or None.
+
+    """
+    def __init__(self, schema_dir, check_interval=INDEX_CHECK_INTERVAL, state=None):
+        self.schema_dir = os.path.abspath(schema_dir)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._paths = {}
+        self._files = []
+        self._dir_mtimes = {}
+        self._file_stats = {}
+        self._last_check = 0
+        self.generation = 0
+        self.reloads = 0
+        self.last_reload = None
+        if state is None:
+            self.build()
+        else:
+            self._paths = dict(state['paths'])
+            self._files = list(state['files'])
+            self._dir_mtimes = dict(state['dir_mtimes'])
+            self._file_stats = dict(state.get('file_stats', {}))
+            self.generation = next(_GENERATIONS)
+
+    def build(self):
+        """(Re)build the index by walking the schema directory.
+        """
+        paths = {}
+        files = []
+        dir_mtimes = {}
+        file_stats = {}
+
+        for root, dirnames, filenames in os.walk(self.schema_dir):
+            dir_mtimes[root] = _mtime(root)
+            if "examples" in root:
+                continue
+            for filename in filenames:
+                if filename.endswith('.json'):
+                    path = os.path.join(root, filename)
+                    files.append(path)
+                    file_stats[path] = _file_stat(path)
+                    # Keep the first match, like a top-down search would
+                    paths.setdefault(filename[:-len('.json')], path)
+
+        with self._lock:
+            self._paths = paths
+            self._files = files
+            self._dir_mtimes = dir_mtimes
+            self._file_stats = file_stats
+            self._last_check = time.time()
+            self.generation = next(_GENERATIONS)
+
+    def state(self):
+        """Return the contents of this index as a dictionary of built-in
+        types, suitable for serialization.
+        """
+        with self._lock:
+            return {
+                'paths': dict(self._paths),
+                'files': list(self._files),
+                'dir_mtimes': dict(self._dir_mtimes),
+                'file_stats': dict(self._file_stats),
+            }
+
+    def is_stale(self):
+        """Return True if the schema directory tree changed since the index
+        was built.
+        """
+        if not self._dir_mtimes:
+            return _mtime(self.schema_dir) is not None
+        return (any(_mtime(d) != mtime for d, mtime in self._dir_mtimes.items()) or
+                any(_file_stat(f) != stat for f, stat in self._file_stats.items()))
+
+    def refresh(self):
+        """Rebuild the index if the schema directory changed, but check no
+        more often than every `check_interval` seconds.
+        """
+        now = time.time()
+        if now - self._last_check < self.check_interval:
+            return
+        with self._refresh_lock:
+            # Another thread may have just checked
+            if now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            if self.is_stale():
+                self.build()
+                self.reloads += 1
+                self.last_reload = time.time()
+
+    def find(self, obj_type):
+        """Return the path of the schema for `obj_type`, or None if there is
+        none in this directory.
+        """
+        self.refresh()
+        return self._paths.get(obj_type)
+
+    def files(self):
+        """Return the paths of all the schema files in this directory.
+        """
+        self.refresh()
+        return list(self._files)
+
+    def types(self):
+        """Return the names of all the types which have a schema in this
+        directory.
+        """
+        self.refresh()
+        return list(self._paths)
+
+
+_SCHEMA_INDEXES = {}
+_SCHEMA_INDEXES_LOCK = threading.Lock()
+
+
+def get_schema_index(schema_dir):
+    """Return the (shared) SchemaIndex for the given schema directory,
+    building it on first use.
+    """
+    _load_default_snapshot()
+    key = os.path.abspath(schema_dir)
+    index = _SCHEMA_INDEXES.get(key)
+    if index is None:
+        with _SCHEMA_INDEXES_LOCK:
+            index = _SCHEMA_INDEXES.get(key)
+            if index is None:
+                index = _SCHEMA_INDEXES[key] = SchemaIndex(key)
+    return index
+
+
+def find_schema(schema_dir, obj_type):
+    """Search the `schema_dir` directory for a schema called `obj_type`.json.
+    Return the file path of the first match it finds.
+    """
+    return get_schema_index(schema_dir).find(obj_type)
+
+
+def load_schema(schema_path):
+    """Load the JSON schema at the given path as a Python object.
+
+    Args:
+        schema_path: A filename for a JSON schema.
+
+    Returns:
+        A Python object representation of the schema.
+
+    """
+    try:
+        with open(schema_path) as schema_file:
+            schema = json.load(schema_file)
+    except ValueError as e:
+        raise SchemaInvalidError('Invalid JSON in schema or included schema: '
+                                 '%s\n%s' % (schema_file.name, str(e)))
+
+    return schema
+
+
+#: Whether '$ref's to schemas which are not available locally may be
+#: downloaded. By default, such references fail to resolve.
+ALLOW_REMOTE_REFS = False
+
+# Schema directory -> (index generation, schemas of the directory keyed by
+# both their '$id' and their 'file:' URI)
+_DIR_STORES = {}
+_PRELOAD_LOCK = threading.Lock()
+
+# Schema directories -> (their index generations, store combining them)
+_SCHEMA_STORES = {}
+
+
+def _file_uri(path):
+    """Return the 'file:' URI for the given path.
+    """
+    # Get correct prefix based on OS
+    if os.name == 'nt':
+        file_prefix = 'file:///'
+    else:
+        file_prefix = 'file:'
+
+    return file_prefix + path.replace("\\", "/")
+
+
+def bundled_schema_dir(version=DEFAULT_VER):
+    """Return the directory of the schemas for the given version of the STIX
+    specification which come bundled with this package.
+    """
+    return os.path.abspath(os.path.dirname(__file__) + '/schemas-' + version + '/')
+
+
+def bundled_schema_dirs():
+    """Return the directories of all the schemas bundled with this package.
+    """
+    package_dir = os.path.abspath(os.path.dirname(__file__))
+    return [os.path.join(package_dir, d) for d in sorted(os.listdir(package_dir))
+            if d.startswith('schemas-') and os.path.isdir(os.path.join(package_dir, d))]
+
+
+def preload_schema_store(schema_dir):
+    """Load every schema in `schema_dir`, so that '$ref's to them are
+    resolved without reading any more files.
+
+    This does nothing if the directory was already preloaded and has not
+    changed since. Schema files which are not valid JSON are skipped; an
+    error is raised when they are actually used.
+
+    Returns:
+        A tuple of the index generation of the directory and a dictionary
+        of its schemas, keyed by both their '$id' and their 'file:' URI.
+
+    """
+    index = get_schema_index(schema_dir)
+    index.refresh()
+    preloaded = _DIR_STORES.get(index.schema_dir)
+    if preloaded is not None and preloaded[0] == index.generation:
+        return preloaded
+
+    with _PRELOAD_LOCK:
+        generation = index.generation
+        store = {}
+        for path in index.files():
+            try:
+                schema = load_schema(path)
+            except (SchemaInvalidError, IOError, OSError):
+                continue
+            store[_file_uri(path)] = schema
+            if isinstance(schema, dict) and schema.get('$id'):
+                store[schema['$id']] = schema
+        preloaded = _DIR_STORES[index.schema_dir] = (generation, store)
+    return preloaded
+
+
+def schema_store(*schema_dirs):
+    """Return the store used to resolve '$ref's in the schemas of the given
+    directories.
+
+    The store holds the schemas bundled with this package and those of
+    `schema_dirs`, a later directory replacing the schemas of the earlier
+    ones which have the same '$id'. A custom directory can therefore replace
+    a bundled schema for its own schemas, but not for any other directory's.
+    The store is rebuilt when one of the directories changes.
+
+    Returns:
+        A dictionary of schemas, keyed by both their '$id' and their 'file:'
+        URI. It must not be modified.
+
+    """
+    dirs = []
+    for schema_dir in bundled_schema_dirs() + list(schema_dirs):
+        schema_dir = get_schema_index(schema_dir).schema_dir
+        if schema_dir not in dirs:
+            dirs.append(schema_dir)
+    dirs = tuple(dirs)
+
+    preloaded = [preload_schema_store(schema_dir) for schema_dir in dirs]
+    generations = tuple(generation for generation, _ in preloaded)
+    cached = _SCHEMA_STORES.get(dirs)
+    if cached is not None and cached[0] == generations:
+        return cached[1]
+
+    store = {}
+    for _, dir_store in preloaded:
+        store.update(dir_store)
+    _SCHEMA_STORES[dirs] = (generations, store)
+    return store
+
+
+def _refuse_remote_ref(uri):
+    raise SchemaInvalidError("'%s' is not available locally and remote "
+                             "references are not allowed" % uri)
+
+
+def _load_local_ref(resolver, base_uri, ref):
+    """Add the schema `ref` points to, relative to `base_uri`, to the
+    resolver's store if it is not already there and exists locally, so the
+    local schema is used instead of downloading it.
+    """
+    remote_path = resolver._urljoin_cache(base_uri, ref)
+
+    if remote_path not in resolver.store:
+        local_base_uri = resolver._scopes_stack[0]
+
+        # Take out the the 'file:' prefix
+        if os.name == 'nt':
+            local_base_uri = local_base_uri[8:]
+        else:
+            local_base_uri = local_base_uri[5:]
+
+        try:
+            local_filepath = os.path.abspath(os.path.join(local_base_uri, '../'+ref))
+            local_schema = load_schema(local_filepath)
+            schema_id = local_schema.get('$id', '')
+            if schema_id:
+                resolver.store[schema_id] = local_schema
+        except FileNotFoundError:
+            pass
+
+
+def ref_store(validator, ref, instance, schema):
+    """When validating '$ref' properties, add to global store.
+
+    Schemas from preloaded directories are already in the store; others are
+    loaded from the local file system here if possible.
+    """
+    _load_local_ref(validator.resolver, validator.resolver.base_uri, ref)
+    return Draft7Validator.VALIDATORS['$ref'](validator, ref, instance, schema)
+
+
+STIXValidator = extend(Draft7Validator, {'$ref': ref_store})
+
+
+def load_validator(schema_path, schema, register=True, store=None):
+    """Create a JSON schema validator for the given schema.
+
+    Args:
+        schema_path: The filename of the JSON schema.
+        schema: A Python object representation of the same schema.
+        register: Whether to add the schema to the validator's store under its
+            '$id', so that references to it resolve to this object. Should be
+            False for schema variants, which must not replace the original.
+        store: The schemas available to resolve '$ref's, as returned by
+            ``schema_store()``. Defaults to the schemas bundled with this
+            package.
+
+    Returns:
+        An instance of Draft7Validator.
+
+    """
+    if ALLOW_REMOTE_REFS:
+        handlers = ()
+    else:
+        handlers = {'http': _refuse_remote_ref, 'https': _refuse_remote_ref}
+
+    if store is None:
+        store = schema_store()
+    resolver = RefResolver(_file_uri(schema_path), schema, store=store,
+                           handlers=handlers)
+    schema_id = schema.get('$id', '')
+    if schema_id and register:
+        resolver.store[schema_id] = schema
+    validator = STIXValidator(schema, resolver=resolver)
+    return validator
+
+
+def schema_snapshot_path():
+    """Return the default location of the schema snapshot file.
+
+    The marshal format is specific to the Python version, so each version
+    gets its own snapshot.
+    """
+    dirs = AppDirs("stix2-validator", "OASIS")
+    return os.path.join(dirs.user_cache_dir, 'schemas-py{}.{}.snapshot'.format(
+        sys.version_info[0], sys.version_info[1]))
+
+
+def _manifest_hash(schema_dirs):
+    """Return a hash of the package version and of the paths and modification
+    times of the given directories.
+
+    Only the top-level directories are looked at, so this costs one stat per
+    directory. Changes deeper in the trees are found by the schema indexes
+    restored from the snapshot, which check the directories and files they
+    list before they are first used.
+    """
+    digest = hashlib.sha256(__version__.encode('utf-8'))
+    for schema_dir in sorted(schema_dirs):
+        digest.update(('%s:%r' % (schema_dir, _mtime(schema_dir))).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def build_schema_snapshot(path=None, schema_dirs=None):
+    """Write all the schemas in `schema_dirs`, with their type indexes, to a
+    single snapshot file which ``load_schema_snapshot()`` can read back.
+
+    Args:
+        path (str): Where to write the snapshot. Defaults to
+            ``schema_snapshot_path()``.
+        schema_dirs (list): The schema directories to include. Defaults to
+            the directories of the schemas bundled with this package.
+
+    Returns:
+        The path of the snapshot file.
+
+    """
+    if path is None:
+        path = schema_snapshot_path()
+    if schema_dirs is None:
+        schema_dirs = bundled_schema_dirs()
+    schema_dirs = [os.path.abspath(d) for d in schema_dirs]
+
+    indexes = {}
+    stores = {}
+    for schema_dir in schema_dirs:
+        index = get_schema_index(schema_dir)
+        index.build()
+        indexes[schema_dir] = index.state()
+        stores[schema_dir] = preload_schema_store(schema_dir)[1]
+
+    snapshot = {
+        'version': __version__,
+        'manifest': _manifest_hash(schema_dirs),
+        'schema_dirs': schema_dirs,
+        'indexes': indexes,
+        'stores': stores,
+    }
+
+    snapshot_dir = os.path.dirname(path)
+    if snapshot_dir and not os.path.isdir(snapshot_dir):
+        os.makedirs(snapshot_dir)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as snapshot_file:
+        marshal.dump(snapshot, snapshot_file)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
+    return path
+
+
+def load_schema_snapshot(path=None):
+    """Fill the schema stores and indexes from a snapshot written by
+    ``build_schema_snapshot()``, in a single file read.
+
+    The snapshot is ignored if it was written by another version of this
+    package or if files were added to or removed from the top level of any of
+    its schema directories since. Other changes are found when the schemas
+    of a directory are first used, which then reloads that directory only.
+
+    The schemas are stored as parsed JSON, without resolving their '$ref's:
+    validators and error messages rely on the references (e.g. to find the
+    title of the schema an error comes from), and the store makes resolving
+    them a dictionary lookup.
+
+    Args:
+        path (str): The snapshot file. Defaults to ``schema_snapshot_path()``.
+
+    Returns:
+        True if the snapshot was loaded, False otherwise.
+
+    """
+    if path is None:
+        path = schema_snapshot_path()
+    try:
+        with open(path, 'rb') as snapshot_file:
+            snapshot = marshal.load(snapshot_file)
+        if (snapshot['version'] != __version__ or
+                snapshot['manifest'] != _manifest_hash(snapshot['schema_dirs'])):
+            return False
+        indexes = snapshot['indexes']
+        stores = snapshot['stores']
+    except (IOError, OSError, EOFError, ValueError, TypeError, KeyError):
+        return False
+
+    with _PRELOAD_LOCK:
+        for schema_dir, state in indexes.items():
+            index = SchemaIndex(schema_dir, state=state)
+            with _SCHEMA_INDEXES_LOCK:
+                _SCHEMA_INDEXES[index.schema_dir] = index
+            _DIR_STORES[index.schema_dir] = (index.generation, stores[schema_dir])
+    return True
+
+
+_SNAPSHOT_CHECKED = []
+
+
+def _load_default_snapshot():
+    """Load the default schema snapshot, if there is one, the first time this
+    is called.
+    """
+    if not _SNAPSHOT_CHECKED:
+        _SNAPSHOT_CHECKED.append(load_schema_snapshot())
+
+
+def _defer_observable_objects(schema):
+    """Accept any non-empty dictionary in the 'objects' property of
+    observed-data. The cyber observable objects it contains are validated
+    separately, each against the schema for its own type.
+    """
+    schema['allOf'][1]['properties']['objects'] = {
+        "type": "object",
+        "minProperties": 1
+    }
+    return schema
+
+
+def _bundle_envelope(schema):
+    """Only check that the 'objects' property of a bundle is a list of
+    objects. The objects are validated separately, each against the schema
+    for its own type, so matching them against every type schema here is
+    redundant.
+    """
+    schema['properties']['objects']['items'] = {
+        "type": "object"
+    }
+    return schema
+
+
+def _bundle_objects(schema):
+    """Keep only the schema which each object of a bundle is matched against,
+    as the only entry of an 'allOf', so that the objects can be checked
+    against it one at a time. References are still resolved relative to the
+    bundle schema.
+    """
+    return {
+        "$id": schema['$id'],
+        "$schema": schema['$schema'],
+        "allOf": [schema['properties']['objects']['items']]
+    }
+
+
+#: Functions deriving variants of schemas, keyed by (schema name, variant
+#: name). Each function receives a private deep copy of the original schema.
+SCHEMA_VARIANTS = {
+    ('observed-data', 'deferred-objects'): _defer_observable_objects,
+    ('bundle', 'envelope'): _bundle_envelope,
+    ('bundle', 'objects'): _bundle_objects,
+}
+
+#: Variants used instead of the original schemas bundled with this package,
+#: keyed by schema name.
+BUNDLED_SCHEMA_VARIANTS = {
+    'observed-data': 'deferred-objects',
+}
+
+
+#: Ready-to-use validators, keyed by (schema directory, STIX version, schema
+#: name, variant name, index generation, engine). A validator's resolver
+#: keeps the stack of scopes of the '$ref's being followed, so validators
+#: cannot be shared between threads: each thread builds and caches its own.
+VALIDATOR_CACHE = ThreadLocalLRUCache(VALIDATOR_CACHE_SIZE)
+
+
+SCHEMA_ENGINES = ('jsonschema', 'compiled')
+
+
+def get_validator(schema_dir, schema_name, version=DEFAULT_VER, variant=None,
+                  engine='jsonschema'):
+    """Return a validator for the schema called `schema_name` in `schema_dir`.
+
+    Validators are built once per thread and then served from
+    ``VALIDATOR_CACHE``. When the schema directory changes, the validators
+    built from its previous contents are no longer used. The validator
+    returned must not be passed to other threads.
+
+    Args:
+        schema_dir (str): The path in which to search for the schema.
+        schema_name (str): The name of the schema, usually an object type.
+        version (str): The version of the STIX specification the schema is
+            used for.
+        variant (str): If given, validate against this variant of the schema
+            (see ``SCHEMA_VARIANTS``) instead of the schema itself.
+        engine (str): 'jsonschema' to validate with ``jsonschema``, or
+            'compiled' to validate with the schema compiled into Python
+            functions (see the ``compiler`` module), which reports the same
+            errors faster.
+
+    Returns:
+        An instance of STIXValidator, or of CompiledValidator if `engine` is
+        'compiled'.
+
+    Raises:
+        TypeError: If there is no schema with that name in `schema_dir`.
+
+    """
+    index = get_schema_index(schema_dir)
+    index.refresh()
+    key = (index.schema_dir, version, schema_name, variant, index.generation, engine)
+
+    validator = VALIDATOR_CACHE.get(key)
+    if validator is None and engine == 'compiled':
+        validator = get_validator(schema_dir, schema_name, version, variant)
+        validator = compile_validator(validator, _load_local_ref)
+        VALIDATOR_CACHE.put(key, validator)
+    elif validator is None:
+        store = schema_store(index.schema_dir)
+        schema_path = index.find(schema_name)
+        if schema_path is None:
+            raise TypeError("No schema named '%s' in %s" % (schema_name, schema_dir))
+        schema = store.get(_file_uri(schema_path))
+        if schema is None:
+            schema = load_schema(schema_path)
+        if variant is None:
+            validator = load_validator(schema_path, schema, store=store)
+        else:
+            derive = SCHEMA_VARIANTS[(schema_name, variant)]
+            schema = derive(copy.deepcopy(schema))
+            validator = load_validator(schema_path, schema, register=False,
+                                       store=store)
+        VALIDATOR_CACHE.put(key, validator)
+    return validator
+
+
+def _skip_shared_refs(schema, scope, resolver, seen):
+    """Replace the references in the top-level 'allOf' of `schema` to schemas
+    in `seen` with empty (always valid) schemas, and add the others to it.
+
+    Returns:
+        `schema`, or a modified copy of it.
+
+    """
+    all_of = schema.get('allOf')
+    if not isinstance(all_of, list):
+        return schema
+
+    entries = []
+    for entry in all_of:
+        if isinstance(entry, dict) and isinstance(entry.get('$ref'), string_types):
+            url = resolver._urljoin_cache(scope, entry['$ref'])
+            try:
+                target = id(resolver.resolve_from_url(url))
+            except RefResolutionError:
+                target = url
+            if target in seen:
+                entry = True
+            seen.add(target)
+        entries.append(entry)
+
+    if entries != all_of:
+        schema = dict(schema)
+        schema['allOf'] = entries
+    return schema
+
+
+def get_composed_validator(layers, version=DEFAULT_VER, engine='jsonschema'):
+    """Return a validator checking instances against several schemas at once.
+
+    The schemas are combined with 'allOf', in order, so errors are reported
+    in the same order as with one validator per schema. Schemas which several
+    of them include through a top-level 'allOf' reference, such as the core
+    properties, are only checked once.
+
+    Args:
+        layers: A list of (schema directory, schema name, variant) tuples
+            identifying the schemas, as passed to ``get_validator()``.
+        version (str): The version of the STIX specification the schemas are
+            used for.
+        engine (str): See ``get_validator()``.
+
+    Returns:
+        An instance of STIXValidator or CompiledValidator.
+
+    Raises:
+        TypeError: If one of the schemas does not exist.
+
+    """
+    if len(layers) == 1:
+        schema_dir, schema_name, variant = layers[0]
+        return get_validator(schema_dir, schema_name, version, variant, engine)
+
+    indexes = [get_schema_index(schema_dir) for schema_dir, _, _ in layers]
+    for index in indexes:
+        index.refresh()
+    key = (tuple((index.schema_dir, schema_name, variant, index.generation)
+                 for index, (_, schema_name, variant) in zip(indexes, layers)),
+           version, engine)
+
+    validator = VALIDATOR_CACHE.get(key)
+    if validator is None and engine == 'compiled':
+        validator = get_composed_validator(layers, version)
+        validator = compile_validator(validator, _load_local_ref)
+        VALIDATOR_CACHE.put(key, validator)
+    elif validator is None:
+        validators = [get_validator(schema_dir, schema_name, version, variant)
+                      for schema_dir, schema_name, variant in layers]
+        composed = {'allOf': []}
+        seen = set()
+        for layer_validator in validators:
+            schema = layer_validator.schema
+            resolver = layer_validator.resolver
+            scope = resolver.resolution_scope
+            schema_id = schema.get('$id', '')
+            if schema_id:
+                scope = resolver._urljoin_cache(scope, schema_id)
+            else:
+                # Resolve references relative to the schema's own file
+                schema = dict(schema)
+                schema['$id'] = scope
+            composed['allOf'].append(_skip_shared_refs(schema, scope, resolver, seen))
+
+        first_path = indexes[0].find(layers[0][1])
+        store = schema_store(*[index.schema_dir for index in indexes])
+        validator = load_validator(first_path, composed, register=False,
+                                   store=store)
+        VALIDATOR_CACHE.put(key, validator)
+    return validator
@@ -7,8 +7,9 @@ import logging
 import os
 import sys
 
-from stix2validator import (ValidationError, codes, output, parse_args,
-                            print_results, run_validation)
+from stix2validator import (ValidationError, codes, iter_run_validation,
+                            output, parse_args, print_results)
+from stix2validator.schemas import build_schema_snapshot, bundled_schema_dirs
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO, format='%(message)s')
 logger = logging.getLogger(__name__)
@@ -18,16 +19,23 @@ def main():
     # Parse command line arguments
     options = parse_args(sys.argv[1:], is_script=True)
 
+    if options.build_schema_cache:
+        schema_dirs = bundled_schema_dirs() + options.schema_dirs
+        path = build_schema_snapshot(schema_dirs=schema_dirs)
+        logging.info('Schema cache written to %s', path)
+        sys.exit(codes.EXIT_SUCCESS)
+
     # Only print prompt if script is run on cmdline and no input is piped in
     if options.files == sys.stdin and os.isatty(0):
         logging.info('Input STIX content, then press Ctrl+D: ')
 
     try:
-        # Validate input documents
-        results = run_validation(options)
-
-        # Print validation results
-        print_results(results)
+        # Validate input documents, printing the results of each as soon as
+        # they are available
+        results = []
+        for file_results in iter_run_validation(options):
+            print_results(file_results)
+            results.append(file_results)
 
         # Determine exit status code and exit.
         code = codes.get_code(results)
@@ -0,0 +1,101 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import json
+import sys
+
+import pytest
+
+from ... import ValidationOptions, validate_file, validate_parsed_json
+from .misc_tests import IDENTITY, INVALID_IDENTITY, INVALID_TIMESTAMP
+from .tool_tests import VALID_TOOL
+
+if sys.version_info < (3, 5):
+    pytest.skip("asyncio API requires Python 3.5 or later", allow_module_level=True)
+
+import asyncio  # noqa: E402
+
+from ...aio import (AsyncValidationSession, avalidate_file,  # noqa: E402
+                    avalidate_parsed_json)
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    def __init__(self, *args, **kwargs):
+        super(CountingExecutor, self).__init__(*args, **kwargs)
+        self.submitted = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        return super(CountingExecutor, self).submit(*args, **kwargs)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+def summary(results):
+    return (results.is_valid, [e.message for e in results.errors], results.warnings)
+
+
+def test_avalidate_parsed_json(loop):
+    tool = json.loads(VALID_TOOL)
+    invalid_tool = dict(tool, created='bad-date')
+    options = ValidationOptions(strict=True)
+    for obj_json in [tool, invalid_tool]:
+        results = loop.run_until_complete(avalidate_parsed_json(obj_json, options))
+        assert summary(results) == summary(validate_parsed_json(obj_json, options))
+
+    results = loop.run_until_complete(avalidate_parsed_json([tool, invalid_tool]))
+    assert [r.is_valid for r in results] == [True, False]
+
+
+def test_avalidate_file(loop):
+    for fn in [IDENTITY, INVALID_IDENTITY]:
+        results = loop.run_until_complete(avalidate_file(fn))
+        expected = validate_file(fn)
+        assert results.is_valid == expected.is_valid
+        assert ([summary(r) for r in results.object_results] ==
+                [summary(r) for r in expected.object_results])
+
+
+def test_async_session(loop):
+    files = [IDENTITY, INVALID_IDENTITY, INVALID_TIMESTAMP, IDENTITY]
+    with ThreadPoolExecutor(2) as executor:
+        session = AsyncValidationSession(executor=executor, max_concurrency=2)
+        results = loop.run_until_complete(session.validate_files(files))
+        string_results = loop.run_until_complete(session.validate_string(VALID_TOOL))
+        loop.run_until_complete(session.close())
+    assert [r.filepath for r in results] == files
+    assert [r.is_valid for r in results] == [True, False, False, True]
+    assert string_results.is_valid
+
+
+def test_async_session_process_executor(loop):
+    invalid_tool = dict(json.loads(VALID_TOOL), created='bad-date')
+    with ProcessPoolExecutor(1) as executor:
+        session = AsyncValidationSession(executor=executor)
+        results = loop.run_until_complete(session.validate(invalid_tool))
+    assert summary(results) == summary(validate_parsed_json(invalid_tool))
+
+
+def test_async_session_cancel(loop):
+    with CountingExecutor(1) as executor:
+        session = AsyncValidationSession(executor=executor, max_concurrency=1)
+        session._semaphore = asyncio.Semaphore(1)
+        loop.run_until_complete(session._semaphore.acquire())
+
+        # Waits for the semaphore, so is cancelled before being run
+        task = loop.create_task(session.validate(json.loads(VALID_TOOL)))
+        loop.run_until_complete(asyncio.sleep(0))
+        task.cancel()
+        session._semaphore.release()
+        with pytest.raises(asyncio.CancelledError):
+            loop.run_until_complete(task)
+        assert executor.submitted == 0
+
+        results = loop.run_until_complete(session.validate(json.loads(VALID_TOOL)))
+        assert results.is_valid
+        assert executor.submitted == 1
@@ -1,8 +1,12 @@
 import copy
 import json
 
+from stix2patterns.v21.pattern import Pattern
+
 from . import ValidatorTest
-from ... import ValidationOptions, validate_parsed_json, validate_string
+from ... import (ValidationOptions, patterns, validate_parsed_json,
+                 validate_string)
+from ...patterns import PATTERN_CACHE
 
 VALID_INDICATOR = u"""
 {
@@ -240,3 +244,49 @@ class IndicatorTestCases(ValidatorTest):
         self.assertFalseWithOptions(indicator)
 
         self.check_ignore(indicator, 'indicator-properties')
+
+    def test_pattern_parsed_once(self):
+        indicator = copy.deepcopy(self.valid_indicator)
+        indicator['pattern'] = "[ipv4-addr:value = '198.51.100.1/32'] OR [x-foo:bar = 'a']"
+        PATTERN_CACHE.clear()
+        options = ValidationOptions(strict_types=True, strict_properties=True)
+        for _ in range(3):
+            results = validate_parsed_json(indicator, options)
+            self.assertEqual(results.is_valid, False)
+        self.assertEqual(len(PATTERN_CACHE), 1)
+        self.assertEqual(PATTERN_CACHE.misses, 1)
+
+        # Syntax errors are cached too, and reported each time
+        indicator['pattern'] = "[ipv4-addr:value = '198.51.100.1/32'"
+        for _ in range(2):
+            results = validate_parsed_json(indicator, options)
+            self.assertTrue(any('FAIL' in e.message for e in results.errors))
+        self.assertEqual(PATTERN_CACHE.misses, 2)
+
+    def test_simple_pattern_fast_path(self):
+        simple = [
+            "[file:hashes.'SHA-256' = 'aec070645fe53ee3b3763059376134f058cc337247c978add178b6ccdfb0019f']",
+            "[file:hashes.'SHA-256' = 'aec0']",
+            "[ipv4-addr:value = '198.51.100.1' OR file:name = 'a' AND file:name != '']",
+            " [x-foo:bar.'a b'.c\t=\n'd'] ",
+        ]
+        not_simple = [
+            "[file:name = 'a\\'b']",
+            "[file:size = 5]",
+            "[file:name = 'a'] AND [file:name = 'b']",
+            "[file:name = 'a'] WITHIN 5 SECONDS",
+            "[file:name LIKE 'a%']",
+            "[file:true = 'a']",
+            "[file:my-name = 'a']",
+            "[file:name = 'a'",
+        ]
+        for pattern in simple:
+            self.assertIsNotNone(patterns._simple_comparisons(pattern))
+            errors = tuple(patterns.run_validator(pattern, stix_version='2.1'))
+            comparisons = None
+            if not errors:
+                comparisons = Pattern(pattern).inspect().comparisons
+            self.assertEqual(patterns._analyze_pattern(pattern, '2.1'),
+                             (errors, comparisons))
+        for pattern in not_simple:
+            self.assertIsNone(patterns._simple_comparisons(pattern))
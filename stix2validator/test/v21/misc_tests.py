@@ -1,13 +1,25 @@
+import datetime
 from io import open
+import json
 import logging
 import os
+import pickle
 import re
 import sys
 
+from jsonschema.exceptions import ValidationError as JSONSchemaError
 import pytest
 
-from ... import (NoJSONFileFoundError, ValidationOptions, print_results,
-                 run_validation, validate_file, validate_string)
+from ... import (NoJSONFileFoundError, ValidationOptions, ValidationSession,
+                 print_results, run_validation, validate_file,
+                 validate_parsed_json, validate_string, validator)
+from ...errors import SchemaError, bounded_repr, json_pointer
+from ...timestamps import (TIMESTAMP_CACHE, timestamp_error,
+                           timestamp_nanoseconds)
+from ...validator import _get_checks
+from ...visitor import (EXTENSION, EXTENSION_PROPERTY, HASH, PROPERTY,
+                        VisitorPass, iter_events)
+from .indicator_tests import VALID_INDICATOR
 from .tool_tests import VALID_TOOL
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO, format='%(message)s')
@@ -131,3 +143,408 @@ def test_run_validation_stdin(monkeypatch):
     options = ValidationOptions(files=sys.stdin)
     results = run_validation(options)
     assert results[0].is_valid
+
+
+def test_validation_session():
+    options = ValidationOptions(strict=True)
+    valid_tool = json.loads(VALID_TOOL)
+    invalid_tool = dict(valid_tool, tool_types="remote-access")
+    with ValidationSession(options) as session:
+        assert session.validate(valid_tool).is_valid
+        results = list(session.validate_many([valid_tool, invalid_tool, [valid_tool]]))
+        assert session.validate_file(IDENTITY).is_valid
+        assert not session.validate_file(INVALID_IDENTITY).is_valid
+
+    assert results[0].is_valid
+    assert not results[1].is_valid
+    assert [e.message for e in results[1].errors] == \
+        [e.message for e in validate_parsed_json(invalid_tool, ValidationOptions(strict=True)).errors]
+    assert results[2][0].is_valid
+    # The checks to run are only chosen once
+    assert len(session._checks) == 1
+
+
+def test_validation_session_version_per_file():
+    v20_bundle = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..',
+                              'schemas-2.0', 'examples', 'indicator-to-campaign-relationship.json')
+    with ValidationSession(ValidationOptions()) as session:
+        assert session.validate_file(v20_bundle).is_valid
+        # The spec_version of the bundle doesn't apply to the next file
+        assert session.options.version is None
+        assert session.validate_file(IDENTITY).is_valid
+
+
+def test_check_plan_dispatch():
+    must_checks, should_checks, _ = _get_checks(ValidationOptions())
+    names = [c.__name__ for c in should_checks.for_type('location')]
+    assert 'countries' in names
+    assert 'vocab_tool_types' not in names
+    assert 'uuid_check' in names
+    assert 'patterns' in [c.__name__ for c in must_checks.for_type('indicator')]
+    assert 'patterns' not in [c.__name__ for c in must_checks.for_type('tool')]
+    # Custom types only get the checks that apply to every type
+    custom = should_checks.for_type('x-example-type')
+    assert all(not hasattr(c, 'stix_types') for c in custom)
+    assert should_checks.for_type('location') is should_checks.for_type('location')
+
+
+def test_visitor_events():
+    obj = {
+        "type": "file",
+        "id": "file--ff1e0780-358c-5808-a8c7-d0fca4ef6ef4",
+        "hashes": {"MD5": "69D0D97D02A03C43782DD571394E6869"},
+        "parent_directory_ref": "directory--ff1e0780-358c-5808-a8c7-d0fca4ef6ef4",
+        "ctime": "2016-04-06T19:58:16.000Z",
+        "extensions": {
+            "ntfs-ext": {
+                "alternate_data_streams": [{"name": "s", "hashes": {"SHA-256": "a"}}],
+            },
+        },
+    }
+    events = set((e.kind, e.path, e.name) for e in iter_events(obj))
+    assert (PROPERTY, (), 'hashes') in events
+    assert (HASH, ('hashes',), 'MD5') in events
+    assert (PROPERTY, (), 'parent_directory_ref') in events
+    assert (EXTENSION, ('extensions',), 'ntfs-ext') in events
+    assert (EXTENSION_PROPERTY, ('extensions', 'ntfs-ext'), 'alternate_data_streams') in events
+    assert (PROPERTY, ('extensions', 'ntfs-ext', 'alternate_data_streams', 0), 'name') in events
+    assert (HASH, ('extensions', 'ntfs-ext', 'alternate_data_streams', 0, 'hashes'), 'SHA-256') in events
+    assert [e.name for e in iter_events(obj, [HASH])] == ['MD5', 'SHA-256']
+
+
+def test_visitor_checks_share_one_pass():
+    _, should_checks, _ = _get_checks(ValidationOptions())
+    passes = [c for c in should_checks.for_type('file') if isinstance(c, VisitorPass)]
+    assert len(passes) == 1
+    assert 'hash_length' in passes[0].__name__
+    assert 'vocab_hash_algo' in passes[0].__name__
+
+    # Observed-data gets them all, for the objects embedded in it
+    passes = [c for c in should_checks.for_type('observed-data') if isinstance(c, VisitorPass)]
+    assert len(passes) == 1
+    assert 'custom_object_extension_prefix_strict' in passes[0].__name__
+
+
+def test_custom_checks_single_walk(monkeypatch):
+    tool = json.loads(VALID_TOOL)
+    invalid_tool = dict(tool, id='tool--a3e4a2f3-5bd4-4b2f-8f36-5a9b1d1b7a10',
+                        tool_types=['x'], created='2017-04-06T20:03:48.000Z')
+    bundle = {
+        "type": "bundle",
+        "id": "bundle--44298a74-ba52-4f0c-87a3-1824e67d7fad",
+        "objects": [tool, invalid_tool],
+    }
+    checked = []
+    is_stix_obj = validator._is_stix_obj
+    monkeypatch.setattr(validator, '_is_stix_obj',
+                        lambda obj: checked.append(obj) or is_stix_obj(obj))
+
+    results = validate_parsed_json(bundle)
+    assert [obj for obj in checked if obj in bundle['objects']] == [tool, invalid_tool]
+    assert not results.is_valid
+    assert results.warnings
+
+    # Strict mode puts the warnings after the errors
+    strict = validate_parsed_json(bundle, ValidationOptions(strict=True))
+    messages = [e.message for e in strict.errors]
+    assert messages[:len(results.errors)] == [e.message for e in results.errors]
+    assert len(messages) > len(results.errors)
+
+
+def test_max_errors():
+    tool = json.loads(VALID_TOOL)
+    tool['created'] = 'bad-date'
+    tool['modified'] = 'bad-date'
+    del tool['name']
+
+    results = validate_parsed_json(tool)
+    count = len(results.errors)
+    assert count > 1
+    assert not results.truncated
+    assert 'truncated' not in results.as_dict()
+
+    results = validate_parsed_json(tool, ValidationOptions(max_errors=1))
+    assert not results.is_valid
+    assert len(results.errors) == 1
+    assert results.truncated
+    assert results.as_dict()['truncated']
+
+    # The objects of a list after the one the limit is reached with are not
+    # validated
+    results = validate_parsed_json([tool, tool, json.loads(VALID_TOOL)],
+                                   ValidationOptions(max_errors=count + 1))
+    assert len(results) == 3
+    assert [r.truncated for r in results] == [False, True, True]
+    assert [len(r.errors) for r in results] == [count, 1, 0]
+    assert not results[2].is_valid
+
+
+def test_max_errors_stops_validation(monkeypatch):
+    schema_validate = validator._schema_validate
+    validated = []
+
+    def counting_schema_validate(sdo, *args, **kwargs):
+        validated.append(sdo)
+        return schema_validate(sdo, *args, **kwargs)
+
+    monkeypatch.setattr(validator, '_schema_validate', counting_schema_validate)
+    invalid_tool = dict(json.loads(VALID_TOOL), created='bad-date')
+    objects = [invalid_tool] + [json.loads(VALID_TOOL)] * 300
+    results = validate_parsed_json(objects, ValidationOptions(max_errors=1))
+    assert len(validated) == 1
+    assert len(results) == 301
+    assert all(r.truncated and not r.is_valid for r in results)
+    assert [len(r.errors) for r in results[:2]] == [1, 0]
+
+
+def test_max_errors_run_validation(caplog):
+    files = [INVALID_IDENTITY, EXAMPLE, IDENTITY, INVALID_TIMESTAMP, EXAMPLE]
+    for jobs in [1, 2]:
+        options = ValidationOptions(files=files, max_errors=1, jobs=jobs, chunk_size=1)
+        results = run_validation(options)
+        # The files after the one the limit is reached with are reported as
+        # left unvalidated
+        assert [r.filepath for r in results] == files
+        assert all(r.truncated and not r.is_valid for r in results)
+        assert len(results[0].object_result.errors) == 1
+        assert all(r.object_results == [] for r in results[1:])
+
+    print_results(results)
+    assert caplog.text.count('Maximum number of errors reached') == len(files)
+
+
+def test_max_errors_invalid():
+    with pytest.raises(ValueError):
+        ValidationOptions(max_errors=0)
+
+
+def test_lazy_error_messages():
+    tool = json.loads(VALID_TOOL)
+    tool['created'] = 'bad-date'
+    tool['name'] = 1
+    tool['x-bad_prop'] = 'a'
+
+    results = validate_parsed_json(tool, ValidationOptions(strict=True))
+    assert all(e.error is not None and e._message is None for e in results.errors)
+    assert any(e.code == '101' for e in results.errors)
+    assert results.errors[0].code is None
+
+    messages = [e.message for e in results.errors]
+    assert messages[0].endswith("created: 'bad-date' does not match the timestamp "
+                                "format YYYY-MM-DDTHH:mm:ss[.s+]Z")
+    assert messages == [str(e) for e in results.errors]
+
+
+def test_schema_error_details():
+    instance = {'name': ['x']}
+    raw = JSONSchemaError("%r is not of type 'string'" % instance['name'],
+                          validator='type', validator_value='string',
+                          instance=instance['name'], schema={'type': 'string'},
+                          path=['name'], schema_path=['properties', 'name', 'type'],
+                          context=[JSONSchemaError('sub-error')])
+    error = SchemaError(raw)
+    assert not hasattr(error.error, 'context')
+    assert error.error.instance is not instance['name']
+    assert error.message == "name: %s" % raw.message
+
+    verbose = SchemaError(raw, verbose=True)
+    assert verbose.error.instance is instance['name']
+    assert 'On instance at #/name:' in verbose.message
+
+
+def test_bounded_context():
+    value = {'a': ['x' * 100, 1], 'b': None}
+    assert bounded_repr(value) == str(value)
+    assert bounded_repr(value, 0) == str(value)
+    assert bounded_repr(value, 20) == str(value)[:20] + '...'
+    assert json_pointer(['objects', 0, 'a/b~c']) == '#/objects/0/a~1b~0c'
+    assert json_pointer([]) == '#'
+
+
+def test_verbose_context_limit():
+    tool = json.loads(VALID_TOOL)
+    tool['name'] = 1
+    tool['description'] = 'x' * 100000
+    del tool['created']
+
+    results = validate_parsed_json(tool, ValidationOptions(verbose=True))
+    messages = [e.message for e in results.errors]
+    assert any("Failed validating 'type' in schema at #/allOf/1/properties/name:" in m and
+               'On instance at #/name:' in m for m in messages)
+    assert all(len(m) < 5000 for m in messages)
+
+    results = validate_parsed_json(tool, ValidationOptions(verbose=True, context_limit=0))
+    assert any(len(e.message) > 100000 for e in results.errors)
+
+    # Messages which are not verbose are never cut
+    tool['name'] = ['x' * 100000]
+    results = validate_parsed_json(tool, ValidationOptions(context_limit=10))
+    message = "name: ['%s'] is not of type 'string'" % ('x' * 100000)
+    assert any(e.message.endswith(message) for e in results.errors)
+
+
+def test_parallel_bundle(monkeypatch):
+    monkeypatch.setattr(validator, 'BUNDLE_BATCH_SIZE', 2)
+    tool = json.loads(VALID_TOOL)
+    invalid_tool = dict(tool, created='bad-date', name=1)
+    relationship = {
+        "type": "relationship",
+        "spec_version": "2.1",
+        "id": "relationship--44298a74-ba52-4f0c-87a3-1824e67d7fad",
+        "created": "2016-04-06T20:06:37.000Z",
+        "modified": "2016-04-06T20:06:37.000Z",
+        "relationship_type": "uses",
+        "source_ref": tool['id'],
+        "target_ref": "malware--31b940d4-6f7f-459a-80ea-9c1f17b5891b",
+    }
+    bundle = {
+        "type": "bundle",
+        "id": "bundle--44298a74-ba52-4f0c-87a3-1824e67d7fad",
+        "objects": [tool, invalid_tool, tool, relationship, invalid_tool,
+                    {"type": "identity", "id": "identity--" + tool['id'][6:]}],
+    }
+
+    for kwargs in [{}, {'strict': True, 'enforce_refs': True}, {'verbose': True},
+                   {'envelope_only': True}, {'schema_engine': 'compiled'}]:
+        with ValidationSession(ValidationOptions(**kwargs)) as session:
+            serial = session.validate(bundle)
+        with ValidationSession(ValidationOptions(**kwargs), jobs=2) as session:
+            parallel = session.validate(bundle)
+            assert session._pool is not None
+        assert parallel.is_valid == serial.is_valid
+        assert [e.message for e in parallel.errors] == [e.message for e in serial.errors]
+        assert [e.code for e in parallel.errors] == [e.code for e in serial.errors]
+        assert parallel.warnings == serial.warnings
+        if 'enforce_refs' in kwargs:
+            assert any(e.code == '203' for e in parallel.errors)
+        elif not kwargs:
+            # From the bundle schema, which the workers check the objects against
+            assert any(e.message.startswith(bundle['id'] + ': objects[5]: ') and
+                       e.message.endswith('is not a valid identity object')
+                       for e in parallel.errors)
+
+
+def test_parallel_files():
+    files = [EXAMPLE, IDENTITY, IDENTITY_CUSTOM, INVALID_IDENTITY, INVALID_COMMA,
+             INVALID_TIMESTAMP]
+
+    def summary(results):
+        return [(r.filepath, r.is_valid, bool(r.fatal),
+                 [[e.message for e in o.errors] for o in r.object_results],
+                 [o.warnings for o in r.object_results])
+                for r in results]
+
+    serial = run_validation(ValidationOptions(files=files))
+    parallel = run_validation(ValidationOptions(files=files, jobs=2, chunk_size=2))
+    assert summary(parallel) == summary(serial)
+
+    unordered = run_validation(ValidationOptions(files=files, jobs=2, ordered=False))
+    assert sorted(summary(unordered)) == sorted(summary(serial))
+
+    results = run_validation(ValidationOptions(files=[INVALID_IDENTITY] * 50, jobs=2,
+                                               chunk_size=1, max_errors=1))
+    assert len(results) == 50
+    assert results[0].object_result.errors
+    assert 1 <= sum(1 for r in results if r.object_results) < 50
+
+
+def test_parallel_bundle_max_errors(monkeypatch):
+    monkeypatch.setattr(validator, 'BUNDLE_BATCH_SIZE', 2)
+    monkeypatch.setattr(validator, 'POOL_BACKLOG', 1)
+    invalid_tool = dict(json.loads(VALID_TOOL), created='bad-date')
+    bundle = {
+        "type": "bundle",
+        "id": "bundle--44298a74-ba52-4f0c-87a3-1824e67d7fad",
+        "objects": [invalid_tool] * 40,
+    }
+
+    with ValidationSession(ValidationOptions(max_errors=1), jobs=2) as session:
+        pool = session._start_pool()
+        apply_async = pool.apply_async
+        batches = []
+
+        def counting_apply_async(function, args):
+            batches.append(args)
+            return apply_async(function, args)
+
+        monkeypatch.setattr(pool, 'apply_async', counting_apply_async)
+        results = session.validate(bundle)
+    assert results.truncated
+    assert len(results.errors) == 1
+    # Only the batches given to the workers before the first error came back
+    # were validated, not all 20
+    assert len(batches) <= 3
+
+
+def test_worker_options_picklable():
+    options = ValidationOptions(files=[sys.stdin], disabled='202', jobs=2, chunk_size=4)
+    values = validator._worker_options(options)
+    assert 'files' not in values
+    assert 'jobs' not in values
+    values = pickle.loads(pickle.dumps(values))
+    worker_options = ValidationOptions(**values)
+    assert worker_options.disabled == options.disabled
+    assert worker_options.max_errors == options.max_errors
+
+
+def test_timestamp_error():
+    TIMESTAMP_CACHE.clear()
+    assert timestamp_error('2016-04-06T20:03:48Z') is None
+    assert timestamp_error('2016-04-06T20:03:48.123456789Z') is None
+    assert timestamp_error('2016-02-29T00:00:00Z') is None
+    assert timestamp_error('2000-02-29T00:00:00Z') is None
+    for value in ['1900-02-29T00:00:00Z', '2017-02-29T00:00:00Z', '2016-04-31T00:00:00.000Z']:
+        assert timestamp_error(value) == 'day is out of range for month: ' + value
+    assert (timestamp_error('2016-12-31T23:59:60Z') ==
+            'second must be in 0..59: 2016-12-31T23:59:60Z')
+    assert (timestamp_error('0000-01-01T00:00:00Z') ==
+            'year 0 is out of range: 0000-01-01T00:00:00Z')
+
+    # Left to the schemas
+    for value in ['2016-13-01T00:00:00Z', '2016-04-06T24:00:00Z', '2016-04-06T20:03:48',
+                  '2016-04-06 20:03:48Z', '2016-04-06T20:03:48Z\n', 'bad-date', 1]:
+        assert timestamp_error(value) is None
+
+    assert timestamp_error('2016-02-29T00:00:00Z') is None
+    assert TIMESTAMP_CACHE.hits == 1
+
+    tool = dict(json.loads(VALID_TOOL), modified='2017-02-29T00:00:00.000Z')
+    results = validate_parsed_json(tool)
+    assert [e.message for e in results.errors] == [
+        "%s: 'modified': '2017-02-29T00:00:00.000Z' is not a valid timestamp: "
+        "day is out of range for month: 2017-02-29T00:00:00.000Z" % tool['id']]
+
+
+def test_timestamp_nanoseconds():
+    epoch = datetime.datetime(1970, 1, 1)
+    for value in ['1970-01-01T00:00:00Z', '1969-12-31T23:59:59.999Z', '0001-01-01T00:00:00Z',
+                  '1600-02-29T12:00:00Z', '2016-02-29T20:03:48.123Z', '9999-12-31T23:59:59Z']:
+        parsed = datetime.datetime.strptime(value.replace('Z', '').split('.')[0],
+                                            '%Y-%m-%dT%H:%M:%S')
+        fraction = value[20:-1] if '.' in value else ''
+        expected = ((parsed - epoch).days * 86400 + (parsed - epoch).seconds) * 10 ** 9
+        expected += int(fraction.ljust(9, '0'))
+        assert timestamp_nanoseconds(value) == expected
+    assert (timestamp_nanoseconds('2016-04-06T20:03:48Z') ==
+            timestamp_nanoseconds('2016-04-06T20:03:48.000000000000Z'))
+    assert timestamp_nanoseconds('2016-02-30T00:00:00Z') is None
+    assert timestamp_nanoseconds('bad-date') is None
+
+
+def test_timestamp_compare_precision():
+    indicator = json.loads(VALID_INDICATOR)
+    indicator['valid_from'] = '2016-04-06T20:03:48Z'
+    indicator['valid_until'] = '2016-04-06T20:03:48.001Z'
+    assert validate_parsed_json(indicator).is_valid
+    indicator['valid_until'] = '2016-04-06T20:03:48.000Z'
+    assert not validate_parsed_json(indicator).is_valid
+
+
+def test_schema_error_pickle():
+    tool = json.loads(VALID_TOOL)
+    tool['created'] = 'bad-date'
+    tool['x-bad_prop'] = 'a'
+    results = validate_parsed_json(tool, ValidationOptions(strict=True))
+    errors = pickle.loads(pickle.dumps(results.errors))
+    assert [e.message for e in errors] == [e.message for e in results.errors]
+    assert [e.code for e in errors] == [e.code for e in results.errors]
@@ -75,6 +75,24 @@ class ObservedDataTestCases(ValidatorTest):
 
         self.check_ignore(observed_data, 'observable-dictionary-keys')
 
+    def test_embedded_observable_visitor_checks(self):
+        observed_data = copy.deepcopy(self.valid_observed_data)
+        del observed_data['object_refs']
+        observed_data['objects'] = {
+            "0": {
+                "type": "file",
+                "id": "file--ff1e0780-358c-5808-a8c7-d0fca4ef6ef4",
+                "name": "foo.zip",
+                "hashes": {"FOO": "B365B9A80A06906FC9B400C06C33FF43"},
+                "foo_bar": "baz",
+                "extensions": {"foo-ext": {"x_baz": 1}},
+            },
+        }
+        results = validate_parsed_json(observed_data)
+        codes = [w.split(': ', 1)[1][:5] for w in results.warnings
+                 if w.startswith('file--ff1e0780-358c-5808-a8c7-d0fca4ef6ef4: ')]
+        self.assertEqual(sorted(codes), ['{101}', '{101}', '{241}'])
+
     def test_dict_key_length(self):
         observed_data = {
             "type": "file",
@@ -668,6 +686,12 @@ class ObservedDataTestCases(ValidatorTest):
         observed_data['hashes'][hash_name] = "8D98A25E9D0662B1F4CA3BF22D6F53E9"
         self.assertFalseWithOptions(observed_data)
         self.check_ignore(observed_data, ['hash-length', 'hash-algo'])
+        self.assertFalseWithOptions(observed_data, disabled='hash-algo')
+        results = validate_parsed_json(observed_data)
+        self.assertIn("%s: {150} Object '%s' has a 'hashes' dictionary with a "
+                      "hash of type '%s', which is longer than 30 characters."
+                      % (observed_data['id'], observed_data['id'], hash_name),
+                      results.warnings)
 
         observed_data = copy.deepcopy(self.valid_object)
         hash_name = "MD"
@@ -0,0 +1,353 @@
+import copy
+import json
+import os
+import threading
+import time
+
+from jsonschema.exceptions import RefResolutionError
+import pytest
+
+from . import ValidatorTest
+from ... import ValidationOptions, validate_parsed_json
+from ...schemas import (SCHEMA_ENGINES, VALIDATOR_CACHE, SchemaIndex,
+                        build_schema_snapshot, find_schema,
+                        get_composed_validator, get_schema_index,
+                        get_validator, load_schema_snapshot, schema_store)
+from ...util import LRUCache
+
+SCHEMAS_21 = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'schemas-2.1'))
+
+INVALID_BUNDLE = {
+    "type": "bundle",
+    "id": "bundle--44af6c39-c09b-49c5-9de2-394224b04982",
+    "objects": [
+        {
+            "type": "malware",
+            "spec_version": "2.1",
+            "id": "malware--31b940d4-6f7f-459a-80ea-9c1f17b5891b",
+            "created": "2016-04-06T20:07:09.000Z",
+            "modified": "2016-04-06T20:07:09.000Z",
+            "is_family": "yes",
+        },
+        {
+            "type": "malware",
+            "spec_version": "2.1",
+            "id": "malware--41b940d4-6f7f-459a-80ea-9c1f17b5891b",
+            "created": "2016-04-06T20:07:09.000Z",
+            "modified": "2016-04-06T20:07:09.000Z",
+            "is_family": False,
+        },
+    ],
+}
+
+
+def test_schema_index_bundled():
+    index = get_schema_index(SCHEMAS_21)
+    assert index is get_schema_index(SCHEMAS_21 + '/')
+
+    path = index.find('indicator')
+    assert path.endswith(os.path.join('sdos', 'indicator.json'))
+    assert index.find('x-not-a-type') is None
+    assert 'examples' not in path
+
+
+def test_schema_index_custom():
+    path = find_schema(ValidatorTest.custom_schemas, 'x-foo-bar')
+    assert path == os.path.join(ValidatorTest.custom_schemas, 'x-foo-bar.json')
+
+
+def test_schema_index_invalidation(tmpdir):
+    tmpdir.join('x-first.json').write('{}')
+    index = SchemaIndex(str(tmpdir), check_interval=0)
+    assert index.find('x-first') is not None
+    assert index.find('x-second') is None
+
+    tmpdir.join('x-second.json').write('{}')
+    # Make sure the change is visible even on filesystems with coarse mtimes
+    later = time.time() + 10
+    os.utime(str(tmpdir), (later, later))
+
+    assert index.find('x-second') == str(tmpdir.join('x-second.json'))
+
+
+def test_schema_hot_reload(tmpdir):
+    schema_file = tmpdir.join('x-reloaded.json')
+    schema_file.write('{"required": ["a"]}')
+    index = get_schema_index(str(tmpdir))
+    index.check_interval = 0
+    assert index.reloads == 0
+    assert index.last_reload is None
+    validator = get_validator(str(tmpdir), 'x-reloaded')
+    assert not validator.is_valid({'b': 1})
+
+    # Edit the file in place, which doesn't change the directory's mtime
+    schema_file.write('{"required": ["b"]}')
+    later = time.time() + 10
+    os.utime(str(schema_file), (later, later))
+
+    reloaded = get_validator(str(tmpdir), 'x-reloaded')
+    assert reloaded is not validator
+    assert reloaded.is_valid({'b': 1})
+    assert not validator.is_valid({'b': 1})
+    assert index.reloads == 1
+    assert index.last_reload is not None
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert 'b' not in cache
+    assert cache.get('b') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.clear()
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_validator_cache():
+    VALIDATOR_CACHE.clear()
+    validator = get_validator(SCHEMAS_21, 'indicator', '2.1')
+    assert get_validator(SCHEMAS_21, 'indicator', '2.1') is validator
+    assert get_validator(SCHEMAS_21, 'malware', '2.1') is not validator
+    assert VALIDATOR_CACHE.hits == 1
+    assert VALIDATOR_CACHE.misses == 2
+
+
+def test_validator_cache_per_thread():
+    validator = get_validator(SCHEMAS_21, 'indicator', '2.1')
+    other = []
+    thread = threading.Thread(target=lambda: other.append(
+        get_validator(SCHEMAS_21, 'indicator', '2.1')))
+    thread.start()
+    thread.join()
+
+    assert other[0] is not validator
+    assert other[0].resolver is not validator.resolver
+    assert get_validator(SCHEMAS_21, 'indicator', '2.1') is validator
+
+
+def test_validator_cache_clear_all_threads():
+    VALIDATOR_CACHE.clear()
+    get_validator(SCHEMAS_21, 'indicator', '2.1')
+    cleared = threading.Event()
+    other = []
+
+    def validate_twice():
+        other.append(get_validator(SCHEMAS_21, 'indicator', '2.1'))
+        cleared.wait()
+        other.append(get_validator(SCHEMAS_21, 'indicator', '2.1'))
+
+    thread = threading.Thread(target=validate_twice)
+    thread.start()
+    while not other:
+        time.sleep(0.01)
+    # The counters and length cover both threads
+    assert len(VALIDATOR_CACHE) == 2
+    assert VALIDATOR_CACHE.misses == 2
+
+    # E.g. when a schema is reloaded, no thread may keep using the old one
+    VALIDATOR_CACHE.clear()
+    assert len(VALIDATOR_CACHE) == 0
+    cleared.set()
+    thread.join()
+    assert other[1] is not other[0]
+
+
+def test_schema_variant_is_separate():
+    original = get_validator(SCHEMAS_21, 'observed-data', '2.1')
+    variant = get_validator(SCHEMAS_21, 'observed-data', '2.1', 'deferred-objects')
+
+    assert variant is not original
+    objects_schema = original.schema['allOf'][1]['properties']['objects']
+    assert 'patternProperties' in objects_schema
+    assert 'patternProperties' not in variant.schema['allOf'][1]['properties']['objects']
+
+
+def test_deferred_objects_variant():
+    variant = get_validator(SCHEMAS_21, 'observed-data', '2.1', 'deferred-objects')
+    observed_data = {
+        "type": "observed-data",
+        "spec_version": "2.1",
+        "id": "observed-data--b67d30ff-02ac-498a-92f9-32f845f448cf",
+        "created": "2016-04-06T19:58:16.000Z",
+        "modified": "2016-04-06T19:58:16.000Z",
+        "first_observed": "2015-12-21T19:00:00Z",
+        "last_observed": "2015-12-21T19:00:00Z",
+        "number_observed": 50,
+        "objects": {"0": {"type": "x-anything"}},
+    }
+    assert variant.is_valid(observed_data)
+
+    observed_data['objects'] = [{"type": "x-anything"}]
+    assert not variant.is_valid(observed_data)
+    observed_data['objects'] = {}
+    assert not variant.is_valid(observed_data)
+
+
+CORE_ID = 'http://raw.githubusercontent.com/oasis-open/cti-stix2-json-schemas/stix2.1/schemas/common/core.json'
+
+
+def test_preloaded_store():
+    assert CORE_ID in schema_store(SCHEMAS_21)
+
+    validator = get_validator(SCHEMAS_21, 'indicator', '2.1')
+    assert CORE_ID in validator.resolver.store
+
+
+def test_schema_store_scoped(tmpdir):
+    shared_id = 'http://example.com/x-shared.json'
+    for name, shared_type in (('a', 'string'), ('b', 'integer')):
+        schema_dir = tmpdir.mkdir(name)
+        schema_dir.join('x-shared.json').write(json.dumps({'$id': shared_id, 'type': shared_type}))
+        schema_dir.join('x-user.json').write(json.dumps({'$ref': shared_id}))
+    validator_a = get_validator(str(tmpdir.join('a')), 'x-user')
+    validator_b = get_validator(str(tmpdir.join('b')), 'x-user')
+
+    assert validator_a.is_valid('text') and not validator_a.is_valid(1)
+    assert validator_b.is_valid(1) and not validator_b.is_valid('text')
+
+    # Replacing a bundled schema only applies to the custom directory
+    override = tmpdir.mkdir('override')
+    override.join('core.json').write(json.dumps({'$id': CORE_ID, 'type': 'string'}))
+    assert schema_store(str(override))[CORE_ID]['type'] == 'string'
+    assert schema_store(SCHEMAS_21)[CORE_ID]['type'] == 'object'
+
+
+def test_remote_ref_refused(tmpdir):
+    tmpdir.join('x-remote.json').write('{"$ref": "http://example.com/missing.json"}')
+    validator = get_validator(str(tmpdir), 'x-remote')
+
+    with pytest.raises(RefResolutionError):
+        list(validator.iter_errors({'type': 'x-remote'}))
+
+
+def test_schema_snapshot(tmpdir):
+    schema_dir = tmpdir.mkdir('schemas')
+    schema_dir.join('x-snap.json').write('{"$id": "http://example.com/x-snap.json", "type": "object"}')
+    path = build_schema_snapshot(str(tmpdir.join('snapshot')), [str(schema_dir)])
+
+    assert load_schema_snapshot(path)
+    assert 'http://example.com/x-snap.json' in schema_store(str(schema_dir))
+    assert find_schema(str(schema_dir), 'x-snap') == str(schema_dir.join('x-snap.json'))
+
+    # Edited schemas are reloaded when they are used
+    schema_dir.join('x-snap.json').write('{"$id": "http://example.com/x-snap.json", "type": "string", "minLength": 1}')
+    assert load_schema_snapshot(path)
+    assert get_validator(str(schema_dir), 'x-snap').is_valid('text')
+
+    # Adding or removing schemas invalidates the snapshot
+    schema_dir.join('x-other.json').write('{"type": "string"}')
+    assert not load_schema_snapshot(path)
+    assert not load_schema_snapshot(str(tmpdir.join('missing')))
+
+
+def _error_details(error):
+    return (error.message, list(error.path), list(error.schema_path),
+            error.validator, error.validator_value, error.instance,
+            [_error_details(e) for e in error.context])
+
+
+@pytest.mark.parametrize('instance', [
+    {"type": "indicator"},
+    {"type": "indicator", "spec_version": "2.1", "id": "indicator--1", "created": 5,
+     "modified": "2016-04-06T20:03:48.000Z", "pattern": "[file:size = 1]",
+     "pattern_type": "stix", "valid_from": "2016-04-06T20:03:48.000Z",
+     "indicator_types": "malicious-activity", "kill_chain_phases": [{}]},
+    {"type": "indicator", "spec_version": "2.1", "id": "indicator--a932fcc6-e032-476c-826f-cb970a5a1ade",
+     "created": "2016-04-06T20:03:48.000Z", "modified": "2016-04-06T20:03:48.000Z",
+     "pattern": "[file:size = 1]", "pattern_type": "stix",
+     "valid_from": "2016-04-06T20:03:48.000Z"},
+    [],
+])
+def test_compiled_engine_same_errors(instance):
+    validator = get_validator(SCHEMAS_21, 'indicator', '2.1')
+    compiled = get_validator(SCHEMAS_21, 'indicator', '2.1', engine='compiled')
+
+    expected = [_error_details(e) for e in validator.iter_errors(instance)]
+    assert [_error_details(e) for e in compiled.iter_errors(instance)] == expected
+    assert compiled.is_valid(instance) == (not expected)
+
+
+def test_compiled_engine_remote_ref_refused(tmpdir):
+    tmpdir.join('x-remote.json').write('{"$ref": "http://example.com/missing.json"}')
+    validator = get_validator(str(tmpdir), 'x-remote', engine='compiled')
+
+    with pytest.raises(RefResolutionError):
+        list(validator.iter_errors({'type': 'x-remote'}))
+
+
+@pytest.mark.parametrize('engine', SCHEMA_ENGINES)
+def test_composed_validator(tmpdir, engine):
+    first = tmpdir.mkdir('first')
+    first.join('x-layered.json').write('{"allOf": [{"$ref": "%s"}], "required": ["a"]}' % CORE_ID)
+    second = tmpdir.mkdir('second')
+    second.join('x-layered.json').write('{"allOf": [{"$ref": "%s"}], "required": ["b"]}' % CORE_ID)
+
+    validator = get_composed_validator([(str(first), 'x-layered', None),
+                                        (str(second), 'x-layered', None)], '2.1', engine)
+    messages = [e.message for e in validator.iter_errors({'type': 'x-layered'})]
+    assert "'a' is a required property" in messages
+    assert "'b' is a required property" in messages
+    assert messages.index("'a' is a required property") < messages.index("'b' is a required property")
+    # The core properties are only checked once
+    assert messages.count("'id' is a required property") == 1
+
+    options = ValidationOptions(schema_dir=[str(first), str(second)])
+    assert options.schema_dirs == [str(first), str(second)]
+    instance = {
+        "type": "x-layered",
+        "spec_version": "2.1",
+        "id": "x-layered--31b940d4-6f7f-459a-80ea-9c1f17b5891b",
+        "created": "2016-04-06T20:07:09.000Z",
+        "modified": "2016-04-06T20:07:09.000Z",
+        "a": 1,
+    }
+    results = validate_parsed_json(instance, options)
+    assert not results.is_valid
+    assert any("'b' is a required property" in e.message for e in results.errors)
+
+
+class CompiledEngineTestCases(ValidatorTest):
+
+    def test_invalid_object(self):
+        instance = {
+            "type": "malware",
+            "spec_version": "2.1",
+            "id": "malware--31b940d4-6f7f-459a-80ea-9c1f17b5891b",
+            "created": "2016-04-06T20:07:09.000Z",
+            "modified": "2016-04-06T20:07:09.000Z",
+            "is_family": "yes",
+        }
+        self.assertFalseWithOptions(instance, schema_engine='compiled')
+        instance['is_family'] = False
+        self.assertTrueWithOptions(instance, schema_engine='compiled')
+
+    def test_two_phase_same_results(self):
+        instance = copy.deepcopy(INVALID_BUNDLE)
+        for engine in SCHEMA_ENGINES:
+            results = [validate_parsed_json(instance, ValidationOptions(schema_engine=engine, two_phase=two_phase))
+                       for two_phase in (False, True)]
+            assert not results[0].is_valid
+            assert [e.message for e in results[0].errors] == [e.message for e in results[1].errors]
+
+    def test_two_phase_default(self):
+        # Only the compiled engine checks validity faster than it collects errors
+        assert not ValidationOptions().two_phase
+        assert ValidationOptions(schema_engine='compiled').two_phase
+        assert not ValidationOptions(schema_engine='compiled', two_phase=False).two_phase
+
+    def test_envelope_only(self):
+        instance = copy.deepcopy(INVALID_BUNDLE)
+        full = validate_parsed_json(instance, ValidationOptions())
+        envelope = validate_parsed_json(instance, ValidationOptions(envelope_only=True))
+        assert not envelope.is_valid
+        assert set(e.message for e in envelope.errors) < set(e.message for e in full.errors)
+        assert not any(e.message.startswith(instance['id']) for e in envelope.errors)
+
+        instance['objects'][0]['is_family'] = False
+        self.assertTrueWithOptions(instance, envelope_only=True)
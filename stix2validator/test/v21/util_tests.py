@@ -1,4 +1,5 @@
 from ... import parse_args, validate_string
+from ...util import cyber_observable_check
 from .indicator_tests import VALID_INDICATOR
 
 
@@ -44,3 +45,33 @@ def test_parse_args_no_files():
 
     results = validate_string(VALID_INDICATOR, options)
     assert results.is_valid
+
+
+def _observed_data(n):
+    return {
+        "type": "observed-data",
+        "id": "observed-data--b67d30ff-02ac-498a-92f9-32f845f448cf",
+        "objects": dict((str(i), {"type": "file", "name": "f%d" % i})
+                        for i in range(n)),
+    }
+
+
+def test_cyber_observable_check_linear():
+    calls = []
+
+    @cyber_observable_check("2.1")
+    def count_calls(instance):
+        calls.append(instance['name'])
+        if instance['name'] == 'f0':
+            yield instance['id']
+
+    for n in (1, 10, 1000):
+        del calls[:]
+        results = list(count_calls(_observed_data(n)))
+        # Called exactly once per embedded object, with the container's id
+        assert sorted(calls) == sorted("f%d" % i for i in range(n))
+        assert results == ["observed-data--b67d30ff-02ac-498a-92f9-32f845f448cf"]
+
+    del calls[:]
+    list(count_calls({"type": "file", "id": "file--1", "name": "top"}))
+    assert calls == ["top"]
@@ -0,0 +1,123 @@
+"""Parsing and checking the timestamps of STIX objects.
+
+STIX timestamps have a fixed layout, ``YYYY-MM-DDTHH:mm:ss[.s+]Z``, so they
+are parsed directly rather than with a general purpose date parser, into the
+number of nanoseconds since the epoch. The same timestamps tend to recur
+across the checks of an object and across the objects of a feed, so each is
+parsed once and its result cached.
+"""
+
+from collections import namedtuple
+import re
+
+from six import string_types
+
+from .util import LRUCache
+
+#: Maximum number of timestamps kept in ``TIMESTAMP_CACHE``.
+TIMESTAMP_CACHE_SIZE = 8192
+
+_TIMESTAMP_RE = re.compile(r'([0-9]{4})-([0-9]{2})-([0-9]{2})T'
+                           r'([0-9]{2}):([0-9]{2}):([0-9]{2})(?:\.([0-9]+))?Z\Z')
+
+_DAYS_IN_MONTH = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+_NANOSECONDS_PER_SECOND = 10 ** 9
+
+
+class ParsedTimestamp(namedtuple('ParsedTimestamp', ['nanoseconds', 'error'])):
+    """The result of parsing a timestamp.
+
+    Attributes:
+        nanoseconds: The number of nanoseconds since the epoch, or None if
+            the value is not a valid timestamp.
+        error: Why the value is not a valid timestamp, if it is laid out
+            like one; see ``timestamp_error()``.
+    """
+    __slots__ = ()
+
+
+_NOT_A_TIMESTAMP = ParsedTimestamp(None, None)
+
+#: The results of ``parse_timestamp()`` for the timestamps seen.
+TIMESTAMP_CACHE = LRUCache(TIMESTAMP_CACHE_SIZE)
+
+
+def _is_leap_year(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def _days_since_epoch(year, month, day):
+    """Return the number of days from 1970-01-01 to the given date of the
+    proleptic Gregorian calendar.
+    """
+    # Count from March 1st, so that leap days end the year
+    if month <= 2:
+        year -= 1
+        month += 9
+    else:
+        month -= 3
+    era, year_of_era = divmod(year, 400)
+    day_of_year = (153 * month + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def parse_timestamp(value):
+    """Return the ParsedTimestamp of `value`, from ``TIMESTAMP_CACHE`` if it
+    was parsed before.
+    """
+    if not isinstance(value, string_types):
+        return _NOT_A_TIMESTAMP
+    parsed = TIMESTAMP_CACHE.get(value)
+    if parsed is None:
+        parsed = _parse_timestamp(value)
+        TIMESTAMP_CACHE.put(value, parsed)
+    return parsed
+
+
+def timestamp_nanoseconds(value):
+    """Return the number of nanoseconds since the epoch of the timestamp
+    `value`, or None if it is not a valid timestamp. Digits of fractional
+    seconds beyond nanoseconds are ignored, so timestamps of any precision
+    can be compared by this number.
+    """
+    return parse_timestamp(value).nanoseconds
+
+
+def timestamp_error(value):
+    """Return why `value` is not a valid timestamp, or None if it is.
+
+    Values which are not laid out like a timestamp, with a month, day, hour,
+    minute and second in range, are left to the schemas, which report them
+    more clearly: None is returned for them as well. So the errors are those
+    of dates which do not exist, like February 30th, and leap seconds.
+    """
+    return parse_timestamp(value).error
+
+
+def _parse_timestamp(value):
+    match = _TIMESTAMP_RE.match(value)
+    if match is None:
+        return _NOT_A_TIMESTAMP
+    year, month, day, hour, minute, second = [int(x) for x in match.groups()[:6]]
+    if not (1 <= month <= 12 and 1 <= day <= 31 and hour <= 23 and
+            minute <= 59 and second <= 60):
+        return _NOT_A_TIMESTAMP
+
+    # The errors are worded as python-dateutil's, which used to check them
+    if year == 0:
+        return ParsedTimestamp(None, 'year 0 is out of range: ' + value)
+    days = _DAYS_IN_MONTH[month]
+    if month == 2 and _is_leap_year(year):
+        days = 29
+    if day > days:
+        return ParsedTimestamp(None, 'day is out of range for month: ' + value)
+    if second == 60:
+        return ParsedTimestamp(None, 'second must be in 0..59: ' + value)
+
+    seconds = (_days_since_epoch(year, month, day) * 86400 +
+               hour * 3600 + minute * 60 + second)
+    fraction = match.group(7) or ''
+    nanoseconds = int(fraction[:9].ljust(9, '0'))
+    return ParsedTimestamp(seconds * _NANOSECONDS_PER_SECOND + nanoseconds, None)
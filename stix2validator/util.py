@@ -1,15 +1,19 @@
 import argparse
 from argparse import RawDescriptionHelpFormatter
-from collections import Iterable
+from collections import Iterable, OrderedDict
+import copy
 import datetime
 import errno
 import os
 import sys
 import textwrap
+import threading
+import weakref
 
 from appdirs import AppDirs
 import requests_cache
 
+from .errors import DEFAULT_CONTEXT_LIMIT
 from .output import set_level, set_silent
 from .v20.enums import CHECK_CODES as CHECK_CODES20
 from .v21.enums import CHECK_CODES as CHECK_CODES21
@@ -187,7 +191,8 @@ def parse_args(cmd_args, is_script=False):
         dest="schema_dir",
         help="Custom schema directory. If provided, input will be validated "
              "against these schemas in addition to the STIX schemas bundled "
-             "with this script."
+             "with this script. Several directories can be given, separated "
+             "by '{}'; their schemas are applied in that order.".format(os.pathsep)
     )
     parser.add_argument(
         "--version",
@@ -299,6 +304,121 @@ def parse_args(cmd_args, is_script=False):
              "within the same bundle."
     )
 
+    parser.add_argument(
+        "--schema-engine",
+        dest="schema_engine",
+        choices=["jsonschema", "compiled"],
+        default="jsonschema",
+        help="The engine used for JSON schema validation. \"compiled\" "
+             "compiles the schemas into Python functions, which report the "
+             "same errors as \"jsonschema\", faster. Default is "
+             "\"jsonschema\"."
+    )
+
+    parser.add_argument(
+        "--envelope-only",
+        dest="envelope_only",
+        action="store_true",
+        default=False,
+        help="Validate bundles against the bundle schema without matching "
+             "the objects they contain against every object schema. Each "
+             "object is still validated against the schema for its type. "
+             "This omits the extra bundle-level error reported for each "
+             "invalid object."
+    )
+
+    parser.add_argument(
+        "--two-phase",
+        dest="two_phase",
+        action="store_true",
+        default=None,
+        help="First only check each object for validity against its schemas, "
+             "which stops at the first error, and collect schema errors for "
+             "invalid objects only. This only helps the \"compiled\" schema "
+             "engine, with which it is the default; with \"jsonschema\", "
+             "checking validity walks the schemas as collecting the errors "
+             "does, so invalid objects are walked twice."
+    )
+
+    parser.add_argument(
+        "--single-phase",
+        dest="two_phase",
+        action="store_false",
+        help="Always collect every schema error of each object, even with "
+             "the \"compiled\" schema engine."
+    )
+
+    parser.add_argument(
+        "--build-schema-cache",
+        dest="build_schema_cache",
+        action="store_true",
+        default=False,
+        help="Write a snapshot of all the schemas (including those in "
+             "--schemas, if given) which later runs load in a single read, "
+             "then exit."
+    )
+
+    parser.add_argument(
+        "--max-errors",
+        dest="max_errors",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Stop validating after N errors have been found. The remaining "
+             "checks of the object, the remaining objects of the file and the "
+             "remaining files are skipped, and their results are marked as "
+             "truncated."
+    )
+
+    parser.add_argument(
+        "--fail-fast",
+        dest="max_errors",
+        action="store_const",
+        const=1,
+        help="Stop validating at the first error. Same as --max-errors 1."
+    )
+
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Validate the files, or the objects of large bundles, in N "
+             "worker processes. Use 0 for one per CPU. [default: %(default)s]"
+    )
+
+    parser.add_argument(
+        "--chunk-size",
+        dest="chunk_size",
+        type=int,
+        default=16,
+        metavar="N",
+        help="With several jobs, send N files at a time to each worker "
+             "process. [default: %(default)s]"
+    )
+
+    parser.add_argument(
+        "--unordered",
+        dest="ordered",
+        action="store_false",
+        default=True,
+        help="With several jobs, report the results of each file as soon as "
+             "it is validated, instead of in the order of the files."
+    )
+
+    parser.add_argument(
+        "--context-limit",
+        dest="context_limit",
+        type=int,
+        default=DEFAULT_CONTEXT_LIMIT,
+        metavar="N",
+        help="Cut the snippets of instances and schemas included in verbose "
+             "error messages after N characters. Use 0 for no limit. "
+             "[default: %(default)s]"
+    )
+
     args = parser.parse_args(cmd_args)
 
     if not is_script:
@@ -327,7 +447,9 @@ class ValidationOptions(object):
         files: A list of input files and directories of files to be
             validated.
         recursive: Recursively descend into input directories.
-        schema_dir: A user-defined schema directory to validate against.
+        schema_dir: A user-defined schema directory to validate against, or a
+            list of them (also accepted as a single string separated by
+            ``os.pathsep``).
         disabled: List of "SHOULD" checks that will be skipped.
         enabled: List of "SHOULD" checks that will be performed.
         strict: Specifies that recommended requirements should produce errors
@@ -345,13 +467,44 @@ class ValidationOptions(object):
             should be cleared after validation.
         enforce_refs:Ensures that all SDOs being referenced by the SRO are
             contained within the same bundle
+        schema_engine: The engine used for JSON schema validation, either
+            "jsonschema" or "compiled".
+        envelope_only: Specifies that bundles should be validated against the
+            bundle schema without validating the objects they contain against
+            it; they are still validated against their own schemas.
+        two_phase: Specifies that objects should first only be checked for
+            validity against their schemas, and that their schema errors
+            should be collected only if they are invalid. The results are the
+            same either way. This only saves time with the 'compiled' schema
+            engine, so None, the default, turns it on with that engine only.
+        build_schema_cache: Specifies that a snapshot of the schemas should be
+            written instead of validating any input.
+        max_errors: Stop validating once this many errors have been found,
+            or None to find them all. The limit applies to each object, to
+            each file and to a whole run of the command line script; results
+            which were cut short, and those of the objects and files left
+            unvalidated, are marked as truncated.
+        context_limit: The maximum number of characters of each snippet of an
+            instance or schema included in verbose error messages, or 0 for
+            no limit.
+        jobs: The number of worker processes in which to validate the files,
+            or the objects of large bundles, or 0 for one per CPU. With 1,
+            everything is validated in this process.
+        chunk_size: The number of files sent at a time to each worker
+            process.
+        ordered: Whether the results of files validated in worker processes
+            are reported in the order of the files, or as each is ready.
 
     """
     def __init__(self, cmd_args=None, version=None, verbose=False, silent=False,
                  files=None, recursive=False, schema_dir=None,
                  disabled="", enabled="", strict=False,
                  strict_types=False, strict_properties=False, no_cache=False,
-                 refresh_cache=False, clear_cache=False, enforce_refs=False):
+                 refresh_cache=False, clear_cache=False, enforce_refs=False,
+                 schema_engine="jsonschema", envelope_only=False, two_phase=None,
+                 build_schema_cache=False, max_errors=None,
+                 context_limit=DEFAULT_CONTEXT_LIMIT, jobs=1, chunk_size=16,
+                 ordered=True):
 
         if cmd_args is not None:
             self.version = cmd_args.version
@@ -369,6 +522,15 @@ class ValidationOptions(object):
             self.refresh_cache = cmd_args.refresh_cache
             self.clear_cache = cmd_args.clear_cache
             self.enforce_refs = cmd_args.enforce_refs
+            self.schema_engine = cmd_args.schema_engine
+            self.envelope_only = cmd_args.envelope_only
+            self.two_phase = cmd_args.two_phase
+            self.build_schema_cache = cmd_args.build_schema_cache
+            self.max_errors = cmd_args.max_errors
+            self.context_limit = cmd_args.context_limit
+            self.jobs = cmd_args.jobs
+            self.chunk_size = cmd_args.chunk_size
+            self.ordered = cmd_args.ordered
         else:
             # input options
             self.version = version
@@ -385,26 +547,63 @@ class ValidationOptions(object):
             self.disabled = disabled
             self.enabled = enabled
             self.enforce_refs = enforce_refs
+            self.schema_engine = schema_engine
+            self.envelope_only = envelope_only
+            self.two_phase = two_phase
+            self.max_errors = max_errors
+            self.context_limit = context_limit
+            self.jobs = jobs
+            self.chunk_size = chunk_size
+            self.ordered = ordered
 
             # cache options
             self.no_cache = no_cache
             self.refresh_cache = refresh_cache
             self.clear_cache = clear_cache
+            self.build_schema_cache = build_schema_cache
+
+        self._check_codes_set = None
+
+        if self.two_phase is None:
+            self.two_phase = self.schema_engine == 'compiled'
 
         # Set the output level (e.g., quiet vs. verbose)
         if self.silent and self.verbose:
             raise ValueError('Error: Output can either be silent or verbose, but not both.')
+        if self.max_errors is not None and self.max_errors < 1:
+            raise ValueError('Error: The maximum number of errors must be at least 1.')
+        if self.context_limit < 0:
+            raise ValueError('Error: The context limit must not be negative.')
+        if self.jobs < 0:
+            raise ValueError('Error: The number of jobs must not be negative.')
+        if self.chunk_size < 1:
+            raise ValueError('Error: The chunk size must be at least 1.')
         set_level(self.verbose)
         set_silent(self.silent)
 
         self.set_check_codes()
 
+    @property
+    def schema_dirs(self):
+        """The user-defined schema directories, as a list."""
+        if not self.schema_dir:
+            return []
+        if isinstance(self.schema_dir, (list, tuple)):
+            return list(self.schema_dir)
+        return self.schema_dir.split(os.pathsep)
+
     def set_check_codes(self, version=None):
         """Set which checks are enabled/disabled.
         """
         if version is None:
             version = self.version
 
+        # This is called for every validated object, so skip the conversion
+        # when it was already done for the same settings.
+        settings = (version, self.disabled, self.enabled)
+        if settings == self._check_codes_set:
+            return
+
         if version == '2.0':
             check_codes = CHECK_CODES20
         else:
@@ -423,6 +622,10 @@ class ValidationOptions(object):
             self.enabled = [check_codes[x] if x in check_codes else x
                             for x in self.enabled]
 
+        # Copies, so that later changes to the lists are noticed
+        self._check_codes_set = (version, copy.copy(self.disabled),
+                                 copy.copy(self.enabled))
+
 
 def has_cyber_observable_data(instance, version="2.0"):
     """Return True only if the given instance is an observed-data object
@@ -437,6 +640,35 @@ def has_cyber_observable_data(instance, version="2.0"):
     return False
 
 
+def stix_types(*types):
+    """Decorator declaring the STIX object types a check applies to.
+
+    The validator uses this to build a per-type dispatch table so that a check
+    is only called for objects it can report on. Checks without a declaration
+    are run on every object.
+
+    Args:
+        *types: The ``type`` values of objects the decorated check inspects.
+    """
+    def inner_stix_types(original_function):
+        original_function.stix_types = frozenset(types)
+        return original_function
+    return inner_stix_types
+
+
+def _embedded_observables(instance):
+    """Yield the cyber observable objects embedded in the (deprecated in 2.1)
+    'objects' property of an observed-data object. Objects without an 'id'
+    are given the observed-data's so that checks can report against it.
+    """
+    for obj in instance['objects'].values():
+        if not isinstance(obj, dict) or 'type' not in obj:
+            continue
+        if 'id' not in obj:
+            obj = dict(obj, id=instance['id'])
+        yield obj
+
+
 def cyber_observable_check(version, requires_objects=False):
     def inner_cyber_observable_check(original_function):
         """Decorator for functions that require cyber observable data.
@@ -448,32 +680,38 @@ def cyber_observable_check(version, requires_objects=False):
         """
         def new_function(*args, **kwargs):
             """ Checks to see if instance provided (arg[0]) contains observable
-            data as a top level object or within the observed-data sdo and loops
-            through objects in the latter case to keep checks consistent.
+            data as a top level object or within the observed-data sdo. In the
+            latter case (2.1 only, unless the check requires the 'objects'
+            property) the check is run once on each embedded object, to keep
+            checks consistent.
             """
+            instance = args[0]
             if version == "2.1" and not requires_objects:
-                if not has_cyber_observable_data(args[0], version="2.1"):
+                if not has_cyber_observable_data(instance, version="2.1"):
                     return
-                if 'objects' in args[0]:
-                    for obj in args[0]['objects']:
-                        func = original_function(args[0], **kwargs)
-                        if isinstance(func, Iterable):
-                            for x in original_function(args[0], **kwargs):
-                                yield x
+                if instance['type'] == 'observed-data':
+                    targets = _embedded_observables(instance)
                 else:
-                    func = original_function(*args, **kwargs)
-                    if isinstance(func, Iterable):
-                        for x in original_function(args[0], **kwargs):
-                            yield x
+                    targets = (instance,)
             else:
-                if not has_cyber_observable_data(args[0]):
+                if not has_cyber_observable_data(instance):
                     return
-                func = original_function(*args, **kwargs)
-                if isinstance(func, Iterable):
-                    for x in original_function(*args, **kwargs):
+                targets = (instance,)
+
+            for target in targets:
+                result = original_function(target, *args[1:], **kwargs)
+                if isinstance(result, Iterable):
+                    for x in result:
                         yield x
+                elif result is not None:
+                    yield result
 
         new_function.__name__ = original_function.__name__
+        new_function.__doc__ = original_function.__doc__
+        if version == "2.1" and not requires_objects:
+            new_function.stix_types = frozenset(['observed-data'] + OBSERVABLE_TYPES21)
+        else:
+            new_function.stix_types = frozenset(['observed-data'])
         return new_function
     return inner_cyber_observable_check
 
@@ -532,3 +770,120 @@ def clear_requests_cache():
     """
     now = datetime.datetime.utcnow()
     requests_cache.get_cache().remove_old_entries(now)
+
+
+class LRUCache(object):
+    """A thread-safe mapping which holds at most `maxsize` entries, evicting
+    the least recently used one when full.
+
+    Attributes:
+        maxsize: The maximum number of entries kept in the cache.
+        hits: The number of lookups which found an entry.
+        misses: The number of lookups which did not find an entry.
+
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value for `key` and mark it as recently used, or return
+        `default` if it is not in the cache.
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Add `value` to the cache under `key`, evicting the least recently
+        used entry if the cache is full.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries and reset the hit and miss counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ThreadLocalLRUCache(object):
+    """An ``LRUCache`` of which each thread gets its own copy, for values
+    which must not be used by several threads at once.
+
+    Lookups and additions use the current thread's cache, while ``clear()``,
+    the hit and miss counters and the length cover the caches of all the
+    threads alive.
+
+    Attributes:
+        maxsize: The maximum number of entries kept in each thread's cache.
+
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._local = threading.local()
+        # The caches of all the threads, which go away with their threads
+        self._caches = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        """The current thread's ``LRUCache``."""
+        cache = getattr(self._local, 'cache', None)
+        if cache is None:
+            cache = self._local.cache = LRUCache(self.maxsize)
+            with self._lock:
+                self._caches.add(cache)
+        return cache
+
+    def _all_caches(self):
+        with self._lock:
+            return list(self._caches)
+
+    @property
+    def hits(self):
+        return sum(cache.hits for cache in self._all_caches())
+
+    @property
+    def misses(self):
+        return sum(cache.misses for cache in self._all_caches())
+
+    def get(self, key, default=None):
+        return self.cache.get(key, default)
+
+    def put(self, key, value):
+        self.cache.put(key, value)
+
+    def clear(self):
+        """Remove all entries of the caches of all the threads and reset their
+        hit and miss counters.
+        """
+        for cache in self._all_caches():
+            cache.clear()
+
+    def __contains__(self, key):
+        return key in self.cache
+
+    def __len__(self):
+        return sum(len(cache) for cache in self._all_caches())
@@ -3,15 +3,15 @@
 
 import re
 
-from dateutil import parser
 from six import string_types
-from stix2patterns.v20.pattern import Pattern
-from stix2patterns.validator import run_validator as pattern_validator
 
 from . import enums
 from ..errors import PatternError
 from ..output import info
-from ..util import cyber_observable_check, has_cyber_observable_data
+from ..patterns import analyze_pattern
+from ..timestamps import timestamp_error, timestamp_nanoseconds
+from ..util import (cyber_observable_check, has_cyber_observable_data,
+                    stix_types)
 from .errors import JSONError
 
 CUSTOM_TYPE_PREFIX_RE = re.compile(r"^x\-.+\-.+$")
@@ -23,19 +23,16 @@ CUSTOM_PROPERTY_LAX_PREFIX_RE = re.compile(r"^x_.+$")
 def timestamp(instance):
     """Ensure timestamps contain sane months, days, hours, minutes, seconds.
     """
-    ts_re = re.compile(r"^[0-9]{4}-(0[1-9]|1[012])-(0[1-9]|[12][0-9]|3[01])T([01][0-9]|2[0-3]):([0-5][0-9]):([0-5][0-9]|60)(\.[0-9]+)?Z$")
     timestamp_props = ['created', 'modified']
     if instance['type'] in enums.TIMESTAMP_PROPERTIES:
         timestamp_props += enums.TIMESTAMP_PROPERTIES[instance['type']]
 
     for tprop in timestamp_props:
-        if tprop in instance and ts_re.match(instance[tprop]):
-            # Don't raise an error if schemas will catch it
-            try:
-                parser.parse(instance[tprop])
-            except ValueError as e:
+        if tprop in instance:
+            error = timestamp_error(instance[tprop])
+            if error:
                 yield JSONError("'%s': '%s' is not a valid timestamp: %s"
-                                % (tprop, instance[tprop], str(e)), instance['id'])
+                                % (tprop, instance[tprop], error), instance['id'])
 
     if has_cyber_observable_data(instance):
         for key, obj in instance['objects'].items():
@@ -43,43 +40,44 @@ def timestamp(instance):
                 continue
             if obj['type'] in enums.TIMESTAMP_OBSERVABLE_PROPERTIES:
                 for tprop in enums.TIMESTAMP_OBSERVABLE_PROPERTIES[obj['type']]:
-                    if tprop in obj and ts_re.match(obj[tprop]):
-                        # Don't raise an error if schemas will catch it
-                        try:
-                            parser.parse(obj[tprop])
-                        except ValueError as e:
+                    if tprop in obj:
+                        error = timestamp_error(obj[tprop])
+                        if error:
                             yield JSONError("'%s': '%s': '%s' is not a valid timestamp: %s"
-                                            % (obj['type'], tprop, obj[tprop], str(e)), instance['id'])
+                                            % (obj['type'], tprop, obj[tprop], error), instance['id'])
             if obj['type'] in enums.TIMESTAMP_EMBEDDED_PROPERTIES:
                 for embed in enums.TIMESTAMP_EMBEDDED_PROPERTIES[obj['type']]:
                     if embed in obj:
                         for tprop in enums.TIMESTAMP_EMBEDDED_PROPERTIES[obj['type']][embed]:
                             if embed == 'extensions':
                                 for ext in obj[embed]:
-                                    if tprop in obj[embed][ext] and ts_re.match(obj[embed][ext][tprop]):
-                                        try:
-                                            parser.parse(obj[embed][ext][tprop])
-                                        except ValueError as e:
+                                    if tprop in obj[embed][ext]:
+                                        error = timestamp_error(obj[embed][ext][tprop])
+                                        if error:
                                             yield JSONError("'%s': '%s': '%s': '%s' is not a valid timestamp: %s"
-                                                            % (obj['type'], ext, tprop, obj[embed][ext][tprop], str(e)), instance['id'])
-                            elif tprop in obj[embed] and ts_re.match(obj[embed][tprop]):
-                                try:
-                                    parser.parse(obj[embed][tprop])
-                                except ValueError as e:
+                                                            % (obj['type'], ext, tprop, obj[embed][ext][tprop], error), instance['id'])
+                            elif tprop in obj[embed]:
+                                error = timestamp_error(obj[embed][tprop])
+                                if error:
                                     yield JSONError("'%s': '%s': '%s' is not a valid timestamp: %s"
-                                                    % (obj['type'], tprop, obj[embed][tprop], str(e)), instance['id'])
+                                                    % (obj['type'], tprop, obj[embed][tprop], error), instance['id'])
 
 
 def modified_created(instance):
     """`modified` property must be later or equal to `created` property
     """
-    if 'modified' in instance and 'created' in instance and \
-            instance['modified'] < instance['created']:
+    if 'modified' not in instance or 'created' not in instance:
+        return
+    modified = timestamp_nanoseconds(instance['modified'])
+    created = timestamp_nanoseconds(instance['created'])
+    # Invalid timestamps are reported by the schemas or the timestamp check
+    if modified is not None and created is not None and modified < created:
         msg = "'modified' (%s) must be later or equal to 'created' (%s)"
         return JSONError(msg % (instance['modified'], instance['created']),
                          instance['id'])
 
 
+@stix_types('marking-definition')
 def object_marking_circular_refs(instance):
     """Ensure that marking definitions do not contain circular references (ie.
     they do not reference themselves in the `object_marking_refs` property).
@@ -95,6 +93,7 @@ def object_marking_circular_refs(instance):
                                 " (no circular references).", instance['id'])
 
 
+@stix_types('marking-definition')
 def granular_markings_circular_refs(instance):
     """Ensure that marking definitions do not contain circular references (ie.
     they do not reference themselves in the `granular_markings` property).
@@ -319,6 +318,7 @@ def software_language(instance):
                                     % (key, lang), instance['id'])
 
 
+@stix_types('indicator')
 def patterns(instance, options):
     """Ensure that the syntax of the pattern of an indicator is valid, and that
     objects and properties referenced by the pattern are valid.
@@ -329,19 +329,18 @@ def patterns(instance, options):
     pattern = instance['pattern']
     if not isinstance(pattern, string_types):
         return  # This error already caught by schemas
-    errors = pattern_validator(pattern, stix_version='2.0')
+    analysis = analyze_pattern(pattern, '2.0')
 
     # Check pattern syntax
-    if errors:
-        for e in errors:
-            yield PatternError(str(e), instance['id'])
+    if analysis.errors:
+        for e in analysis.errors:
+            yield PatternError(e, instance['id'])
         return
 
     type_format_re = re.compile(r'^\-?[a-z0-9]+(-[a-z0-9]+)*\-?$')
     property_format_re = re.compile(r'^[a-z0-9_]{3,250}$')
 
-    p = Pattern(pattern)
-    inspection = p.inspect().comparisons
+    inspection = analysis.comparisons
     for objtype in inspection:
         # Check observable object types
         if objtype in enums.OBSERVABLE_TYPES:
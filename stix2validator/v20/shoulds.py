@@ -3,6 +3,8 @@
 To add a new check:
 - in this module:
     - define a new function
+    - if it only inspects certain object types, declare them with the
+      @stix_types decorator so it is skipped for other objects
     - add the function to CHECKS
     - add the function to list_shoulds()
 - in utils.py:
@@ -18,12 +20,13 @@ from itertools import chain
 import re
 
 from six import string_types
-from stix2patterns.v20.pattern import Pattern
 
 from . import enums
 from ..errors import PatternError
 from ..output import info
-from ..util import cyber_observable_check, has_cyber_observable_data
+from ..patterns import analyze_pattern
+from ..util import (cyber_observable_check, has_cyber_observable_data,
+                    stix_types)
 from .errors import JSONError
 from .musts import (CUSTOM_PROPERTY_LAX_PREFIX_RE, CUSTOM_PROPERTY_PREFIX_RE,
                     CUSTOM_TYPE_LAX_PREFIX_RE, CUSTOM_TYPE_PREFIX_RE)
@@ -118,6 +121,7 @@ def custom_property_prefix_lax(instance):
                             'custom-prefix-lax')
 
 
+@stix_types(*enums.VOCAB_PROPERTIES)
 def open_vocab_values(instance):
     """Ensure that the values of all properties which use open vocabularies are
     in lowercase and use hyphens instead of spaces or underscores as word
@@ -144,6 +148,7 @@ def open_vocab_values(instance):
                                     'open-vocab-format')
 
 
+@stix_types(*enums.KILL_CHAIN_PHASE_USES)
 def kill_chain_phase_names(instance):
     """Ensure the `kill_chain_name` and `phase_name` properties of
     `kill_chain_phase` objects follow naming style conventions.
@@ -197,61 +202,73 @@ def check_vocab(instance, vocab, code):
                                     instance['id'], code)
 
 
+@stix_types(*enums.ATTACK_MOTIVATION_USES)
 def vocab_attack_motivation(instance):
     return check_vocab(instance, "ATTACK_MOTIVATION",
                        'attack-motivation')
 
 
+@stix_types(*enums.ATTACK_RESOURCE_LEVEL_USES)
 def vocab_attack_resource_level(instance):
     return check_vocab(instance, "ATTACK_RESOURCE_LEVEL",
                        'attack-resource-level')
 
 
+@stix_types(*enums.IDENTITY_CLASS_USES)
 def vocab_identity_class(instance):
     return check_vocab(instance, "IDENTITY_CLASS",
                        'identity-class')
 
 
+@stix_types(*enums.INDICATOR_LABEL_USES)
 def vocab_indicator_label(instance):
     return check_vocab(instance, "INDICATOR_LABEL",
                        'indicator-label')
 
 
+@stix_types(*enums.INDUSTRY_SECTOR_USES)
 def vocab_industry_sector(instance):
     return check_vocab(instance, "INDUSTRY_SECTOR",
                        'industry-sector')
 
 
+@stix_types(*enums.MALWARE_LABEL_USES)
 def vocab_malware_label(instance):
     return check_vocab(instance, "MALWARE_LABEL",
                        'malware-label')
 
 
+@stix_types(*enums.REPORT_LABEL_USES)
 def vocab_report_label(instance):
     return check_vocab(instance, "REPORT_LABEL",
                        'report-label')
 
 
+@stix_types(*enums.THREAT_ACTOR_LABEL_USES)
 def vocab_threat_actor_label(instance):
     return check_vocab(instance, "THREAT_ACTOR_LABEL",
                        'threat-actor-label')
 
 
+@stix_types(*enums.THREAT_ACTOR_ROLE_USES)
 def vocab_threat_actor_role(instance):
     return check_vocab(instance, "THREAT_ACTOR_ROLE",
                        'threat-actor-role')
 
 
+@stix_types(*enums.THREAT_ACTOR_SOPHISTICATION_USES)
 def vocab_threat_actor_sophistication_level(instance):
     return check_vocab(instance, "THREAT_ACTOR_SOPHISTICATION",
                        'threat-actor-sophistication')
 
 
+@stix_types(*enums.TOOL_LABEL_USES)
 def vocab_tool_label(instance):
     return check_vocab(instance, "TOOL_LABEL",
                        'tool-label')
 
 
+@stix_types('marking-definition')
 def vocab_marking_definition(instance):
     """Ensure that the `definition_type` property of `marking-definition`
     objects is one of the values in the STIX 2.0 specification.
@@ -265,6 +282,7 @@ def vocab_marking_definition(instance):
                          instance['id'], 'marking-definition-type')
 
 
+@stix_types('relationship')
 def relationships_strict(instance):
     """Ensure that only the relationship types defined in the specification are
     used.
@@ -1035,6 +1053,7 @@ def extref_hashes(instance):
                                  % (src), instance['id'], 'extref-hashes')
 
 
+@stix_types('bundle')
 def enforce_relationship_refs(instance):
     """Ensures that all SDOs being referenced by the SRO are contained
     within the same bundle"""
@@ -1062,6 +1081,7 @@ def enforce_relationship_refs(instance):
                                 % (obj['id'], obj['target_ref']), 'enforce-relationship-refs')
 
 
+@stix_types('bundle')
 def duplicate_ids(instance):
     """Ensure objects with duplicate IDs have different `modified` timestamps.
     """
@@ -1100,8 +1120,8 @@ def types_strict(instance):
     if instance['type'] == 'indicator' and 'pattern' in instance:
         pattern = instance['pattern']
         if isinstance(pattern, string_types):
-            p = Pattern(pattern)
-            inspection = p.inspect().comparisons
+            # Syntax errors are reported by the patterns MUST check
+            inspection = analyze_pattern(pattern, '2.0').comparisons or {}
             for objtype in inspection:
                 if objtype not in enums.OBSERVABLE_TYPES:
                     yield PatternError("'%s' is not a valid stix observable type"
@@ -1170,8 +1190,8 @@ def properties_strict(instance):
     if instance['type'] == 'indicator' and 'pattern' in instance:
         pattern = instance['pattern']
         if isinstance(pattern, string_types):
-            p = Pattern(pattern)
-            inspection = p.inspect().comparisons
+            # Syntax errors are reported by the patterns MUST check
+            inspection = analyze_pattern(pattern, '2.0').comparisons or {}
             for objtype, expression_list in inspection.items():
                 for exp in expression_list:
                     path = exp[0]
@@ -3,15 +3,15 @@
 import operator
 import re
 
-from dateutil import parser
 from six import string_types
-from stix2patterns.v21.pattern import Pattern
-from stix2patterns.validator import run_validator as pattern_validator
 
 from . import enums
 from ..errors import PatternError
 from ..output import info
-from ..util import cyber_observable_check, has_cyber_observable_data
+from ..patterns import analyze_pattern
+from ..timestamps import timestamp_error, timestamp_nanoseconds
+from ..util import (cyber_observable_check, has_cyber_observable_data,
+                    stix_types)
 from .errors import JSONError
 
 TYPE_FORMAT_RE = re.compile(r'^\-?[a-z0-9]+(-[a-z0-9]+)*\-?$')
@@ -25,19 +25,16 @@ CUSTOM_PROPERTY_LAX_PREFIX_RE = re.compile(r"^x_.+$")
 def timestamp(instance):
     """Ensure timestamps contain sane months, days, hours, minutes, seconds.
     """
-    ts_re = re.compile(r"^[0-9]{4}-(0[1-9]|1[012])-(0[1-9]|[12][0-9]|3[01])T([01][0-9]|2[0-3]):([0-5][0-9]):([0-5][0-9]|60)(\.[0-9]+)?Z$")
     timestamp_props = ['created', 'modified']
     if instance['type'] in enums.TIMESTAMP_PROPERTIES:
         timestamp_props += enums.TIMESTAMP_PROPERTIES[instance['type']]
 
     for tprop in timestamp_props:
-        if tprop in instance and ts_re.match(instance[tprop]):
-            # Don't raise an error if schemas will catch it
-            try:
-                parser.parse(instance[tprop])
-            except ValueError as e:
+        if tprop in instance:
+            error = timestamp_error(instance[tprop])
+            if error:
                 yield JSONError("'%s': '%s' is not a valid timestamp: %s"
-                                % (tprop, instance[tprop], str(e)), instance['id'])
+                                % (tprop, instance[tprop], error), instance['id'])
 
     if has_cyber_observable_data(instance, "2.1"):
         if instance['type'] == 'observable-data':
@@ -46,61 +43,53 @@ def timestamp(instance):
                     continue
                 if obj['type'] in enums.TIMESTAMP_OBSERVABLE_PROPERTIES:
                     for tprop in enums.TIMESTAMP_OBSERVABLE_PROPERTIES[obj['type']]:
-                        if tprop in obj and ts_re.match(obj[tprop]):
-                            # Don't raise an error if schemas will catch it
-                            try:
-                                parser.parse(obj[tprop])
-                            except ValueError as e:
+                        if tprop in obj:
+                            error = timestamp_error(obj[tprop])
+                            if error:
                                 yield JSONError("'%s': '%s': '%s' is not a valid timestamp: %s"
-                                                % (obj['type'], tprop, obj[tprop], str(e)), instance['id'])
+                                                % (obj['type'], tprop, obj[tprop], error), instance['id'])
                 if obj['type'] in enums.TIMESTAMP_EMBEDDED_PROPERTIES:
                     for embed in enums.TIMESTAMP_EMBEDDED_PROPERTIES[obj['type']]:
                         if embed in obj:
                             for tprop in enums.TIMESTAMP_EMBEDDED_PROPERTIES[obj['type']][embed]:
                                 if embed == 'extensions':
                                     for ext in obj[embed]:
-                                        if tprop in obj[embed][ext] and ts_re.match(obj[embed][ext][tprop]):
-                                            try:
-                                                parser.parse(obj[embed][ext][tprop])
-                                            except ValueError as e:
+                                        if tprop in obj[embed][ext]:
+                                            error = timestamp_error(obj[embed][ext][tprop])
+                                            if error:
                                                 yield JSONError("'%s': '%s': '%s': '%s' is not a valid timestamp: %s"
-                                                                % (obj['type'], ext, tprop, obj[embed][ext][tprop], str(e)), instance['id'])
-                                elif tprop in obj[embed] and ts_re.match(obj[embed][tprop]):
-                                    try:
-                                        parser.parse(obj[embed][tprop])
-                                    except ValueError as e:
+                                                                % (obj['type'], ext, tprop, obj[embed][ext][tprop], error), instance['id'])
+                                elif tprop in obj[embed]:
+                                    error = timestamp_error(obj[embed][tprop])
+                                    if error:
                                         yield JSONError("'%s': '%s': '%s' is not a valid timestamp: %s"
-                                                        % (obj['type'], tprop, obj[embed][tprop], str(e)), instance['id'])
+                                                        % (obj['type'], tprop, obj[embed][tprop], error), instance['id'])
         else:
             if 'type' not in instance:
                 return
             if instance['type'] in enums.TIMESTAMP_OBSERVABLE_PROPERTIES:
                 for tprop in enums.TIMESTAMP_OBSERVABLE_PROPERTIES[instance['type']]:
-                    if tprop in instance and ts_re.match(instance[tprop]):
-                        # Don't raise an error if schemas will catch it
-                        try:
-                            parser.parse(instance[tprop])
-                        except ValueError as e:
+                    if tprop in instance:
+                        error = timestamp_error(instance[tprop])
+                        if error:
                             yield JSONError("'%s': '%s': '%s' is not a valid timestamp: %s"
-                                            % (instance['type'], tprop, instance[tprop], str(e)), instance['id'])
+                                            % (instance['type'], tprop, instance[tprop], error), instance['id'])
             if instance['type'] in enums.TIMESTAMP_EMBEDDED_PROPERTIES:
                 for embed in enums.TIMESTAMP_EMBEDDED_PROPERTIES[instance['type']]:
                     if embed in instance:
                         for tprop in enums.TIMESTAMP_EMBEDDED_PROPERTIES[instance['type']][embed]:
                             if embed == 'extensions':
                                 for ext in instance[embed]:
-                                    if tprop in instance[embed][ext] and ts_re.match(instance[embed][ext][tprop]):
-                                        try:
-                                            parser.parse(instance[embed][ext][tprop])
-                                        except ValueError as e:
+                                    if tprop in instance[embed][ext]:
+                                        error = timestamp_error(instance[embed][ext][tprop])
+                                        if error:
                                             yield JSONError("'%s': '%s': '%s': '%s' is not a valid timestamp: %s"
-                                                            % (instance['type'], ext, tprop, instance[embed][ext][tprop], str(e)), instance['id'])
-                            elif tprop in instance[embed] and ts_re.match(instance[embed][tprop]):
-                                try:
-                                    parser.parse(instance[embed][tprop])
-                                except ValueError as e:
+                                                            % (instance['type'], ext, tprop, instance[embed][ext][tprop], error), instance['id'])
+                            elif tprop in instance[embed]:
+                                error = timestamp_error(instance[embed][tprop])
+                                if error:
                                     yield JSONError("'%s': '%s': '%s' is not a valid timestamp: %s"
-                                                    % (instance['type'], tprop, instance[embed][tprop], str(e)), instance['id'])
+                                                    % (instance['type'], tprop, instance[embed][tprop], error), instance['id'])
 
 
 def get_comparison_string(op):
@@ -114,6 +103,18 @@ def get_comparison_string(op):
         raise ValueError('Unknown operator: {}'.format(op))
 
 
+def _timestamps_satisfy(comp, first, second):
+    """Return whether the timestamps `first` and `second` satisfy the
+    comparison `comp`, comparing the instants they stand for rather than
+    the strings, which may differ in precision. Invalid timestamps satisfy
+    every comparison, as they are reported by the schemas or the timestamp
+    check.
+    """
+    first = timestamp_nanoseconds(first)
+    second = timestamp_nanoseconds(second)
+    return first is None or second is None or comp(first, second)
+
+
 def timestamp_compare(instance):
     """Ensure timestamp properties with a comparison requirement are valid.
 
@@ -128,7 +129,7 @@ def timestamp_compare(instance):
         comp_str = get_comparison_string(op)
 
         if first in instance and second in instance and \
-                not comp(instance[first], instance[second]):
+                not _timestamps_satisfy(comp, instance[first], instance[second]):
             msg = "'%s' (%s) must be %s '%s' (%s)"
             yield JSONError(msg % (first, instance[first], comp_str, second, instance[second]),
                             instance['id'])
@@ -145,12 +146,13 @@ def observable_timestamp_compare(instance):
         comp_str = get_comparison_string(op)
 
         if first in instance and second in instance and \
-                not comp(instance[first], instance[second]):
+                not _timestamps_satisfy(comp, instance[first], instance[second]):
             msg = "In object '%s', '%s' (%s) must be %s '%s' (%s)"
             yield JSONError(msg % (instance['id'], first, instance[first], comp_str, second, instance[second]),
                             instance['id'])
 
 
+@stix_types('marking-definition')
 def object_marking_circular_refs(instance):
     """Ensure that marking definitions do not contain circular references (ie.
     they do not reference themselves in the `object_marking_refs` property).
@@ -166,6 +168,7 @@ def object_marking_circular_refs(instance):
                                 " (no circular references).", instance['id'])
 
 
+@stix_types('marking-definition')
 def granular_markings_circular_refs(instance):
     """Ensure that marking definitions do not contain circular references (ie.
     they do not reference themselves in the `granular_markings` property).
@@ -401,6 +404,7 @@ def software_language(instance):
                                 % (instance['id'], lang), instance['id'])
 
 
+@stix_types('indicator')
 def patterns(instance, options):
     """Ensure that the syntax of the pattern of an indicator is valid, and that
     objects and properties referenced by the pattern are valid.
@@ -411,16 +415,15 @@ def patterns(instance, options):
     pattern = instance['pattern']
     if not isinstance(pattern, string_types):
         return  # This error already caught by schemas
-    errors = pattern_validator(pattern, stix_version='2.1')
+    analysis = analyze_pattern(pattern, '2.1')
 
     # Check pattern syntax
-    if errors:
-        for e in errors:
-            yield PatternError(str(e), instance['id'])
+    if analysis.errors:
+        for e in analysis.errors:
+            yield PatternError(e, instance['id'])
         return
 
-    p = Pattern(pattern)
-    inspection = p.inspect().comparisons
+    inspection = analysis.comparisons
     for objtype in inspection:
         # Check observable object types
         if objtype in enums.OBSERVABLE_TYPES:
@@ -466,6 +469,7 @@ def patterns(instance, options):
                                    "should start with 'x_'" % prop, instance['id'])
 
 
+@stix_types('language-content')
 def language_contents(instance):
     """Ensure keys in Language Content's 'contents' dictionary are valid
     language codes, and that the keys in the sub-dictionaries match the rules
@@ -3,6 +3,11 @@
 To add a new check:
 - in this module:
     - define a new function
+    - if it only inspects certain object types, declare them with the
+      @stix_types decorator so it is skipped for other objects
+    - if it looks at properties, extensions or hashes nested in the
+      object, consider writing it as a visitor check (see visitor.py) so it
+      shares a single walk of the object with the other such checks
     - add the function to CHECKS
     - add the function to list_shoulds()
 - in utils.py:
@@ -11,25 +16,34 @@ To add a new check:
     - add the check code and name to table
 """
 
-from collections import Iterable
 from itertools import chain
 import re
 import uuid
 
 from cpe import CPE
 from six import string_types
-from stix2patterns.v21.pattern import Pattern
 
 from . import enums
 from ..errors import PatternError
 from ..output import info
-from ..util import cyber_observable_check, has_cyber_observable_data
+from ..patterns import analyze_pattern
+from ..util import (cyber_observable_check, has_cyber_observable_data,
+                    stix_types)
 from ..v20.shoulds import enforce_relationship_refs
+from ..visitor import (EXTENSION, EXTENSION_PROPERTY, HASH, PROPERTY,
+                       visitor_check)
 from .errors import JSONError
 from .musts import (CUSTOM_PROPERTY_LAX_PREFIX_RE, CUSTOM_PROPERTY_PREFIX_RE,
                     CUSTOM_TYPE_LAX_PREFIX_RE, CUSTOM_TYPE_PREFIX_RE)
 
 PROTOCOL_RE = re.compile(r'^[a-zA-Z0-9-]{1,15}$')
+NOT_CAPS_RE = re.compile(r"^[^A-Z]+$")
+STRICT_TYPE_PREFIX_MSG = ("'x-' followed by a source unique identifier (like "
+                          "a domain name with dots replaced by hyphens), a "
+                          "hyphen and then the name.")
+STRICT_PROPERTY_PREFIX_MSG = ("'x_' followed by a source unique identifier "
+                              "(like a domain name with dots replaced by "
+                              "hyphens), a hyphen and then the name.")
 
 
 def custom_prefix_strict(instance):
@@ -120,6 +134,7 @@ def custom_property_prefix_lax(instance):
                             'custom-prefix-lax')
 
 
+@stix_types(*enums.DEPRECATED_PROPERTIES)
 def deprecated_property_check(instance):
     """Check to see if any included properties are deprecated within the spec
     """
@@ -134,6 +149,7 @@ def deprecated_property_check(instance):
                             'deprecated-properties')
 
 
+@stix_types('indicator')
 def indicator_property_check(instance):
     """Check to see if name and decription properties are present
     """
@@ -178,6 +194,7 @@ def os_execution_envs_check(instance):
                             'os-execution-envs')
 
 
+@stix_types(*enums.VOCAB_PROPERTIES)
 def open_vocab_values(instance):
     """Ensure that the values of all properties which use open vocabularies are
     in lowercase and use hyphens instead of spaces or underscores as word
@@ -205,6 +222,7 @@ def open_vocab_values(instance):
                                     'open-vocab-format')
 
 
+@stix_types(*enums.KILL_CHAIN_PHASE_USES)
 def kill_chain_phase_names(instance):
     """Ensure the `kill_chain_name` and `phase_name` properties of
     `kill_chain_phase` objects follow naming style conventions.
@@ -258,96 +276,115 @@ def check_vocab(instance, vocab, code):
                                     instance['id'], code)
 
 
+@stix_types(*enums.ATTACK_MOTIVATION_USES)
 def vocab_attack_motivation(instance):
     return check_vocab(instance, "ATTACK_MOTIVATION",
                        'attack-motivation')
 
 
+@stix_types(*enums.ATTACK_RESOURCE_LEVEL_USES)
 def vocab_attack_resource_level(instance):
     return check_vocab(instance, "ATTACK_RESOURCE_LEVEL",
                        'attack-resource-level')
 
 
+@stix_types(*enums.COURSE_OF_ACTION_TYPE_USES)
 def vocab_course_of_action_type(instance):
     return check_vocab(instance, "COURSE_OF_ACTION_TYPE",
                        'course-of-action-type')
 
 
+@stix_types(*enums.GROUPING_CONTEXT_USES)
 def vocab_grouping_context(instance):
     return check_vocab(instance, "GROUPING_CONTEXT",
                        'grouping-context')
 
 
+@stix_types(*enums.IDENTITY_CLASS_USES)
 def vocab_identity_class(instance):
     return check_vocab(instance, "IDENTITY_CLASS",
                        'identity-class')
 
 
+@stix_types(*enums.IMPLEMENTATION_LANGUAGES_USES)
 def vocab_implementation_languages(instance):
     return check_vocab(instance, "IMPLEMENTATION_LANGUAGES",
                        'implementation-languages')
 
 
+@stix_types(*enums.INDICATOR_TYPE_USES)
 def vocab_indicator_types(instance):
     return check_vocab(instance, "INDICATOR_TYPE",
                        'indicator-types')
 
 
+@stix_types(*enums.INFRASTRUCTURE_TYPE_USES)
 def vocab_infrastructure_types(instance):
     return check_vocab(instance, "INFRASTRUCTURE_TYPE",
                        'infrastructure-types')
 
 
+@stix_types(*enums.INDUSTRY_SECTOR_USES)
 def vocab_industry_sector(instance):
     return check_vocab(instance, "INDUSTRY_SECTOR",
                        'industry-sector')
 
 
+@stix_types(*enums.MALWARE_TYPE_USES)
 def vocab_malware_types(instance):
     return check_vocab(instance, "MALWARE_TYPE",
                        'malware-types')
 
 
+@stix_types(*enums.MALWARE_CAPABILITIES_USES)
 def vocab_malware_capabilities(instance):
     return check_vocab(instance, "MALWARE_CAPABILITIES",
                        'malware-capabilities')
 
 
+@stix_types(*enums.PROCESSOR_ARCHITECTURE_USES)
 def vocab_processor_architecture(instance):
     return check_vocab(instance, "PROCESSOR_ARCHITECTURE",
                        'processor-architecture')
 
 
+@stix_types(*enums.REPORT_TYPE_USES)
 def vocab_report_types(instance):
     return check_vocab(instance, "REPORT_TYPE",
                        'report-types')
 
 
+@stix_types(*enums.THREAT_ACTOR_TYPE_USES)
 def vocab_threat_actor_types(instance):
     return check_vocab(instance, "THREAT_ACTOR_TYPE",
                        'threat-actor-types')
 
 
+@stix_types(*enums.THREAT_ACTOR_ROLE_USES)
 def vocab_threat_actor_role(instance):
     return check_vocab(instance, "THREAT_ACTOR_ROLE",
                        'threat-actor-role')
 
 
+@stix_types(*enums.THREAT_ACTOR_SOPHISTICATION_USES)
 def vocab_threat_actor_sophistication_level(instance):
     return check_vocab(instance, "THREAT_ACTOR_SOPHISTICATION",
                        'threat-actor-sophistication')
 
 
+@stix_types(*enums.TOOL_TYPE_USES)
 def vocab_tool_types(instance):
     return check_vocab(instance, "TOOL_TYPE",
                        'tool-types')
 
 
+@stix_types(*enums.REGION_USES)
 def vocab_region(instance):
     return check_vocab(instance, "REGION",
                        'region')
 
 
+@stix_types('marking-definition')
 def vocab_marking_definition(instance):
     """Ensure that the `definition_type` property of `marking-definition`
     objects is one of the values in the STIX 2.0 specification.
@@ -361,6 +398,7 @@ def vocab_marking_definition(instance):
                          instance['id'], 'marking-definition-type')
 
 
+@stix_types('relationship')
 def relationships_strict(instance):
     """Ensure that only the relationship types defined in the specification are
     used.
@@ -419,105 +457,46 @@ def valid_hash_value(hashname):
         return False
 
 
-@cyber_observable_check("2.1")
-def vocab_hash_algo(instance):
-    """Ensure objects with 'hashes' properties only use values from the
-    hash-algorithm-ov vocabulary.
-    """
-    key = instance['id']
-    if 'type' not in instance:
-        return
+# Where 'hashes'-type dictionaries are found in cyber observable objects, and
+# how they are described in messages. List indices are left out of the paths.
+HASH_LOCATIONS = {
+    ('hashes',): "has a 'hashes' dictionary with a hash of type",
+    ('extensions', 'ntfs-ext', 'alternate_data_streams', 'hashes'):
+        "has an NTFS extension with an alternate data stream that has a "
+        "'hashes' dictionary with a hash of type",
+    ('extensions', 'windows-pebinary-ext', 'file_header_hashes'):
+        "has a Windows PE Binary File extension with a file header hash of",
+    ('extensions', 'windows-pebinary-ext', 'optional_header', 'hashes'):
+        "has a Windows PE Binary File extension with an optional header that "
+        "has a hash of",
+    ('extensions', 'windows-pebinary-ext', 'sections', 'hashes'):
+        "has a Windows PE Binary File extension with a section that has a "
+        "hash of",
+}
 
-    if instance['type'] == 'file':
-        try:
-            hashes = instance['hashes']
-        except KeyError:
-            pass
-        else:
-            for h in hashes:
-                if not (valid_hash_value(h)):
-                    yield JSONError("Object '%s' has a 'hashes' dictionary"
-                                    " with a hash of type '%s', which is not a "
-                                    "value in the hash-algorithm-ov vocabulary nor a "
-                                    "custom value prepended with 'x_'."
-                                    % (key, h), instance['id'], 'hash-algo')
 
-        try:
-            ads = instance['extensions']['ntfs-ext']['alternate_data_streams']
-        except KeyError:
-            pass
-        else:
-            for datastream in ads:
-                if 'hashes' not in datastream:
-                    continue
-                for h in datastream['hashes']:
-                    if not (valid_hash_value(h)):
-                        yield JSONError("Object '%s' has an NTFS extension"
-                                        " with an alternate data stream that has a"
-                                        " 'hashes' dictionary with a hash of type "
-                                        "'%s', which is not a value in the "
-                                        "hash-algorithm-ov vocabulary nor a custom "
-                                        "value prepended with 'x_'."
-                                        % (key, h), instance['id'], 'hash-algo')
-
-        try:
-            head_hashes = instance['extensions']['windows-pebinary-ext']['file_header_hashes']
-        except KeyError:
-            pass
-        else:
-            for h in head_hashes:
-                if not (valid_hash_value(h)):
-                    yield JSONError("Object '%s' has a Windows PE Binary "
-                                    "File extension with a file header hash of "
-                                    "'%s', which is not a value in the "
-                                    "hash-algorithm-ov vocabulary nor a custom value "
-                                    "prepended with 'x_'."
-                                    % (key, h), instance['id'], 'hash-algo')
+def hash_location(instance, path):
+    """Return the description of where a 'hashes'-type dictionary at the given
+    path is in the instance, or None if it is not one the checks look at.
+    """
+    path = tuple(p for p in path if not isinstance(p, int))
+    if len(path) > 1 and instance['type'] != 'file':
+        return None
+    return HASH_LOCATIONS.get(path)
 
-        try:
-            hashes = instance['extensions']['windows-pebinary-ext']['optional_header']['hashes']
-        except KeyError:
-            pass
-        else:
-            for h in hashes:
-                if not (valid_hash_value(h)):
-                    yield JSONError("Object '%s' has a Windows PE Binary "
-                                    "File extension with an optional header that "
-                                    "has a hash of '%s', which is not a value in "
-                                    "the hash-algorithm-ov vocabulary nor a custom "
-                                    "value prepended with 'x_'."
-                                    % (key, h), instance['id'], 'hash-algo')
 
-        try:
-            sections = instance['extensions']['windows-pebinary-ext']['sections']
-        except KeyError:
-            pass
-        else:
-            for s in sections:
-                if 'hashes' not in s:
-                    continue
-                for h in s['hashes']:
-                    if not (valid_hash_value(h)):
-                        yield JSONError("Object '%s' has a Windows PE "
-                                        "Binary File extension with a section that"
-                                        " has a hash of '%s', which is not a value"
-                                        " in the hash-algorithm-ov vocabulary nor a "
-                                        "custom value prepended with 'x_'."
-                                        % (key, h), instance['id'], 'hash-algo')
-
-    elif instance['type'] == 'artifact' or instance['type'] == 'x509-certificate':
-        try:
-            hashes = instance['hashes']
-        except KeyError:
-            pass
-        else:
-            for h in hashes:
-                if not (valid_hash_value(h)):
-                    yield JSONError("Object '%s' has a 'hashes' dictionary"
-                                    " with a hash of type '%s', which is not a "
-                                    "value in the hash-algorithm-ov vocabulary nor a "
-                                    "custom value prepended with 'x_'."
-                                    % (key, h), instance['id'], 'hash-algo')
+@visitor_check(HASH, stix_types=['file', 'artifact', 'x509-certificate'])
+def vocab_hash_algo(instance, event):
+    """Ensure objects with 'hashes' properties only use values from the
+    hash-algorithm-ov vocabulary.
+    """
+    location = hash_location(instance, event.path)
+    if location is not None and not valid_hash_value(event.name):
+        return JSONError("Object '%s' %s '%s', which is not a value in the "
+                         "hash-algorithm-ov vocabulary nor a custom value "
+                         "prepended with 'x_'."
+                         % (instance['id'], location, event.name),
+                         instance['id'], 'hash-algo')
 
 
 @cyber_observable_check("2.1")
@@ -570,28 +549,19 @@ def observable_object_keys(instance):
                                 % key, instance['id'], 'observable-object-keys')
 
 
-def test_dict_keys(item, inst_id):
-    """Recursively generate errors for incorrectly formatted cyber observable
-    dictionary keys.
-    """
-    not_caps_re = re.compile(r"^[^A-Z]+$")
-    for k, v in item.items():
-        if not not_caps_re.match(k):
-            yield JSONError("As a dictionary key, '%s' should be lowercase."
-                            % k, inst_id, 'observable-dictionary-keys')
-
-        if type(v) is dict and k not in enums.OBSERVABLE_DICT_KEY_EXCEPTIONS:
-            for error in test_dict_keys(v, inst_id):
-                yield error
-
-
-@cyber_observable_check("2.1")
-def observable_dictionary_keys(instance):
+@visitor_check(PROPERTY, EXTENSION, EXTENSION_PROPERTY,
+               stix_types=enums.OBSERVABLE_TYPES)
+def observable_dictionary_keys(instance, event):
     """Ensure dictionaries in the cyber observable layer have lowercase keys
     no longer than 30 characters.
     """
-    for error in test_dict_keys(instance, instance['id']):
-        yield error
+    for p in event.path:
+        if isinstance(p, int) or p in enums.OBSERVABLE_DICT_KEY_EXCEPTIONS:
+            return
+    if not NOT_CAPS_RE.match(event.name):
+        return JSONError("As a dictionary key, '%s' should be lowercase."
+                         % event.name, instance['id'],
+                         'observable-dictionary-keys')
 
 
 @cyber_observable_check("2.1")
@@ -622,199 +592,104 @@ def custom_observable_object_prefix_lax(instance):
                         'custom-prefix-lax')
 
 
-@cyber_observable_check("2.1")
-def custom_object_extension_prefix_strict(instance):
+def _custom_extension_prefix(instance, event, prefix_re, code, msg_end):
+    type_ = instance['type']
+    if (type_ in enums.OBSERVABLE_EXTENSIONS and
+            event.name not in enums.OBSERVABLE_EXTENSIONS[type_] and
+            not prefix_re.match(event.name)):
+        return JSONError("Custom Cyber Observable Object extension type '%s' "
+                         "should start with %s" % (event.name, msg_end),
+                         instance['id'], code)
+
+
+@visitor_check(EXTENSION, stix_types=enums.OBSERVABLE_TYPES)
+def custom_object_extension_prefix_strict(instance, event):
     """Ensure custom observable object extensions follow strict naming style
     conventions.
     """
-    if not ('extensions' in instance and 'type' in instance and
-            instance['type'] in enums.OBSERVABLE_EXTENSIONS):
-        return
-    for ext_key in instance['extensions']:
-        if (ext_key not in enums.OBSERVABLE_EXTENSIONS[instance['type']] and
-                not CUSTOM_TYPE_PREFIX_RE.match(ext_key)):
-            yield JSONError("Custom Cyber Observable Object extension type"
-                            " '%s' should start with 'x-' followed by a source "
-                            "unique identifier (like a domain name with dots "
-                            "replaced by hyphens), a hyphen and then the name."
-                            % ext_key, instance['id'],
-                            'custom-prefix')
+    return _custom_extension_prefix(instance, event, CUSTOM_TYPE_PREFIX_RE,
+                                    'custom-prefix', STRICT_TYPE_PREFIX_MSG)
 
 
-@cyber_observable_check("2.1")
-def custom_object_extension_prefix_lax(instance):
+@visitor_check(EXTENSION, stix_types=enums.OBSERVABLE_TYPES)
+def custom_object_extension_prefix_lax(instance, event):
     """Ensure custom observable object extensions follow naming style
     conventions.
     """
-    if not ('extensions' in instance and 'type' in instance and
-            instance['type'] in enums.OBSERVABLE_EXTENSIONS):
-        return
-    for ext_key in instance['extensions']:
-        if (ext_key not in enums.OBSERVABLE_EXTENSIONS[instance['type']] and
-                not CUSTOM_TYPE_LAX_PREFIX_RE.match(ext_key)):
-            yield JSONError("Custom Cyber Observable Object extension type"
-                            " '%s' should start with 'x-'."
-                            % ext_key, instance['id'],
-                            'custom-prefix-lax')
+    return _custom_extension_prefix(instance, event, CUSTOM_TYPE_LAX_PREFIX_RE,
+                                    'custom-prefix-lax', "'x-'.")
 
 
-@cyber_observable_check("2.1")
-def custom_observable_properties_prefix_strict(instance):
-    """Ensure observable object custom properties follow strict naming style
-    conventions.
+def _custom_observable_property_prefix(instance, event, prefix_re, code,
+                                       msg_end):
+    """Return an error if the property an event is about is a custom property
+    of a cyber observable object, but its name does not match `prefix_re`.
     """
-    if 'type' not in instance:
-        return
     type_ = instance['type']
-
-    for prop in instance:
-        # Check objects' properties
+    name = event.name
+    if prefix_re.match(name):
+        return
+    path = event.path
+
+    if event.kind == EXTENSION_PROPERTY:
+        ext_key = path[1]
+        if (ext_key in enums.OBSERVABLE_EXTENSIONS.get(type_, ()) and
+                name not in enums.OBSERVABLE_EXTENSION_PROPERTIES[ext_key]):
+            return JSONError("Cyber Observable Object custom property '%s' in "
+                             "the %s extension should start with %s"
+                             % (name, ext_key, msg_end), instance['id'], code)
+
+    elif not path:
+        # Objects' own properties
         if (type_ in enums.OBSERVABLE_PROPERTIES and
-            prop not in enums.OBSERVABLE_PROPERTIES[type_] and
-                not CUSTOM_PROPERTY_PREFIX_RE.match(prop)):
-            yield JSONError("Cyber Observable Object custom property '%s' "
-                            "should start with 'x_' followed by a source "
-                            "unique identifier (like a domain name with "
-                            "dots replaced by hyphens), a hyphen and then the"
-                            " name."
-                            % prop, instance['id'],
-                            'custom-prefix')
-        # Check properties of embedded cyber observable types
-        if (type_ in enums.OBSERVABLE_EMBEDDED_PROPERTIES and
-                prop in enums.OBSERVABLE_EMBEDDED_PROPERTIES[type_]):
-            for embed_prop in instance[prop]:
-                if isinstance(embed_prop, dict):
-                    for embedded in embed_prop:
-                        if (embedded not in enums.OBSERVABLE_EMBEDDED_PROPERTIES[type_][prop] and
-                                not CUSTOM_PROPERTY_PREFIX_RE.match(embedded)):
-                            yield JSONError("Cyber Observable Object custom "
-                                            "property '%s' in the %s property of "
-                                            "%s object should start with 'x_' "
-                                            "followed by a source unique "
-                                            "identifier (like a domain name with "
-                                            "dots replaced by hyphens), a hyphen and "
-                                            "then the name."
-                                            % (embedded, prop, type_), instance['id'],
-                                            'custom-prefix')
-                elif (embed_prop not in enums.OBSERVABLE_EMBEDDED_PROPERTIES[type_][prop] and
-                        not CUSTOM_PROPERTY_PREFIX_RE.match(embed_prop)):
-                    yield JSONError("Cyber Observable Object custom "
-                                    "property '%s' in the %s property of "
-                                    "%s object should start with 'x_' "
-                                    "followed by a source unique "
-                                    "identifier (like a domain name with "
-                                    "dots replaced by hyphens), a hyphen and "
-                                    "then the name."
-                                    % (embed_prop, prop, type_), instance['id'],
-                                    'custom-prefix')
-
-    # Check object extensions' properties
-    if (type_ in enums.OBSERVABLE_EXTENSIONS and 'extensions' in instance):
-        for ext_key in instance['extensions']:
-
-            if ext_key in enums.OBSERVABLE_EXTENSIONS[type_]:
-                for ext_prop in instance['extensions'][ext_key]:
-                    if (ext_prop not in enums.OBSERVABLE_EXTENSION_PROPERTIES[ext_key] and
-                            not CUSTOM_PROPERTY_PREFIX_RE.match(ext_prop)):
-                        yield JSONError("Cyber Observable Object custom "
-                                        "property '%s' in the %s extension "
-                                        "should start with 'x_' followed by a "
-                                        "source unique identifier (like a "
-                                        "domain name with dots replaced by "
-                                        "hyphens), a hyphen and then the name."
-                                        % (ext_prop, ext_key), instance['id'],
-                                        'custom-prefix')
-
-            if ext_key in enums.OBSERVABLE_EXTENSIONS[type_]:
-                for ext_prop in instance['extensions'][ext_key]:
-                    if (ext_key in enums.OBSERVABLE_EXTENSION_EMBEDDED_PROPERTIES and
-                            ext_prop in enums.OBSERVABLE_EXTENSION_EMBEDDED_PROPERTIES[ext_key]):
-                        for embed_prop in instance['extensions'][ext_key][ext_prop]:
-                            if not (isinstance(embed_prop, Iterable) and not isinstance(embed_prop, string_types)):
-                                embed_prop = [embed_prop]
-                            for p in embed_prop:
-                                if (p not in enums.OBSERVABLE_EXTENSION_EMBEDDED_PROPERTIES[ext_key][ext_prop] and
-                                        not CUSTOM_PROPERTY_PREFIX_RE.match(p)):
-                                    yield JSONError("Cyber Observable Object "
-                                                    "custom property '%s' in the %s "
-                                                    "property of the %s extension should "
-                                                    "start with 'x_' followed by a source "
-                                                    "unique identifier (like a domain name"
-                                                    " with dots replaced by hyphens), a "
-                                                    "hyphen and then the name."
-                                                    % (p, ext_prop, ext_key), instance['id'],
-                                                    'custom-prefix')
+                name not in enums.OBSERVABLE_PROPERTIES[type_]):
+            return JSONError("Cyber Observable Object custom property '%s' "
+                             "should start with %s" % (name, msg_end),
+                             instance['id'], code)
+
+    elif path[0] == 'extensions':
+        # Properties of embedded types within extensions
+        if len(path) == 3 or (len(path) == 4 and isinstance(path[3], int)):
+            ext_key, ext_prop = path[1], path[2]
+            embedded = enums.OBSERVABLE_EXTENSION_EMBEDDED_PROPERTIES.get(ext_key, {})
+            if (ext_key in enums.OBSERVABLE_EXTENSIONS.get(type_, ()) and
+                    ext_prop in embedded and name not in embedded[ext_prop]):
+                return JSONError("Cyber Observable Object custom property '%s' "
+                                 "in the %s property of the %s extension "
+                                 "should start with %s"
+                                 % (name, ext_prop, ext_key, msg_end),
+                                 instance['id'], code)
+
+    elif len(path) == 1 or (len(path) == 2 and isinstance(path[1], int)):
+        # Properties of embedded cyber observable types
+        prop = path[0]
+        embedded = enums.OBSERVABLE_EMBEDDED_PROPERTIES.get(type_, {})
+        if prop in embedded and name not in embedded[prop]:
+            return JSONError("Cyber Observable Object custom property '%s' in "
+                             "the %s property of %s object should start with "
+                             "%s" % (name, prop, type_, msg_end),
+                             instance['id'], code)
+
+
+@visitor_check(PROPERTY, EXTENSION_PROPERTY, stix_types=enums.OBSERVABLE_TYPES)
+def custom_observable_properties_prefix_strict(instance, event):
+    """Ensure observable object custom properties follow strict naming style
+    conventions.
+    """
+    return _custom_observable_property_prefix(instance, event,
+                                              CUSTOM_PROPERTY_PREFIX_RE,
+                                              'custom-prefix',
+                                              STRICT_PROPERTY_PREFIX_MSG)
 
 
-@cyber_observable_check("2.1")
-def custom_observable_properties_prefix_lax(instance):
+@visitor_check(PROPERTY, EXTENSION_PROPERTY, stix_types=enums.OBSERVABLE_TYPES)
+def custom_observable_properties_prefix_lax(instance, event):
     """Ensure observable object custom properties follow naming style
     conventions.
     """
-    if 'type' not in instance:
-        return
-    type_ = instance['type']
-
-    for prop in instance:
-        # Check objects' properties
-        if (type_ in enums.OBSERVABLE_PROPERTIES and
-            prop not in enums.OBSERVABLE_PROPERTIES[type_] and
-                not CUSTOM_PROPERTY_LAX_PREFIX_RE.match(prop)):
-            yield JSONError("Cyber Observable Object custom property '%s' "
-                            "should start with 'x_'."
-                            % prop, instance['id'],
-                            'custom-prefix-lax')
-        # Check properties of embedded cyber observable types
-        if (type_ in enums.OBSERVABLE_EMBEDDED_PROPERTIES and
-                prop in enums.OBSERVABLE_EMBEDDED_PROPERTIES[type_]):
-            for embed_prop in instance[prop]:
-                if isinstance(embed_prop, dict):
-                    for embedded in embed_prop:
-                        if (embedded not in enums.OBSERVABLE_EMBEDDED_PROPERTIES[type_][prop] and
-                                not CUSTOM_PROPERTY_LAX_PREFIX_RE.match(embedded)):
-                            yield JSONError("Cyber Observable Object custom "
-                                            "property '%s' in the %s property of "
-                                            "%s object should start with 'x_'."
-                                            % (embedded, prop, type_), instance['id'],
-                                            'custom-prefix-lax')
-                elif (embed_prop not in enums.OBSERVABLE_EMBEDDED_PROPERTIES[type_][prop] and
-                        not CUSTOM_PROPERTY_LAX_PREFIX_RE.match(embed_prop)):
-                    yield JSONError("Cyber Observable Object custom "
-                                    "property '%s' in the %s property of "
-                                    "%s object should start with 'x_'."
-                                    % (embed_prop, prop, type_), instance['id'],
-                                    'custom-prefix-lax')
-
-    # Check object extensions' properties
-    if (type_ in enums.OBSERVABLE_EXTENSIONS and 'extensions' in instance):
-        for ext_key in instance['extensions']:
-
-            if ext_key in enums.OBSERVABLE_EXTENSIONS[type_]:
-                for ext_prop in instance['extensions'][ext_key]:
-                    if (ext_prop not in enums.OBSERVABLE_EXTENSION_PROPERTIES[ext_key] and
-                            not CUSTOM_PROPERTY_LAX_PREFIX_RE.match(ext_prop)):
-                        yield JSONError("Cyber Observable Object custom "
-                                        "property '%s' in the %s extension "
-                                        "should start with 'x_'."
-                                        % (ext_prop, ext_key), instance['id'],
-                                        'custom-prefix-lax')
-
-            if ext_key in enums.OBSERVABLE_EXTENSIONS[type_]:
-                for ext_prop in instance['extensions'][ext_key]:
-                    if (ext_key in enums.OBSERVABLE_EXTENSION_EMBEDDED_PROPERTIES and
-                            ext_prop in enums.OBSERVABLE_EXTENSION_EMBEDDED_PROPERTIES[ext_key]):
-                        for embed_prop in instance['extensions'][ext_key][ext_prop]:
-                            if not (isinstance(embed_prop, Iterable) and not isinstance(embed_prop, string_types)):
-                                embed_prop = [embed_prop]
-                            for p in embed_prop:
-                                if (p not in enums.OBSERVABLE_EXTENSION_EMBEDDED_PROPERTIES[ext_key][ext_prop] and
-                                        not CUSTOM_PROPERTY_LAX_PREFIX_RE.match(p)):
-                                    yield JSONError("Cyber Observable Object "
-                                                    "custom property '%s' in the %s "
-                                                    "property of the %s extension should "
-                                                    "start with 'x_'."
-                                                    % (p, ext_prop, ext_key), instance['id'],
-                                                    'custom-prefix-lax')
+    return _custom_observable_property_prefix(instance, event,
+                                              CUSTOM_PROPERTY_LAX_PREFIX_RE,
+                                              'custom-prefix-lax', "'x_'.")
 
 
 @cyber_observable_check("2.1")
@@ -974,6 +849,7 @@ def pdf_doc_info(instance):
                                 'pdf-doc-info')
 
 
+@stix_types('location')
 def countries(instance):
     """Ensure that the `country` property of `location` objects is a valid
     ISO 3166-1 ALPHA-2 Code.
@@ -1002,6 +878,7 @@ def windows_process_priority_format(instance):
                             'windows-process-priority-format')
 
 
+@stix_types('malware-analysis')
 def malware_analysis_product(instance):
     """Ensure product name is all lowercase with words seperated by a dash
     """
@@ -1014,98 +891,15 @@ def malware_analysis_product(instance):
                             'malware-analysis-product')
 
 
-@cyber_observable_check("2.1")
-def hash_length(instance):
+@visitor_check(HASH, stix_types=['file', 'artifact', 'x509-certificate'])
+def hash_length(instance, event):
     """Ensure keys in 'hashes'-type properties are no more than 30 characters long.
     """
-    key = instance['id']
-    if 'type' not in instance:
-        return
-
-    if instance['type'] == 'file':
-        try:
-            hashes = instance['hashes']
-        except KeyError:
-            return
-        else:
-            for h in hashes:
-                if (len(h) > 30):
-                    return JSONError("Object '%s' has a 'hashes' dictionary"
-                                     " with a hash of type '%s', which is "
-                                     "longer than 30 characters."
-                                     % (key, h), instance['id'], 'hash-length')
-
-        try:
-            ads = instance['extensions']['ntfs-ext']['alternate_data_streams']
-        except KeyError:
-            return
-        else:
-            for datastream in ads:
-                if 'hashes' not in datastream:
-                    return
-                for h in datastream['hashes']:
-                    if (len(h) > 30):
-                        return JSONError("Object '%s' has an NTFS extension"
-                                         " with an alternate data stream that has a"
-                                         " 'hashes' dictionary with a hash of type "
-                                         "'%s', which is longer than 30 "
-                                         "characters."
-                                         % (key, h), instance['id'], 'hash-length')
-
-        try:
-            head_hashes = instance['extensions']['windows-pebinary-ext']['file_header_hashes']
-        except KeyError:
-            return
-        else:
-            for h in head_hashes:
-                if (len(h) > 30):
-                    return JSONError("Object '%s' has a Windows PE Binary "
-                                     "File extension with a file header hash of "
-                                     "'%s', which is longer than 30 "
-                                     "characters."
-                                     % (key, h), instance['id'], 'hash-length')
-
-        try:
-            hashes = instance['extensions']['windows-pebinary-ext']['optional_header']['hashes']
-        except KeyError:
-            return
-        else:
-            for h in hashes:
-                if (len(h) > 30):
-                    return JSONError("Object '%s' has a Windows PE Binary "
-                                     "File extension with an optional header that "
-                                     "has a hash of '%s', which is longer "
-                                     "than 30 characters."
-                                     % (key, h), instance['id'], 'hash-length')
-
-        try:
-            sections = instance['extensions']['windows-pebinary-ext']['sections']
-        except KeyError:
-            return
-        else:
-            for s in sections:
-                if 'hashes' not in s:
-                    return
-                for h in s['hashes']:
-                    if (len(h) > 30):
-                        return JSONError("Object '%s' has a Windows PE "
-                                         "Binary File extension with a section that"
-                                         " has a hash of '%s', which is "
-                                         "longer than 30 characters."
-                                         % (key, h), instance['id'], 'hash-length')
-
-    elif instance['type'] == 'artifact' or instance['type'] == 'x509-certificate':
-        try:
-            hashes = instance['hashes']
-        except KeyError:
-            return
-        else:
-            for h in hashes:
-                if (len(h) > 30):
-                    return JSONError("Object '%s' has a 'hashes' dictionary"
-                                     " with a hash of type '%s', which is "
-                                     "longer than 30 characters."
-                                     % (key, h), instance['id'], 'hash-length')
+    location = hash_location(instance, event.path)
+    if location is not None and len(event.name) > 30:
+        return JSONError("Object '%s' %s '%s', which is longer than 30 "
+                         "characters." % (instance['id'], location, event.name),
+                         instance['id'], 'hash-length')
 
 
 def extref_hashes(instance):
@@ -1117,6 +911,7 @@ def extref_hashes(instance):
                                  % (src), instance['id'], 'extref-hashes')
 
 
+@stix_types('bundle')
 def duplicate_ids(instance):
     """Ensure objects with duplicate IDs have different `modified` timestamps.
     """
@@ -1155,8 +950,8 @@ def types_strict(instance):
     if instance['type'] == 'indicator' and 'pattern' in instance:
         pattern = instance['pattern']
         if isinstance(pattern, string_types):
-            p = Pattern(pattern)
-            inspection = p.inspect().comparisons
+            # Syntax errors are reported by the patterns MUST check
+            inspection = analyze_pattern(pattern, '2.1').comparisons or {}
             for objtype in inspection:
                 if objtype not in enums.OBSERVABLE_TYPES:
                     yield PatternError("'%s' is not a valid stix observable type"
@@ -1188,8 +983,8 @@ def properties_strict(instance):
     if instance['type'] == 'indicator' and 'pattern' in instance:
         pattern = instance['pattern']
         if isinstance(pattern, string_types):
-            p = Pattern(pattern)
-            inspection = p.inspect().comparisons
+            # Syntax errors are reported by the patterns MUST check
+            inspection = analyze_pattern(pattern, '2.1').comparisons or {}
             for objtype, expression_list in inspection.items():
                 for exp in expression_list:
                     path = exp[0]
@@ -1,33 +1,31 @@
 """Custom jsonschema.IValidator class and validator functions.
 """
 
-from collections import Iterable
+from collections import Counter, Iterable, deque
 import io
-from itertools import chain
+from itertools import chain, islice
+import multiprocessing
 import os
 import sys
 
-from jsonschema import Draft7Validator, RefResolver
 from jsonschema import exceptions as schema_exceptions
-from jsonschema.validators import extend
 import simplejson as json
 from six import iteritems, string_types, text_type
 
 from . import output
 from .errors import (NoJSONFileFoundError, SchemaError, SchemaInvalidError,
                      ValidationError, pretty_error)
+from .schemas import (BUNDLED_SCHEMA_VARIANTS, STIXValidator,  # noqa
+                      bundled_schema_dirs, find_schema, get_composed_validator,
+                      get_validator, load_schema, load_validator,
+                      preload_schema_store, ref_store)
 from .util import (DEFAULT_VER, ValidationOptions, check_spec,
                    clear_requests_cache, init_requests_cache)
 from .v20 import musts as musts20
 from .v20 import shoulds as shoulds20
 from .v21 import musts as musts21
 from .v21 import shoulds as shoulds21
-
-try:
-    FileNotFoundError
-except NameError:
-    # Python 2
-    FileNotFoundError = IOError
+from .visitor import VisitorCheck, VisitorPass, applies_to
 
 
 def _is_iterable_non_string(val):
@@ -38,38 +36,170 @@ def _is_stix_obj(obj):
     return isinstance(obj, dict) and 'id' in obj and 'type' in obj
 
 
-def _iter_errors_custom(instance, checks, options):
+class CheckPlan(object):
+    """An ordered set of checks, dispatched by the type of object checked.
+
+    Checks may declare the object types they apply to with the
+    ``util.stix_types`` decorator; a check without such a declaration applies
+    to every type. Visitor checks (see the ``visitor`` module) which apply to
+    the same type are combined into a single pass over the object, run where
+    the first of them would have run. Observed-data objects get every visitor
+    check, for the cyber observable objects they may embed. The list of
+    checks for a given type is computed the first time an object of that
+    type is seen and reused afterwards.
+
+    Args:
+        checks: A sequence of callables which do the checks.
+    """
+    def __init__(self, checks):
+        self.checks = list(checks)
+        self._by_type = {}
+
+    def __iter__(self):
+        return iter(self.checks)
+
+    def __len__(self):
+        return len(self.checks)
+
+    def for_type(self, stix_type):
+        """Return the checks which apply to objects of the given type.
+        """
+        try:
+            return self._by_type[stix_type]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable type value; schemas report this, run everything
+            return self.checks
+
+        type_checks = []
+        visitors = []
+        for check in self.checks:
+            if isinstance(check, VisitorCheck):
+                if stix_type == 'observed-data' or applies_to(check, stix_type):
+                    if not visitors:
+                        # Placeholder for the pass running them all
+                        type_checks.append(None)
+                    visitors.append(check)
+            elif applies_to(check, stix_type):
+                type_checks.append(check)
+        if visitors:
+            first = type_checks.index(None)
+            if len(visitors) == 1:
+                type_checks[first] = visitors[0]
+            else:
+                type_checks[first] = VisitorPass(visitors)
+
+        self._by_type[stix_type] = type_checks
+        return type_checks
+
+
+# The kinds of errors of an object, which are also their positions in the
+# results of _validate_bundle_object(). Errors of custom checks are tagged
+# with MUSTS or SHOULDS.
+SCHEMA_ERRORS, MUSTS, SHOULDS = range(3)
+
+
+def _iter_errors_custom(instance, must_checks, should_checks, options, skip=()):
     """Perform additional validation not possible merely with JSON schemas.
 
+    The MUST and SHOULD checks are run on each object in a single walk over
+    it and its child STIX objects.
+
     Args:
         instance: The STIX object to be validated.
-        checks: A sequence of callables which do the checks.  Each callable
-            may be written to accept 1 arg, which is the object to check,
-            or 2 args, which are the object and a ValidationOptions instance.
+        must_checks: A CheckPlan of callables which do the MUST checks.
+            Each callable may be written to accept 1 arg, which is the object
+            to check, or 2 args, which are the object and a ValidationOptions
+            instance.
+        should_checks: A CheckPlan of callables which do the SHOULD checks.
         options: ValidationOptions instance with settings affecting how
             validation should be done.
+        skip: Names of properties whose child STIX objects are not checked.
+
+    Yields:
+        (severity, error) tuples, where severity is MUSTS or SHOULDS.
     """
     # Perform validation
-    for v_function in checks:
-        try:
-            result = v_function(instance)
-        except TypeError:
-            result = v_function(instance, options)
-        if isinstance(result, Iterable):
-            for x in result:
-                yield x
-        elif result is not None:
-            yield result
+    stix_type = instance['type']
+    for severity, checks in ((MUSTS, must_checks), (SHOULDS, should_checks)):
+        for v_function in checks.for_type(stix_type):
+            try:
+                result = v_function(instance)
+            except TypeError:
+                result = v_function(instance, options)
+            if isinstance(result, Iterable):
+                for x in result:
+                    yield severity, x
+            elif result is not None:
+                yield severity, result
 
     # Validate any child STIX objects
     for field in instance:
+        if field in skip:
+            continue
         if type(instance[field]) is list:
             for obj in instance[field]:
                 if _is_stix_obj(obj):
-                    for err in _iter_errors_custom(obj, checks, options):
+                    for err in _iter_errors_custom(obj, must_checks, should_checks,
+                                                   options):
                         yield err
 
 
+def _iter_must_errors(tagged_errors, warnings, strict=False):
+    """Yield the MUST errors from the results of ``_iter_errors_custom()``,
+    collecting the SHOULD errors into the list `warnings` meanwhile. In
+    strict mode, those are yielded as errors after all the MUST errors
+    instead.
+    """
+    for severity, error in tagged_errors:
+        if severity == MUSTS:
+            yield error
+        else:
+            warnings.append(error)
+    if strict:
+        for error in warnings:
+            yield error
+        del warnings[:]
+
+
+class ErrorBudget(object):
+    """Count errors found against the ``max_errors`` validation option.
+
+    One budget is shared by everything validated towards the same limit: an
+    object, a file, or a whole run of the command line script.
+
+    Args:
+        max_errors: The number of errors after which validation stops, or
+            None for no limit.
+    """
+    def __init__(self, max_errors=None):
+        self.max_errors = max_errors
+        self.spent = 0
+
+    @property
+    def exhausted(self):
+        """``True`` once the maximum number of errors has been found.
+        """
+        return self.max_errors is not None and self.spent >= self.max_errors
+
+    def spend(self, count=1):
+        """Record that `count` errors were found, and return whether the
+        budget is now exhausted.
+        """
+        self.spent += count
+        return self.exhausted
+
+
+def _skipped_object_results(obj):
+    """Return the results of an object left unvalidated because the maximum
+    number of errors was reached before it.
+    """
+    object_id = obj.get('id', '') if isinstance(obj, dict) else ''
+    return ObjectValidationResults(is_valid=False, object_id=object_id,
+                                   truncated=True)
+
+
 class BaseResults(object):
     """Base class for all validation result types.
     """
@@ -109,18 +239,22 @@ class FileValidationResults(BaseResults):
     several STIX object results, since a file may contain a list of STIX
     objects.
     """
-    def __init__(self, is_valid=False, filepath=None, object_results=None, fatal=None):
+    def __init__(self, is_valid=False, filepath=None, object_results=None, fatal=None,
+                 truncated=False):
         """
         Initialize this instance.
         :param is_valid: Whether the overall result is valid
         :param filepath: Which file was validated
         :param object_results: Individual object validation results
         :param fatal: A non-validation-related fatal error
+        :param truncated: Whether validation stopped early because the
+            maximum number of errors was reached
         """
         super(FileValidationResults, self).__init__(is_valid)
         self.filepath = filepath
         self.object_results = object_results
         self.fatal = fatal
+        self.truncated = truncated
 
     def as_dict(self):
         d = super(FileValidationResults, self).as_dict()
@@ -129,6 +263,8 @@ class FileValidationResults(BaseResults):
             object_results=[object_result.as_dict() for object_result in self.object_results],
             fatal=self.fatal.as_dict()
         )
+        if self.truncated:
+            d['truncated'] = True
 
         return d
 
@@ -202,6 +338,8 @@ class ObjectValidationResults(BaseResults):
         warnings: A list of warning strings reported by our custom validators.
         fn: The filename/path for the file that was validated; None if a string
             was validated.
+        truncated: Whether validation stopped early because the maximum
+            number of errors was reached, so there may be more errors.
 
     Attributes:
         is_valid: ``True`` if the validation was successful and ``False``
@@ -209,11 +347,13 @@ class ObjectValidationResults(BaseResults):
         object_id: ID of the STIX object.
 
     """
-    def __init__(self, is_valid=False, object_id=None, errors=None, warnings=None):
+    def __init__(self, is_valid=False, object_id=None, errors=None, warnings=None,
+                 truncated=False):
         super(ObjectValidationResults, self).__init__(is_valid)
         self.object_id = object_id
         self.errors = errors
         self.warnings = warnings
+        self.truncated = truncated
 
     @property
     def errors(self):
@@ -226,9 +366,24 @@ class ObjectValidationResults(BaseResults):
         if not value:
             self._errors = []
         elif hasattr(value, "__iter__"):
-            self._errors = [SchemaError(x) for x in value]
+            self._errors = [_as_schema_error(x) for x in value]
         else:
-            self._errors = [SchemaError(value)]
+            self._errors = [_as_schema_error(value)]
+
+    @property
+    def warnings(self):
+        """A list of warning strings. Warnings kept as :class:`SchemaError`
+        instances are rendered the first time this is accessed.
+        """
+        if self._warnings and not self._warnings_rendered:
+            self._warnings = [text_type(x) for x in self._warnings]
+            self._warnings_rendered = True
+        return self._warnings
+
+    @warnings.setter
+    def warnings(self, value):
+        self._warnings = value
+        self._warnings_rendered = False
 
     def as_dict(self):
         """A dictionary representation of the :class:`.ObjectValidationResults`
@@ -237,6 +392,7 @@ class ObjectValidationResults(BaseResults):
         Keys:
             * ``'result'``: The validation results (``True`` or ``False``)
             * ``'errors'``: A list of validation errors.
+            * ``'truncated'``: ``True``, only if validation stopped early.
         Returns:
 
             A dictionary representation of an instance of this class.
@@ -246,6 +402,8 @@ class ObjectValidationResults(BaseResults):
 
         if self.errors:
             d['errors'] = [x.as_dict() for x in self.errors]
+        if self.truncated:
+            d['truncated'] = True
 
         return d
 
@@ -255,6 +413,12 @@ class ObjectValidationResults(BaseResults):
         output.print_object_results(self)
 
 
+def _as_schema_error(error):
+    if isinstance(error, SchemaError):
+        return error
+    return SchemaError(error)
+
+
 class ValidationErrorResults(BaseResults):
     """Results of a failed validation due to a raised Exception.
 
@@ -346,6 +510,263 @@ def get_json_files(files, recursive=False):
     return json_files
 
 
+class ValidationSession(object):
+    """Validate any number of STIX objects or files with the same options.
+
+    Setting up validation -- initializing the cache of external source values,
+    choosing the checks to run, preparing the enabled and disabled check
+    codes -- is done once for the session instead of for every validated
+    object, which matters when validating many small inputs.
+
+    Args:
+        options: An instance of ``ValidationOptions``. Defaults to the
+            default options.
+        jobs: The number of worker processes in which to validate the
+            objects of large bundles, or 0 for one per CPU. Defaults to the
+            ``jobs`` option. The processes are started when first needed and
+            reused for the rest of the session. Each of them is given up to
+            ``POOL_BACKLOG`` batches of work at a time. The results are the
+            same as when validating everything in this process.
+
+    Use it as a context manager, or call ``close()`` when done, so the cache
+    of external source values is cleared if the options ask for it and the
+    worker processes are stopped.
+
+    """
+    def __init__(self, options=None, jobs=None):
+        if not options:
+            options = ValidationOptions()
+        self.options = options
+        self._checks = {}
+
+        if jobs is None:
+            jobs = options.jobs
+        if jobs == 0:
+            jobs = multiprocessing.cpu_count()
+        self.jobs = jobs
+        self._pool = None
+
+        if not options.no_cache:
+            init_requests_cache(options.refresh_cache)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Clear the cache of external source values, if the options ask for
+        it, and stop the worker processes.
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        if not self.options.no_cache and self.options.clear_cache:
+            clear_requests_cache()
+
+    def _start_pool(self):
+        """Return the pool of worker processes, starting it if needed.
+        """
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.jobs, _init_worker,
+                                              (_worker_options(self.options),))
+        return self._pool
+
+    def _get_pool(self, count):
+        """Return the pool of worker processes in which to validate the
+        `count` objects of a bundle and the number of batches of them to give
+        it at a time, or None to validate them in this process.
+        """
+        if self.jobs <= 1 or count <= BUNDLE_BATCH_SIZE:
+            return None
+        return self._start_pool(), self.jobs * POOL_BACKLOG
+
+    def _get_checks(self, options):
+        """Return the result of ``_get_checks()`` for the STIX version in the
+        options, computing it only once per version.
+        """
+        checks = self._checks.get(options.version)
+        if checks is None:
+            checks = self._checks[options.version] = _get_checks(options)
+        return checks
+
+    def validate_instance(self, instance):
+        """Validate a single STIX object; see ``validate_instance()``.
+        """
+        return _validate_instance(instance, self.options, self._get_checks,
+                                  get_pool=self._get_pool)
+
+    def validate(self, obj_json):
+        """Validate objects from parsed JSON; see ``validate_parsed_json()``.
+
+        Args:
+            obj_json: A single parsed STIX object, or a list of them.
+
+        Returns:
+            An ObjectValidationResults instance, or a list of such. If the
+            ``max_errors`` option is set, the objects of a list left once it
+            is reached are not validated: their results are invalid and
+            truncated, with no errors.
+
+        """
+        return self._validate(obj_json, ErrorBudget(self.options.max_errors))
+
+    def _validate(self, obj_json, budget):
+        if not isinstance(obj_json, list):
+            return self._validate_or_report(obj_json, budget)
+
+        results = []
+        for obj in obj_json:
+            if budget.exhausted:
+                results.append(_skipped_object_results(obj))
+            else:
+                results.append(self._validate_or_report(obj, budget))
+        return results
+
+    def _validate_or_report(self, obj, budget):
+        try:
+            return _validate_instance(obj, self.options, self._get_checks, budget,
+                                      self._get_pool)
+        except SchemaInvalidError as ex:
+            return ObjectValidationResults(is_valid=False,
+                                           object_id=obj.get('id', ''),
+                                           errors=[str(ex)],
+                                           truncated=budget.spend())
+
+    def validate_many(self, objs):
+        """Validate each item of an iterable of parsed JSON, lazily.
+
+        Args:
+            objs: An iterable of parsed STIX objects, or lists of them.
+
+        Yields:
+            The result of ``validate()`` for each item.
+
+        """
+        for obj_json in objs:
+            yield self.validate(obj_json)
+
+    def validate_stream(self, in_):
+        """Validate objects from JSON data in a textual stream; see
+        ``validate()``.
+        """
+        return self.validate(json.load(in_))
+
+    def validate_string(self, string):
+        """Validate objects from a string of JSON data; see
+        ``validate_string()``.
+        """
+        output.info("Performing JSON schema validation on input string: " + string)
+        return self.validate_stream(io.StringIO(string))
+
+    def iter_validate_files(self, files):
+        """Validate several files, yielding a FileValidationResults instance
+        for each.
+
+        With more than one job, the files are validated in the worker
+        processes, ``chunk_size`` files at a time, and unless the ``ordered``
+        option is False the results are yielded in the order of the files.
+        The ``max_errors`` limit then applies to each file and to the whole
+        run, but a file validated in a worker is not cut short by the errors
+        of others. No more files are given to the workers once the limit is
+        reached, and the results of those they are still validating are
+        discarded.
+
+        The files left unvalidated once the limit is reached still get
+        results, which are invalid and truncated, with no object results.
+        They come after the others.
+
+        Args:
+            files: A list of paths of JSON files.
+
+        """
+        budget = ErrorBudget(self.options.max_errors)
+
+        if self.jobs <= 1 or len(files) <= 1:
+            for fn in files:
+                if budget.exhausted:
+                    yield _skipped_file_results(fn)
+                else:
+                    yield self._validate_file(fn, budget)
+            return
+
+        chunk_size = self.options.chunk_size
+        chunks = (files[i:i + chunk_size] for i in range(0, len(files), chunk_size))
+        results = _iter_pool_results(self._start_pool(), _validate_files_in_worker,
+                                     chunks, self.jobs * POOL_BACKLOG,
+                                     self.options.ordered)
+        # The number of results yielded for each file, which may be listed
+        # more than once
+        done = Counter()
+        for chunk_results in results:
+            for file_results in chunk_results:
+                yield file_results
+                done[file_results.filepath] += 1
+                if budget.spend(_count_errors(file_results)):
+                    break
+            if budget.exhausted:
+                break
+
+        for fn in files:
+            if done[fn]:
+                done[fn] -= 1
+            else:
+                yield _skipped_file_results(fn)
+
+    def validate_file(self, fn):
+        """Validate the input document `fn`; see ``validate_file()``.
+
+        Returns:
+            An instance of FileValidationResults.
+
+        """
+        return self._validate_file(fn, ErrorBudget(self.options.max_errors))
+
+    def _validate_file(self, fn, budget):
+        file_results = FileValidationResults(filepath=fn)
+        output.info("Performing JSON schema validation on %s" % fn)
+        # Don't let the spec_version of a bundle in this file apply to the next
+        version = self.options.version
+
+        try:
+            with open(fn) as instance_file:
+                obj_json = json.load(instance_file)
+                file_results.object_results = self._validate(obj_json, budget)
+
+        except Exception as ex:
+            if 'Expecting value' in str(ex):
+                line_no = str(ex).split()[3]
+                file_results.fatal = ValidationErrorResults(
+                    'Invalid JSON input on line %s' % line_no
+                )
+            else:
+                file_results.fatal = ValidationErrorResults(ex)
+            budget.spend()
+
+            msg = ("Unexpected error occurred with file '{fn}'. No further "
+                   "validation will be performed: {error}")
+            output.info(msg.format(fn=fn, error=str(ex)))
+        finally:
+            self.options.version = version
+
+        file_results.is_valid = (all(object_result.is_valid
+                                     for object_result in file_results.object_results)
+                                 and not file_results.fatal)
+        file_results.truncated = any(object_result.truncated
+                                     for object_result in file_results.object_results)
+
+        return file_results
+
+
+def _skipped_file_results(fn):
+    """Return the results of a file left unvalidated because the maximum
+    number of errors was reached before it.
+    """
+    return FileValidationResults(is_valid=False, filepath=fn, truncated=True)
+
+
 def run_validation(options):
     """Validate files based on command line options.
 
@@ -353,18 +774,33 @@ def run_validation(options):
         options: An instance of ``ValidationOptions`` containing options for
             this validation run.
 
+    Returns:
+        A list of FileValidationResults instances.
+
     """
-    if options.files == sys.stdin:
-        results = validate(options.files, options)
-        return [FileValidationResults(is_valid=results.is_valid,
-                                      filepath='stdin',
-                                      object_results=results)]
+    return list(iter_run_validation(options))
 
-    files = get_json_files(options.files, options.recursive)
 
-    results = [validate_file(fn, options) for fn in files]
+def iter_run_validation(options):
+    """Validate files based on command line options, yielding the results of
+    each file as it is available; see ``run_validation()``.
 
-    return results
+    Args:
+        options: An instance of ``ValidationOptions`` containing options for
+            this validation run.
+
+    """
+    with ValidationSession(options) as session:
+        if options.files == sys.stdin:
+            results = session.validate_stream(options.files)
+            yield FileValidationResults(is_valid=results.is_valid,
+                                        filepath='stdin',
+                                        object_results=results)
+            return
+
+        files = get_json_files(options.files, options.recursive)
+        for file_results in session.iter_validate_files(files):
+            yield file_results
 
 
 def validate_parsed_json(obj_json, options=None):
@@ -376,41 +812,16 @@ def validate_parsed_json(obj_json, options=None):
     If an error occurs, a ValidationErrorResults instance or list which
     includes one of these instances, is returned.
 
+    To validate many inputs with the same options, use a
+    ``ValidationSession`` instead.
+
     :param obj_json: The parsed json
     :param options: Validation options
     :return: An ObjectValidationResults instance, or a list of such.
     """
-
-    validating_list = isinstance(obj_json, list)
-
-    if not options:
-        options = ValidationOptions()
-
-    if not options.no_cache:
-        init_requests_cache(options.refresh_cache)
-
-    results = None
-    if validating_list:
-        results = []
-        for obj in obj_json:
-            try:
-                results.append(validate_instance(obj, options))
-            except SchemaInvalidError as ex:
-                error_result = ObjectValidationResults(is_valid=False,
-                                                       object_id=obj.get('id', ''),
-                                                       errors=[str(ex)])
-                results.append(error_result)
-    else:
-        try:
-            results = validate_instance(obj_json, options)
-        except SchemaInvalidError as ex:
-            error_result = ObjectValidationResults(is_valid=False,
-                                                   object_id=obj_json.get('id', ''),
-                                                   errors=[str(ex)])
-            results = error_result
-
-    if not options.no_cache and options.clear_cache:
-        clear_requests_cache()
+    session = ValidationSession(options)
+    results = session.validate(obj_json)
+    session.close()
 
     return results
 
@@ -444,32 +855,12 @@ def validate_file(fn, options=None):
         An instance of FileValidationResults.
 
     """
-    file_results = FileValidationResults(filepath=fn)
-    output.info("Performing JSON schema validation on %s" % fn)
-
     if not options:
         options = ValidationOptions(files=fn)
 
-    try:
-        with open(fn) as instance_file:
-            file_results.object_results = validate(instance_file, options)
-
-    except Exception as ex:
-        if 'Expecting value' in str(ex):
-            line_no = str(ex).split()[3]
-            file_results.fatal = ValidationErrorResults(
-                'Invalid JSON input on line %s' % line_no
-            )
-        else:
-            file_results.fatal = ValidationErrorResults(ex)
-
-        msg = ("Unexpected error occurred with file '{fn}'. No further "
-               "validation will be performed: {error}")
-        output.info(msg.format(fn=fn, error=str(ex)))
-
-    file_results.is_valid = (all(object_result.is_valid
-                                 for object_result in file_results.object_results)
-                             and not file_results.fatal)
+    session = ValidationSession(options)
+    file_results = session.validate_file(fn)
+    session.close()
 
     return file_results
 
@@ -493,153 +884,100 @@ def validate_string(string, options=None):
     return validate(stream, options)
 
 
-SCHEMA_STORE = {}
-
-
-def ref_store(validator, ref, instance, schema):
-    """When validating '$ref' properties, add to global store.
-    """
-    remote_path = validator.resolver._urljoin_cache(validator.resolver.base_uri, ref)
-
-    if remote_path not in validator.resolver.store:
-        # Add local schema to Resolver store if present, so validator will use local
-        # schemas and only download remote refs in local is not present.
-        local_base_uri = validator.resolver._scopes_stack[0]
-
-        # Take out the the 'file:' prefix
-        if os.name == 'nt':
-            local_base_uri = local_base_uri[8:]
-        else:
-            local_base_uri = local_base_uri[5:]
-
-        try:
-            local_filepath = os.path.abspath(os.path.join(local_base_uri, '../'+ref))
-            local_schema = load_schema(local_filepath)
-            schema_id = local_schema.get('$id', '')
-            if schema_id:
-                validator.resolver.store[schema_id] = local_schema
-        except FileNotFoundError:
-            pass
-
-    return Draft7Validator.VALIDATORS['$ref'](validator, ref, instance, schema)
-
-
-STIXValidator = extend(Draft7Validator, {'$ref': ref_store})
-
-
-def load_validator(schema_path, schema):
-    """Create a JSON schema validator for the given schema.
+def _find_schema_layer(type, schema_dir=None, version=DEFAULT_VER, default='core',
+                       envelope_only=False):
+    """Find the schema to validate an object of the given type against in one
+    schema directory.
 
     Args:
-        schema_path: The filename of the JSON schema.
-        schema: A Python object representation of the same schema.
+        type (str): The object type to find the schema for.
+        schema_dir (str): The path in which to search for schemas, or None for
+            the schemas bundled with this package.
+        version (str): The version of the STIX specification to validate
+            against. Only used to find base schemas when schema_dir is None.
+        default (str): If the schema for the given type cannot be found, use
+            the one with this name instead.
+        envelope_only (bool): If the object is a bundle, only check the
+            bundle itself and not the objects in it against the schemas
+            bundled with this package.
 
     Returns:
-        An instance of Draft7Validator.
-
+        A (schema directory, schema name, variant) tuple, or None if
+        schema_dir is not None and neither schema can be found there.
     """
-    global SCHEMA_STORE
-
-    # Get correct prefix based on OS
-    if os.name == 'nt':
-        file_prefix = 'file:///'
-    else:
-        file_prefix = 'file:'
-
-    resolver = RefResolver(file_prefix + schema_path.replace("\\", "/"), schema, store=SCHEMA_STORE)
-    schema_id = schema.get('$id', '')
-    if schema_id:
-        resolver.store[schema_id] = schema
-    # RefResolver creates a new store internally; persist it so we can use the same mappings every time
-    SCHEMA_STORE = resolver.store
-    validator = STIXValidator(schema, resolver=resolver)
-    return validator
-
-
-def find_schema(schema_dir, obj_type):
-    """Search the `schema_dir` directory for a schema called `obj_type`.json.
-    Return the file path of the first match it finds.
-    """
-    schema_filename = obj_type + '.json'
-
-    for root, dirnames, filenames in os.walk(schema_dir):
-        if "examples" in root:
-            continue
-        if schema_filename in filenames:
-            return os.path.join(root, schema_filename)
-
-
-def load_schema(schema_path):
-    """Load the JSON schema at the given path as a Python object.
-
-    Args:
-        schema_path: A filename for a JSON schema.
-
-    Returns:
-        A Python object representation of the schema.
+    # If no schema directory given, use default for the given STIX version,
+    # which comes bundled with this package
+    variant = None
+    bundled = schema_dir is None
+    if bundled:
+        schema_dir = os.path.abspath(os.path.dirname(__file__) + '/schemas-'
+                                     + version + '/')
+        # E.g. validate against schemas for specific observed data object
+        # types later. Custom schemas are never replaced by variants.
+        if envelope_only and type == 'bundle':
+            variant = 'envelope'
+        elif isinstance(type, string_types):
+            variant = BUNDLED_SCHEMA_VARIANTS.get(type)
 
-    """
     try:
-        with open(schema_path) as schema_file:
-            schema = json.load(schema_file)
-    except ValueError as e:
-        raise SchemaInvalidError('Invalid JSON in schema or included schema: '
-                                 '%s\n%s' % (schema_file.name, str(e)))
-
-    return schema
-
-
-def _get_error_generator(type, obj, schema_dir=None, version=DEFAULT_VER, default='core'):
+        if find_schema(schema_dir, type) is not None:
+            return (schema_dir, type, variant)
+    except TypeError:
+        pass
+
+    # Assume a custom object with no schema
+    if find_schema(schema_dir, default) is not None:
+        return (schema_dir, default, None)
+    # Only raise an error when checking against default schemas, not custom
+    if not bundled:
+        return None
+    raise SchemaInvalidError("Cannot locate a schema for the object's "
+                             "type, nor the base schema ({}.json).".format(default))
+
+
+def _get_error_generator(type, obj, schema_dir=None, version=DEFAULT_VER, default='core',
+                         engine='jsonschema', two_phase=False, envelope_only=False):
     """Get a generator for validating against the schema for the given object type.
 
     Args:
         type (str): The object type to find the schema for.
         obj: The object to be validated.
-        schema_dir (str): The path in which to search for schemas.
+        schema_dir: The path in which to search for schemas, or a list of
+            paths whose schemas are all checked in a single pass, in order.
+            None (also as an item of the list) stands for the schemas bundled
+            with this package.
         version (str): The version of the STIX specification to validate
             against. Only used to find base schemas when schema_dir is None.
         default (str): If the schema for the given type cannot be found, use
             the one with this name instead.
+        engine (str): The schema validation engine to use, 'jsonschema' or
+            'compiled'.
+        two_phase (bool): First check whether the object is valid, which
+            stops at the first error, and only look for all the errors if it
+            is not.
+        envelope_only (bool): If the object is a bundle, only check the
+            bundle itself and not the objects in it against the schemas
+            bundled with this package.
 
     Returns:
         A generator for errors found when validating the object against the
-        appropriate schema, or None if schema_dir is None and the schema
-        cannot be found.
+        appropriate schemas (an empty list if `two_phase` is True and the
+        object is valid), or None if only custom schema directories are
+        given and none of them has a schema for the object.
     """
-    # If no schema directory given, use default for the given STIX version,
-    # which comes bundled with this package
-    if schema_dir is None:
-        schema_dir = os.path.abspath(os.path.dirname(__file__) + '/schemas-'
-                                     + version + '/')
-
-    try:
-        schema_path = find_schema(schema_dir, type)
-        schema = load_schema(schema_path)
-    except (KeyError, TypeError):
-        # Assume a custom object with no schema
-        try:
-            schema_path = find_schema(schema_dir, default)
-            schema = load_schema(schema_path)
-        except (KeyError, TypeError):
-            # Only raise an error when checking against default schemas, not custom
-            if schema_dir is not None:
-                return None
-            raise SchemaInvalidError("Cannot locate a schema for the object's "
-                                     "type, nor the base schema ({}.json).".format(default))
-
-    if type == 'observed-data' and schema_dir is None:
-        # Validate against schemas for specific observed data object types later.
-        # If schema_dir is not None the schema is custom and won't need to be modified.
-        schema['allOf'][1]['properties']['objects'] = {
-            "objects": {
-                "type": "object",
-                "minProperties": 1
-            }
-        }
+    if not isinstance(schema_dir, list):
+        schema_dir = [schema_dir]
+    layers = [_find_schema_layer(type, d, version, default, envelope_only)
+              for d in schema_dir]
+    layers = [layer for layer in layers if layer is not None]
+    if not layers:
+        return None
+    validator = get_composed_validator(layers, version, engine)
 
     # Don't use custom validator; only check schemas, no additional checks
-    validator = load_validator(schema_path, schema)
     try:
+        if two_phase and validator.is_valid(obj):
+            return []
         error_gen = validator.iter_errors(obj)
     except schema_exceptions.RefResolutionError:
         raise SchemaInvalidError('Invalid JSON schema: a JSON '
@@ -673,26 +1011,49 @@ def _get_shoulds(options):
         return shoulds21.list_shoulds(options)
 
 
-def _schema_validate(sdo, options):
+def _get_checks(options):
+    """Return the 'MUST' validators, the 'SHOULD' validators (each as a
+    CheckPlan) and a string listing their names, for the correct version of
+    STIX.
+
+    Args:
+        options: ValidationOptions instance with validation options for this
+            validation run, including the STIX spec version.
+    """
+    must_checks = CheckPlan(_get_musts(options))
+    should_checks = CheckPlan(_get_shoulds(options))
+    check_names = ", ".join(x.__name__ for x in chain(must_checks, should_checks))
+    return must_checks, should_checks, check_names
+
+
+def _error_prefix(sdo):
+    """Return the text put before the messages of the schema errors of a
+    STIX object, to denote which object they come from.
+    """
+    if 'id' in sdo:
+        try:
+            return sdo['id'] + ": "
+        except TypeError:
+            return 'unidentifiable object: '
+    return ''
+
+
+def _schema_validate(sdo, options, envelope_only=None):
     """Set up validation of a single STIX object against its type's schema.
     This does no actual validation; it just returns generators which must be
     iterated to trigger the actual generation.
 
     This function first creates generators for the built-in schemas, then adds
     generators for additional schemas from the options, if specified.
+    `envelope_only` overrides the option of the same name.
 
     Do not call this function directly; use validate_instance() instead, as it
     calls this one. This function does not perform any custom checks.
     """
+    if envelope_only is None:
+        envelope_only = options.envelope_only
     error_gens = []
-
-    if 'id' in sdo:
-        try:
-            error_prefix = sdo['id'] + ": "
-        except TypeError:
-            error_prefix = 'unidentifiable object: '
-    else:
-        error_prefix = ''
+    error_prefix = _error_prefix(sdo)
 
     if options.version:
         version = options.version
@@ -703,16 +1064,15 @@ def _schema_validate(sdo, options):
 
     options.set_check_codes(version)
 
-    # Get validator for built-in schema
-    base_sdo_errors = _get_error_generator(sdo['type'], sdo, version=version)
-    if base_sdo_errors:
-        error_gens.append((base_sdo_errors, error_prefix))
-
-    # Get validator for any user-supplied schema
-    if options.schema_dir:
-        custom_sdo_errors = _get_error_generator(sdo['type'], sdo, options.schema_dir)
-        if custom_sdo_errors:
-            error_gens.append((custom_sdo_errors, error_prefix))
+    # Get a validator for the built-in schema and any user-supplied schemas
+    schema_dirs = [None] + options.schema_dirs
+    engine = options.schema_engine
+    two_phase = options.two_phase
+    sdo_errors = _get_error_generator(sdo['type'], sdo, schema_dirs, version,
+                                      engine=engine, two_phase=two_phase,
+                                      envelope_only=envelope_only)
+    if sdo_errors:
+        error_gens.append((sdo_errors, error_prefix))
 
     # Validate each cyber observable object separately
     if sdo['type'] == 'observed-data' and 'objects' in sdo:
@@ -727,24 +1087,15 @@ def _schema_validate(sdo, options):
                 error_gens.append(([schema_exceptions.ValidationError("Observable object must contain a 'type' property.", error_prefix)],
                                    error_prefix + 'object \'' + key + '\': '))
                 continue
-            # Get validator for built-in schemas
-            base_obs_errors = _get_error_generator(obj['type'],
-                                                   obj,
-                                                   None,
-                                                   version,
-                                                   'cyber-observable-core')
-            if base_obs_errors:
-                error_gens.append((base_obs_errors,
-                                   error_prefix + 'object \'' + key + '\': '))
-
-            # Get validator for any user-supplied schema
-            custom_obs_errors = _get_error_generator(obj['type'],
-                                                     obj,
-                                                     options.schema_dir,
-                                                     version,
-                                                     'cyber-observable-core')
-            if custom_obs_errors:
-                error_gens.append((custom_obs_errors,
+            obs_errors = _get_error_generator(obj['type'],
+                                              obj,
+                                              schema_dirs,
+                                              version,
+                                              'cyber-observable-core',
+                                              engine,
+                                              two_phase)
+            if obs_errors:
+                error_gens.append((obs_errors,
                                    error_prefix + 'object \'' + key + '\': '))
 
     return error_gens
@@ -766,63 +1117,444 @@ def validate_instance(instance, options=None):
         A dictionary of validation results
 
     """
-    if 'type' not in instance:
-        raise ValidationError("Input must be an object with a 'type' property.")
-
     if not options:
         options = ValidationOptions()
 
-    error_gens = []
+    return _validate_instance(instance, options, _get_checks)
+
+
+def _validate_instance(instance, options, get_checks, budget=None, get_pool=None):
+    """Validate a STIX object; see validate_instance().
+
+    Args:
+        instance: A Python dictionary representing a STIX object with a
+            'type' property.
+        options: ValidationOptions instance with validation options for this
+            validation run.
+        get_checks: A function returning the result of ``_get_checks()`` for
+            the given options.
+        budget: The ErrorBudget to count errors against. Defaults to one for
+            this object alone.
+        get_pool: A function returning the process pool in which to validate
+            the given number of objects of a bundle and the number of batches
+            of them to give it at a time, or None to validate them in this
+            process.
 
-    # Schema validation
-    error_gens += _schema_validate(instance, options)
-    if instance['type'] == 'bundle' and 'objects' in instance:
+    """
+    if 'type' not in instance:
+        raise ValidationError("Input must be an object with a 'type' property.")
+    if budget is None:
+        budget = ErrorBudget(options.max_errors)
+    if budget.exhausted:
+        return _skipped_object_results(instance)
+
+    is_bundle = instance['type'] == 'bundle' and 'objects' in instance
+    pool = None
+    if is_bundle and get_pool is not None:
+        pool = get_pool(len(instance['objects']))
+
+    # Schema validation. The objects of a bundle validated by the workers
+    # are checked against the bundle schema there.
+    error_gens = _schema_validate(instance, options,
+                                  envelope_only=options.envelope_only or pool is not None)
+    bundle_objects = None
+    if is_bundle:
         if options.version is None and 'spec_version' in instance:
             options.version = instance['spec_version']
-        # Validate each object in a bundle separately
-        for sdo in instance['objects']:
-            if 'type' not in sdo:
-                raise ValidationError("Each object in bundle must have a 'type' property.")
-            error_gens += _schema_validate(sdo, options)
-
-    spec_warnings = check_spec(instance, options)
+        if pool is not None:
+            # The workers validate the objects while the bundle itself is
+            # validated here
+            bundle_objects = _BundleObjectResults(instance, options, *pool)
+            error_gens = chain(bundle_objects.iter_bundle_errors(error_gens),
+                               bundle_objects.iter_schema_errors())
+        else:
+            # Validate each object in a bundle separately, setting up each one
+            # only once the errors of those before it have been collected
+            error_gens = chain(error_gens, _iter_bundle_schema_validate(instance, options))
 
     # Custom validation
-    must_checks = _get_musts(options)
-    should_checks = _get_shoulds(options)
-    output.info("Running the following additional checks: %s."
-                % ", ".join(x.__name__ for x in chain(must_checks, should_checks)))
+    must_checks, should_checks, check_names = get_checks(options)
+    output.info("Running the following additional checks: %s." % check_names)
     try:
-        errors = _iter_errors_custom(instance, must_checks, options)
-        warnings = _iter_errors_custom(instance, should_checks, options)
-
-        if options.strict:
-            chained_errors = chain(errors, warnings)
-            warnings = []
+        if bundle_objects is not None:
+            tagged_errors = bundle_objects.iter_custom_errors(must_checks, should_checks,
+                                                              options)
         else:
-            chained_errors = errors
-            warnings = [pretty_error(x, options.verbose) for x in warnings]
-            warnings.extend(spec_warnings)
+            tagged_errors = _iter_errors_custom(instance, must_checks, should_checks,
+                                                options)
+        # The warnings are collected as the errors are
+        warnings = []
+        chained_errors = _iter_must_errors(tagged_errors, warnings, options.strict)
     except schema_exceptions.RefResolutionError:
         raise SchemaInvalidError('Invalid JSON schema: a JSON reference '
                                  'failed to resolve')
 
     # List of error generators and message prefixes (to denote which object the
     # error comes from)
-    error_gens += [(chained_errors, '')]
+    error_gens = chain(error_gens, [(chained_errors, '')])
 
     # Prepare the list of errors (this actually triggers the custom validation
-    # functions).
+    # functions). Stop as soon as the error budget is spent, leaving the rest
+    # of the generators unconsumed.
     error_list = []
+    truncated = False
     for gen, prefix in error_gens:
         for error in gen:
-            msg = prefix + pretty_error(error, options.verbose)
-            error_list.append(SchemaError(msg))
+            error_list.append(SchemaError(error, prefix, options.verbose,
+                                          options.context_limit))
+            if budget.spend():
+                truncated = True
+                break
+        if truncated:
+            break
+
+    if truncated:
+        spec_warnings = []
+    elif bundle_objects is not None:
+        spec_warnings = check_spec(bundle_objects.index, options)
+    else:
+        spec_warnings = check_spec(instance, options)
+
     if options.strict:
-        error_list.extend(spec_warnings)
+        for spec_warning in spec_warnings:
+            error_list.append(spec_warning)
+            if budget.spend():
+                truncated = True
+                break
+
+    if truncated:
+        warnings = []
+    elif not options.strict:
+        warnings = [SchemaError(x, verbose=options.verbose,
+                                context_limit=options.context_limit)
+                    for x in warnings]
+        warnings.extend(spec_warnings)
+
     if error_list:
         valid = False
     else:
         valid = True
     return ObjectValidationResults(is_valid=valid, object_id=instance.get('id', ''),
-                                   errors=error_list, warnings=warnings)
+                                   errors=error_list, warnings=warnings,
+                                   truncated=truncated)
+
+
+def _iter_bundle_schema_validate(bundle, options):
+    """Yield the results of ``_schema_validate()`` for each object in a
+    bundle, in turn.
+    """
+    for sdo in bundle['objects']:
+        if 'type' not in sdo:
+            raise ValidationError("Each object in bundle must have a 'type' property.")
+        for error_gen in _schema_validate(sdo, options):
+            yield error_gen
+
+
+# The number of objects of a bundle sent to a worker process at once
+BUNDLE_BATCH_SIZE = 500
+
+# The number of batches of bundle objects or chunks of files given to each
+# worker process at a time
+POOL_BACKLOG = 2
+
+# The options the worker processes are set up with. The others only matter
+# to the parent process, and some, like 'files', may not even be picklable.
+_WORKER_OPTIONS = ('version', 'verbose', 'silent', 'schema_dir', 'disabled',
+                   'enabled', 'strict', 'strict_types', 'strict_properties',
+                   'no_cache', 'enforce_refs', 'schema_engine',
+                   'envelope_only', 'two_phase', 'max_errors', 'context_limit')
+
+# The properties of bundle objects needed by the checks of bundles themselves
+_INDEX_PROPERTIES = ('type', 'id', 'modified', 'spec_version', 'source_ref',
+                     'target_ref')
+
+# The session used by a worker process to validate files or bundle objects,
+# and the STIX version it was given
+_worker_session = None
+_worker_version = None
+
+
+def _worker_options(options):
+    """Return the values of the options the worker processes need, as a
+    dictionary of keyword arguments for ``ValidationOptions``.
+    """
+    return dict((name, getattr(options, name)) for name in _WORKER_OPTIONS)
+
+
+def _init_worker(option_values):
+    """Set up a worker process to validate files or bundle objects with the
+    given options (see ``_worker_options()``), loading the schemas and
+    choosing the checks up front.
+    """
+    global _worker_session, _worker_version
+    options = ValidationOptions(**option_values)
+    _worker_session = ValidationSession(options, jobs=1)
+    _worker_version = options.version
+
+    for schema_dir in bundled_schema_dirs() + options.schema_dirs:
+        preload_schema_store(schema_dir)
+    _worker_session._get_checks(options)
+
+
+def _validate_files_in_worker(fns):
+    """Validate a chunk of files in a worker process; see
+    ``iter_validate_files()``.
+    """
+    results = []
+    for fn in fns:
+        # Batches of bundle objects set the STIX version of the session too
+        _worker_session.options.version = _worker_version
+        results.append(_worker_session.validate_file(fn))
+    return results
+
+
+def _pop_ready(pending):
+    """Remove and return the first of the AsyncResults in `pending` which is
+    ready, waiting for one if none is.
+    """
+    while True:
+        for result in pending:
+            if result.ready():
+                pending.remove(result)
+                return result
+        pending[0].wait(0.01)
+
+
+def _iter_pool_results(pool, function, items, backlog, ordered=True):
+    """Yield the result of `function` for each of `items`, called in the
+    worker processes of `pool`, like ``pool.imap()`` does (or like
+    ``pool.imap_unordered()`` if `ordered` is False).
+
+    Only `backlog` items are given to the workers at a time; another one is
+    given each time a result is taken. So once the caller stops taking
+    results, e.g. because the maximum number of errors was reached, no more
+    work is given to the workers.
+    """
+    items = iter(items)
+    pending = deque(pool.apply_async(function, (item,))
+                    for item in islice(items, backlog))
+    while pending:
+        if ordered:
+            result = pending.popleft()
+        else:
+            result = _pop_ready(pending)
+        for item in islice(items, 1):
+            pending.append(pool.apply_async(function, (item,)))
+        yield result.get()
+
+
+def _count_errors(file_results):
+    """Return the number of errors counted against the ``max_errors`` limit
+    in the results of a file.
+    """
+    count = sum(len(object_result.errors)
+                for object_result in file_results.object_results)
+    if file_results.fatal:
+        count += 1
+    return count
+
+
+def _validate_bundle_batch(args):
+    """Validate a batch of bundle objects in a worker process.
+
+    Args:
+        args: A (STIX version, index of the first object in the bundle, list
+            of objects) tuple.
+
+    Returns:
+        A list with the result of ``_validate_bundle_object()`` for each
+        object.
+    """
+    version, start, objects = args
+    options = _worker_session.options
+    options.version = version
+    must_checks, should_checks, _ = _worker_session._get_checks(options)
+    return [_validate_bundle_object(obj, start + i, options, must_checks, should_checks)
+            for i, obj in enumerate(objects)]
+
+
+def _iter_bundle_item_errors(obj, index, options):
+    """Yield the errors of the object at `index` in a bundle against the
+    bundle schema bundled with this package, as validating the whole bundle
+    against it would find them.
+    """
+    version = options.version or DEFAULT_VER
+    schema_dir, _, _ = _find_schema_layer('bundle', None, version)
+    validator = get_validator(schema_dir, 'bundle', version, 'objects',
+                              options.schema_engine)
+    if options.two_phase and validator.is_valid(obj):
+        return
+
+    # Where the schema of the objects is in the bundle schema, itself within
+    # a composed schema if there are custom schemas for bundles, instead of
+    # in the 'allOf' of the variant
+    schema_path = ['properties', 'objects', 'items']
+    if any(_find_schema_layer('bundle', d, version) is not None
+           for d in options.schema_dirs):
+        schema_path = ['allOf', 0] + schema_path
+    for error in validator.iter_errors(obj):
+        error.path.extendleft([index, 'objects'])
+        error.schema_path.popleft()
+        error.schema_path.popleft()
+        error.schema_path.extendleft(reversed(schema_path))
+        yield error
+
+
+def _validate_bundle_object(obj, index, options, must_checks, should_checks):
+    """Validate the object at `index` in a bundle, the way
+    ``_validate_instance()`` does for the objects of a bundle it validates
+    itself.
+
+    Returns:
+        A tuple of the schema error, MUST error and SHOULD error messages
+        (fully rendered, as they are sent back to the parent process), the
+        entry of the object in the bundle index and the messages of its
+        errors against the bundle schema. If the object has no type, there
+        are only the latter, and None for the rest.
+    """
+    def render(errors, prefix=''):
+        return [prefix + pretty_error(error, options.verbose, options.context_limit)
+                for error in errors]
+
+    item_errors = []
+    if not options.envelope_only:
+        item_errors = render(_iter_bundle_item_errors(obj, index, options))
+    if 'type' not in obj:
+        # Reported once the errors of the objects before it are
+        return None, None, None, None, item_errors
+
+    schema_errors = []
+    for gen, prefix in _schema_validate(obj, options):
+        schema_errors.extend(render(gen, prefix))
+
+    must_errors = should_errors = []
+    if _is_stix_obj(obj):
+        warnings = []
+        must_errors = render(_iter_must_errors(
+            _iter_errors_custom(obj, must_checks, should_checks, options), warnings))
+        should_errors = render(warnings)
+
+    index_entry = dict((prop, obj[prop]) for prop in _INDEX_PROPERTIES if prop in obj)
+    return schema_errors, must_errors, should_errors, index_entry, item_errors
+
+
+def _follows_bundle_objects(error):
+    """Return whether validating a bundle against the bundle schema finds
+    `error`, an error of its envelope, after those of its objects.
+    """
+    schema_path = error.schema_path
+    if len(schema_path) > 1 and schema_path[0] == 'allOf' and schema_path[1] != 0:
+        # From a custom schema, composed after the bundled one
+        return True
+    # Of the properties of the bundle, 'objects' comes last
+    return not error.path or error.path[0] == 'objects'
+
+
+class _BundleObjectResults(object):
+    """The results of validating the objects of a bundle in a pool of worker
+    processes.
+
+    The objects are given to the workers in batches of ``BUNDLE_BATCH_SIZE``,
+    `backlog` batches at a time, as soon as this is created. Their results
+    are waited for when they are needed, and come back in the order of the
+    objects. The batches not given to the workers yet when the results stop
+    being needed, e.g. because the maximum number of errors was reached, are
+    never validated.
+
+    Attributes:
+        index: A copy of the bundle in which each object is replaced by its
+            index entry, which holds only the properties needed by the checks
+            of the bundle itself. Getting it waits for all the results.
+    """
+    def __init__(self, bundle, options, pool, backlog):
+        self.bundle = bundle
+        self.options = options
+        objects = bundle['objects']
+        batches = ((options.version, i, objects[i:i + BUNDLE_BATCH_SIZE])
+                   for i in range(0, len(objects), BUNDLE_BATCH_SIZE))
+        self._pending = _iter_pool_results(pool, _validate_bundle_batch,
+                                           batches, backlog)
+        self._results = []
+        self._index = None
+
+    def _iter_results(self):
+        """Yield the results of the objects, waiting for them as needed.
+        """
+        i = 0
+        while True:
+            while i < len(self._results):
+                yield self._results[i]
+                i += 1
+            batch = next(self._pending, None)
+            if batch is None:
+                return
+            self._results.extend(batch)
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = dict(self.bundle)
+            self._index['objects'] = [result[3] for result in self._iter_results()]
+        return self._index
+
+    def iter_bundle_errors(self, envelope_gens):
+        """Yield (errors, prefix) tuples for the errors of the bundle against
+        the bundle schema, given `envelope_gens`, its errors against the
+        bundle envelope only from ``_schema_validate()``.
+
+        The errors of the objects found by the workers take the place of
+        those of the envelope about them, so the errors come in the same
+        order as validating the bundle against the whole bundle schema finds
+        them.
+        """
+        envelope_errors = chain.from_iterable(gen for gen, _ in envelope_gens)
+        yield self._iter_bundle_errors(envelope_errors), _error_prefix(self.bundle)
+
+    def _iter_bundle_errors(self, envelope_errors):
+        item_errors = chain.from_iterable(result[-1] for result in self._iter_results())
+        full_schemas = {}
+        if self.options.verbose and not self.options.envelope_only:
+            # Show the parts of the bundle schema which the envelope changes
+            # as they are, in the context of the errors
+            version = self.options.version or DEFAULT_VER
+            schema_dir, _, _ = _find_schema_layer('bundle', None, version)
+            envelope = get_validator(schema_dir, 'bundle', version, 'envelope').schema
+            full = get_validator(schema_dir, 'bundle', version).schema
+            full_schemas[id(envelope)] = full
+            full_schemas[id(envelope['properties']['objects'])] = full['properties']['objects']
+
+        for error in envelope_errors:
+            path = error.path
+            if len(path) > 1 and path[0] == 'objects':
+                # Only checks that the object is an object
+                continue
+            error.schema = full_schemas.get(id(error.schema), error.schema)
+            if item_errors is not None and _follows_bundle_objects(error):
+                for item_error in item_errors:
+                    yield item_error
+                item_errors = None
+            yield error
+        if item_errors is not None:
+            for item_error in item_errors:
+                yield item_error
+
+    def iter_schema_errors(self):
+        """Yield (errors, prefix) tuples for the schema errors of each object.
+        """
+        for result in self._iter_results():
+            if result[SCHEMA_ERRORS] is None:
+                raise ValidationError("Each object in bundle must have a 'type' property.")
+            yield result[SCHEMA_ERRORS], ''
+
+    def iter_custom_errors(self, must_checks, should_checks, options):
+        """Yield the errors found by the given checks for the bundle itself,
+        then the MUST and SHOULD errors of each of its objects, like
+        ``_iter_errors_custom()`` does.
+        """
+        for error in _iter_errors_custom(self.index, must_checks, should_checks,
+                                         options, skip=('objects',)):
+            yield error
+        for result in self._iter_results():
+            for severity in (MUSTS, SHOULDS):
+                for error in result[severity]:
+                    yield severity, error
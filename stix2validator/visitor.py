@@ -0,0 +1,196 @@
+"""Single-pass traversal of STIX objects for the custom checks.
+
+Many checks inspect the same nested structures of an object (its
+properties, its extensions, its ``hashes`` dictionaries). Rather than each
+check descending into those on its own, a check can be written as a
+*visitor check*: it subscribes to the kinds of events it cares about and is
+called once per matching event while the object is walked a single time.
+
+Visitor checks are ordinary entries in a version's ``CHECKS`` table. When
+several of them apply to the same object, the validator combines them into
+one ``VisitorPass`` so the object is still only walked once. The cyber
+observable objects embedded in an observed-data object are walked in the
+same pass, each with the checks for its own type.
+"""
+
+from collections import namedtuple
+
+from .util import _embedded_observables
+
+# Event kinds
+PROPERTY = 'property'
+EXTENSION = 'extension'
+EXTENSION_PROPERTY = 'extension-property'
+HASH = 'hash'
+
+EVENTS = frozenset([PROPERTY, EXTENSION, EXTENSION_PROPERTY, HASH])
+
+# Properties whose values are dictionaries of hash algorithm names to hashes
+HASH_PROPERTIES = frozenset(['hashes', 'file_header_hashes'])
+
+Event = namedtuple('Event', ['kind', 'path', 'name', 'value'])
+Event.__doc__ = """Something found while walking an object.
+
+Attributes:
+    kind: One of the event kinds defined in this module.
+    path: Tuple of the keys and list indices leading from the object to the
+        dictionary which holds ``name``.
+    name: The dictionary key the event is about (a property name, an
+        extension name or a hash algorithm name).
+    value: The value stored under ``name``.
+"""
+
+
+def iter_events(instance, kinds=EVENTS):
+    """Walk a STIX object once, yielding an Event for everything of interest.
+
+    ``EXTENSION`` and ``EXTENSION_PROPERTY`` events are produced for the keys
+    of the object's own ``extensions`` dictionary and of each extension;
+    ``HASH`` events for the keys of ``hashes``-type dictionaries anywhere in
+    the object; ``PROPERTY`` events for every other dictionary key at any
+    depth.
+
+    Args:
+        instance: The STIX object to walk.
+        kinds: The event kinds to produce; others are skipped.
+    """
+    return _walk_dict(instance, (), frozenset(kinds))
+
+
+def _walk_dict(obj, path, kinds):
+    depth = len(path)
+    in_extensions = depth and path[0] == 'extensions'
+    if depth == 1 and in_extensions:
+        kind = EXTENSION
+    elif depth == 2 and in_extensions:
+        kind = EXTENSION_PROPERTY
+    elif depth and path[-1] in HASH_PROPERTIES:
+        kind = HASH
+    else:
+        kind = PROPERTY
+    want_kind = kind in kinds
+
+    for name, value in obj.items():
+        if want_kind:
+            yield Event(kind, path, name, value)
+
+        if isinstance(value, dict):
+            for event in _walk_dict(value, path + (name,), kinds):
+                yield event
+        elif isinstance(value, list):
+            for event in _walk_list(value, path + (name,), kinds):
+                yield event
+
+
+def _walk_list(obj, path, kinds):
+    for index, item in enumerate(obj):
+        if isinstance(item, dict):
+            for event in _walk_dict(item, path + (index,), kinds):
+                yield event
+        elif isinstance(item, list):
+            for event in _walk_list(item, path + (index,), kinds):
+                yield event
+
+
+class VisitorCheck(object):
+    """A check which is called for events found while walking an object.
+
+    Calling a VisitorCheck with an object walks it just for this check, so it
+    can be used anywhere a plain check function can.
+
+    Args:
+        function: Callable taking the object being checked and an Event, and
+            returning an error, an iterable of errors or None.
+        events: The event kinds the check subscribes to.
+        stix_types: The object types the check applies to, or None for all.
+        condition: Optional callable taking the object and returning whether
+            the check applies to it at all.
+    """
+    def __init__(self, function, events, stix_types=None, condition=None):
+        self.function = function
+        self.events = frozenset(events)
+        if stix_types is not None:
+            self.stix_types = frozenset(stix_types)
+        self.condition = condition
+        self.__name__ = function.__name__
+        self.__doc__ = function.__doc__
+
+    def __call__(self, instance):
+        return VisitorPass([self])(instance)
+
+    def __repr__(self):
+        return '<VisitorCheck %s>' % self.__name__
+
+
+def visitor_check(*events, **kwargs):
+    """Decorator turning a function into a VisitorCheck.
+
+    Args:
+        *events: The event kinds the check subscribes to.
+        **kwargs: ``stix_types`` and ``condition``, as for VisitorCheck.
+    """
+    def inner_visitor_check(function):
+        return VisitorCheck(function, events, **kwargs)
+    return inner_visitor_check
+
+
+def applies_to(check, stix_type):
+    """Return whether `check` applies to objects of the given type, according
+    to its ``stix_types`` attribute, if any.
+    """
+    try:
+        return stix_type in getattr(check, 'stix_types', (stix_type,))
+    except TypeError:
+        # Unhashable type value; schemas report this
+        return False
+
+
+class VisitorPass(object):
+    """Run several visitor checks over an object in a single walk.
+
+    Each check is only run on objects of the types it applies to. When the
+    object is an observed-data object with an 'objects' dictionary, each of
+    the cyber observable objects in it is walked as well, after the
+    observed-data object itself.
+
+    Args:
+        checks: A sequence of VisitorCheck instances.
+    """
+    def __init__(self, checks):
+        self.checks = list(checks)
+        self.__name__ = ', '.join(c.__name__ for c in self.checks)
+
+    def _subscribers(self, instance):
+        """Return the functions of the checks which apply to `instance`,
+        keyed by the event kinds they subscribe to.
+        """
+        subscribers = {}
+        for check in self.checks:
+            if not applies_to(check, instance.get('type')):
+                continue
+            if check.condition is not None and not check.condition(instance):
+                continue
+            for kind in check.events:
+                subscribers.setdefault(kind, []).append(check.function)
+        return subscribers
+
+    def __call__(self, instance):
+        targets = [instance]
+        if (instance.get('type') == 'observed-data' and
+                isinstance(instance.get('objects'), dict)):
+            targets.extend(_embedded_observables(instance))
+
+        for target in targets:
+            subscribers = self._subscribers(target)
+            if not subscribers:
+                continue
+            for event in iter_events(target, subscribers):
+                for function in subscribers[event.kind]:
+                    result = function(target, event)
+                    if result is None:
+                        continue
+                    if isinstance(result, Exception):
+                        yield result
+                    else:
+                        for error in result:
+                            yield error